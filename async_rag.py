@@ -0,0 +1,457 @@
+import asyncio
+import json
+from typing import Dict
+from rag import AutomateRAG
+from tracing import traced_pipeline, traced_stage, trace_llm_call, trace_stage, record_attributes
+from llm_clients import create_llm_client
+
+
+class AsyncAutomateRAG(AutomateRAG):
+    """
+    asyncio variant of `AutomateRAG`.
+
+    The pipeline steps are the same as in `AutomateRAG`, but every LLM call goes through the async OpenAI client.
+    In `smart_automate`, the per-integration example selection calls are fanned out concurrently, so the selection
+    step takes roughly as long as the slowest call instead of the sum of all of them.
+
+    With `speculative_examples`, `smart_automate` also detects the integrations named in the job description
+    (see `IntegrationCatalog.detect_integrations`) and starts selecting their examples, for the whole job description,
+    while the task breakdown is still running. The selections of the integrations confirmed by the breakdown are kept,
+    the others are cancelled and discarded, and the integrations that were not predicted are selected as usual.
+    When every integration is predicted, the selection stage is off the critical path. The speculative calls are
+    recorded in the `speculative_select_examples` stage of the report, the outcome in its `speculation` attribute.
+
+    With `code_generation="per_task"`, the skeleton and task code generation calls are fanned out concurrently as well.
+    """
+    def __init__(self, main_llm: str = "gpt-4-0125-preview", embed_llm: str = "text-embedding-ada-002", llm_cache=None,
+                 example_selector: str = "llm", rerank_examples: bool = False, prompt_token_budget: int = 16000,
+                 export_otel: bool = False, llm_provider: str = "openai", llm_base_url: str = None,
+                 stage_models: Dict[str, str] = None, json_mode: bool = True, semantic_cache=None,
+                 max_concurrency: int = 4, speculative_examples: bool = False, code_generation: str = "single",
+                 embedder="openai") -> None:
+        super().__init__(
+                    main_llm=main_llm,
+                    embed_llm=embed_llm,
+                    llm_cache=llm_cache,
+                    example_selector=example_selector,
+                    rerank_examples=rerank_examples,
+                    prompt_token_budget=prompt_token_budget,
+                    export_otel=export_otel,
+                    llm_provider=llm_provider,
+                    llm_base_url=llm_base_url,
+                    stage_models=stage_models,
+                    json_mode=json_mode,
+                    semantic_cache=semantic_cache,
+                    code_generation=code_generation,
+                    embedder=embedder
+                )
+
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}.")
+
+        # Upper bound on the number of concurrent LLM calls issued by a single pipeline run
+        self.max_concurrency = max_concurrency
+        self.speculative_examples = speculative_examples
+
+    def _create_main_llm_client(self):
+        return create_llm_client(provider=self.llm_provider, base_url=self.llm_base_url, asynchronous=True)
+
+    @traced_pipeline("automate")
+    async def automate(self, job_description: str):
+        """
+        Async version of `AutomateRAG.automate`.
+        """
+
+        print (f"Job description\n{'--'*50}\n{job_description}\n")
+
+        # Step 1 and 2: Break down the job into tasks and identify the job trigger
+        tasks_and_trigger = await self.break_job_into_tasks(job_description=job_description)
+
+        prettified_json_output = json.dumps(tasks_and_trigger, indent=4)
+
+        print (f"\nTasks and Trigger:\n{'--'*50}\n{prettified_json_output}\n")
+
+        # Step 3: Identify unique integrations/third party APIs that are required to complete the job
+        usable_integrations = self._parse_integrations(json_data=tasks_and_trigger)
+        print (f"\nIdentified unique integrations:\n{'--'*50}\n{usable_integrations}\n")
+
+        # Step 4: Load all examples for the identified integrations. This only reads local files.
+        examples = self.fetch_all_integration_examples(integrations=usable_integrations)
+        total_examples = sum([len(api_examples) for api, api_examples in examples.items()])
+
+        print (f"{total_examples} integration examples loaded.\n\n")
+
+        # Step 5: Generate final code using identified tasks, job trigger and the examples.
+        automation_code = await self.generate_code(
+                                        job_description=job_description,
+                                        tasks_and_trigger=tasks_and_trigger,
+                                        usable_integrations=usable_integrations,
+                                        examples=examples
+                            )
+
+        return automation_code
+
+    @traced_pipeline("smart_automate")
+    async def smart_automate(self, job_description: str):
+        """
+        Async version of `AutomateRAG.smart_automate`.
+        """
+
+        print (f"Job description\n{'--'*50}\n{job_description}\n")
+
+        # Speculatively select the examples of the integrations named in the job description during steps 1 to 3.
+        # The speculative and the regular selections share the concurrency limit of the run.
+        selection_semaphore = asyncio.Semaphore(self.max_concurrency)
+        speculative_selections = self._start_speculative_selections(job_description=job_description, semaphore=selection_semaphore)
+
+        try:
+            # Step 1 and 2: Break down the job into tasks and identify the job trigger
+            tasks_and_trigger = await self.break_job_into_tasks(job_description=job_description)
+
+            prettified_json_output = json.dumps(tasks_and_trigger, indent=4)
+
+            print (f"\nTasks and Trigger:\n{'--'*50}\n{prettified_json_output}\n")
+
+            # Step 3: Identify unique integrations/third party APIs that are required to complete the job
+            usable_integrations = self._parse_integrations(json_data=tasks_and_trigger)
+            print (f"\nUnique integrations:\n{'--'*50}\n{usable_integrations}\n")
+
+            # Step 4: Select the relevant examples of every integration concurrently
+            examples = await self.fetch_select_integrations_examples(
+                                                tasks_and_trigger=tasks_and_trigger,
+                                                integrations=usable_integrations,
+                                                speculative_selections=speculative_selections,
+                                                semaphore=selection_semaphore
+                                            )
+        finally:
+            self._discard_speculative_selections(speculative_selections)
+
+        total_examples = sum([len(api_examples) for api, api_examples in examples.items()])
+        print (f"Identified and loaded {total_examples} integration examples.\n\n")
+
+        # Step 5: Generate final code using identified tasks, job trigger and the examples.
+        automation_code = await self.generate_code(
+                                            job_description=job_description,
+                                            tasks_and_trigger=tasks_and_trigger,
+                                            usable_integrations=usable_integrations,
+                                            examples=examples
+                            )
+
+        return automation_code
+
+    def stream_automate(self, job_description: str):
+        """
+        Async streaming version of `automate`. Returns an async generator of pipeline events,
+        see `AutomateRAG.stream_smart_automate`.
+        """
+        return self._stream_pipeline(job_description=job_description, select_relevant_examples=False)
+
+    def stream_smart_automate(self, job_description: str):
+        """
+        Async streaming version of `smart_automate`. Returns an async generator of pipeline events,
+        see `AutomateRAG.stream_smart_automate`.
+        """
+        return self._stream_pipeline(job_description=job_description, select_relevant_examples=True)
+
+    async def _stream_pipeline(self, job_description, select_relevant_examples):
+
+        selection_semaphore = asyncio.Semaphore(self.max_concurrency)
+        speculative_selections = self._start_speculative_selections(job_description=job_description, semaphore=selection_semaphore) \
+                                    if select_relevant_examples else {}
+
+        try:
+            # Step 1 and 2: Break down the job into tasks and identify the job trigger
+            tasks_and_trigger = await self.break_job_into_tasks(job_description=job_description)
+            yield {"event": "tasks_and_trigger", "data": tasks_and_trigger}
+
+            # Step 3: Identify unique integrations/third party APIs that are required to complete the job
+            usable_integrations = self._parse_integrations(json_data=tasks_and_trigger)
+            yield {"event": "integrations", "data": usable_integrations}
+
+            # Step 4: Load all or only the relevant examples of the integrations
+            if select_relevant_examples:
+                examples = await self.fetch_select_integrations_examples(tasks_and_trigger=tasks_and_trigger, integrations=usable_integrations,
+                                                                         speculative_selections=speculative_selections,
+                                                                         semaphore=selection_semaphore)
+            else:
+                examples = self.fetch_all_integration_examples(integrations=usable_integrations)
+        finally:
+            self._discard_speculative_selections(speculative_selections)
+
+        yield {"event": "examples", "data": {integration: list(api_examples) for integration, api_examples in examples.items()}}
+
+        # Step 5: Stream the generated code
+        code_chunks = []
+        async for code_chunk in self.stream_code(
+                                        job_description=job_description,
+                                        tasks_and_trigger=tasks_and_trigger,
+                                        usable_integrations=usable_integrations,
+                                        examples=examples
+                                    ):
+            code_chunks.append(code_chunk)
+            yield {"event": "code", "data": code_chunk}
+
+        yield {"event": "done", "data": "".join(code_chunks)}
+
+    async def stream_code(self, job_description, tasks_and_trigger, usable_integrations, examples):
+        """
+        Same as `generate_code`, but yields the generated code piece by piece as the LLM streams it.
+        In the 'per_task' mode, the code is yielded in one piece once every fragment is assembled.
+        """
+        if self.code_generation == "per_task":
+            yield await self.generate_code(job_description, tasks_and_trigger, usable_integrations, examples)
+            return
+
+        prompt = self._build_code_generation_prompt(
+                                    job_description=job_description,
+                                    tasks_and_trigger=tasks_and_trigger,
+                                    usable_integrations=usable_integrations,
+                                    examples=examples
+                    )
+
+        async for code_chunk in self.__stream_llm_api(llm_name=self.stage_models["generate_code"], query=prompt):
+            yield code_chunk
+
+    @traced_stage("generate_code")
+    async def generate_code(self, job_description, tasks_and_trigger, usable_integrations, examples):
+
+        if self.code_generation == "per_task":
+            return await self._generate_code_per_task(job_description, tasks_and_trigger, usable_integrations, examples)
+
+        prompt = self._build_code_generation_prompt(
+                                    job_description=job_description,
+                                    tasks_and_trigger=tasks_and_trigger,
+                                    usable_integrations=usable_integrations,
+                                    examples=examples
+                    )
+
+        code_output = await self.__invoke_llm_api(llm_name=self.stage_models["generate_code"], query=prompt)
+
+        return code_output
+
+    async def _generate_code_per_task(self, job_description, tasks_and_trigger, usable_integrations, examples):
+        """
+        Generate the skeleton and the code of every task concurrently (bounded by `max_concurrency`),
+        then assemble them (see `task_codegen.py`)
+        """
+        from task_codegen import assemble_job_code
+
+        prompts = self._build_task_code_prompts(job_description, tasks_and_trigger, usable_integrations, examples)
+        model = self.stage_models["generate_code"]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def generate(prompt):
+            async with semaphore:
+                return await self.__invoke_llm_api(llm_name=model, query=prompt)
+
+        outputs = dict(zip(prompts, await asyncio.gather(*[generate(prompt) for prompt in prompts.values()])))
+        skeleton = outputs.pop("skeleton")
+
+        return assemble_job_code(skeleton, outputs)
+
+    @traced_stage("break_job_into_tasks")
+    async def break_job_into_tasks(self, job_description: str):
+        """
+        Given a job description, break down into one or more tasks
+
+        :raises ValueError: when neither the stage model nor `main_llm` return a valid breakdown, even after repair
+        """
+
+        # Paraphrases of a previous job description reuse its breakdown (see `semantic_cache.py`)
+        if self.semantic_cache is not None:
+            tasks_and_trigger = await asyncio.to_thread(self.semantic_cache.get, job_description)
+            if tasks_and_trigger is not None:
+                return tasks_and_trigger
+
+        tasks_and_trigger = await self._request_tasks_and_trigger(job_description=job_description)
+
+        if self.semantic_cache is not None:
+            await asyncio.to_thread(self.semantic_cache.set, job_description, tasks_and_trigger)
+
+        return tasks_and_trigger
+
+    async def _request_tasks_and_trigger(self, job_description):
+        """
+        Async version of `AutomateRAG._request_tasks_and_trigger`
+        """
+        requests = self._tasks_breakdown_requests(job_description=job_description)
+        try:
+            model, prompt = next(requests)
+            while True:
+                output = await self.__invoke_llm_api(llm_name=model, query=prompt, **self._tasks_breakdown_params())
+                model, prompt = requests.send(output)
+        except StopIteration as stop:
+            return stop.value
+
+    def _start_speculative_selections(self, job_description, semaphore):
+        """
+        Start selecting the examples of the integrations named in the job description, before its task breakdown
+        is known. Does nothing unless `speculative_examples` is set.
+
+        :param semaphore: concurrency limit shared with the regular selections of the run
+        :return: integration -> asyncio task returning the names of its selected examples
+        """
+        if not self.speculative_examples:
+            return {}
+
+        predicted_integrations = self.integration_catalog.detect_integrations(job_description)
+        print (f"Speculatively selecting the examples of: {predicted_integrations}")
+
+        return {
+            integration: asyncio.ensure_future(self._select_examples_speculatively(integration=integration, job_description=job_description,
+                                                                                  semaphore=semaphore))
+            for integration in predicted_integrations
+        }
+
+    async def _select_examples_speculatively(self, integration, job_description, semaphore):
+        # The tasks are not known yet: the examples are selected for the whole job description
+        async with semaphore:
+            with trace_stage("speculative_select_examples"):
+                return await self.select_relevant_examples(integration, [job_description], max_examples=2)
+
+    def _discard_speculative_selections(self, speculative_selections):
+        """
+        Cancel the speculative selections still running, e.g. when the task breakdown failed
+        """
+        for selection in speculative_selections.values():
+            if not selection.done():
+                selection.cancel()
+            elif not selection.cancelled():
+                # Mark a failure as retrieved, it was already handled by falling back to the regular selection
+                selection.exception()
+
+    @traced_stage("select_examples")
+    async def fetch_select_integrations_examples(self, tasks_and_trigger, integrations, speculative_selections=None, semaphore=None):
+        """
+        Given a list of integrations and a JSON object representing the task breakdown of a job,
+        use LLM to identify 'relevant' examples that will help generate automation code for the given job.
+
+        One selection call is issued per integration, all of them concurrently (bounded by `max_concurrency`).
+
+        :param speculative_selections: selections started before the task breakdown was known
+                                       (see `_start_speculative_selections`). The confirmed ones are reused,
+                                       the others are cancelled.
+        :param semaphore: concurrency limit shared with the speculative selections, a new one of `max_concurrency` by default
+        """
+        integrations_to_tasks_mapping = self._map_integrations_to_tasks(
+                                                tasks_and_trigger=tasks_and_trigger,
+                                                integrations=integrations
+                                            )
+
+        speculative_selections = speculative_selections or {}
+        if speculative_selections:
+            self.__record_speculation(predicted=list(speculative_selections), confirmed=list(integrations_to_tasks_mapping))
+
+        for integration, selection in speculative_selections.items():
+            if integration not in integrations_to_tasks_mapping:
+                selection.cancel()
+
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+
+        async def select(integration, tasks):
+            if integration in speculative_selections:
+                try:
+                    selected_examples = await speculative_selections[integration]
+                    if selected_examples:
+                        return selected_examples
+                except Exception as e:
+                    print (f"Speculative example selection of API {integration} failed: {e}")
+
+            async with semaphore:
+                return await self.select_relevant_examples(integration, tasks, max_examples=2)
+
+        selected = await asyncio.gather(*[
+                                select(integration, tasks)
+                                for integration, tasks in integrations_to_tasks_mapping.items()
+                            ])
+
+        all_examples = dict(zip(integrations_to_tasks_mapping.keys(), selected))
+
+        # Load selected examples from their respective files
+        selected_code_snippets = self.load_relevant_examples(all_examples)
+
+        return selected_code_snippets
+
+    def __record_speculation(self, predicted, confirmed):
+        speculation = {
+            "predicted": predicted,
+            "hits": [integration for integration in predicted if integration in confirmed],
+            "mispredicted": [integration for integration in predicted if integration not in confirmed],
+            "missed": [integration for integration in confirmed if integration not in predicted],
+        }
+        print (f"Speculative example selection: {speculation}")
+        record_attributes(speculation=speculation)
+
+    async def select_relevant_examples(self, integration, tasks, max_examples=1):
+        """
+        Async version of `AutomateRAG.select_relevant_examples`. The embedding lookup runs in a worker thread.
+        """
+        if self.example_selector == "llm":
+            return await self.identify_relevant_examples(integration, tasks, max_examples=max_examples)
+
+        candidates = await asyncio.to_thread(
+                                self._rank_examples_by_embedding,
+                                integration=integration,
+                                tasks=tasks,
+                                max_examples=max_examples
+                            )
+
+        if self.rerank_examples and len(candidates) > max_examples:
+            return await self.identify_relevant_examples(integration, tasks, max_examples=max_examples, candidates=candidates)
+
+        return candidates[:max_examples]
+
+    async def identify_relevant_examples(self, integration, tasks, max_examples=1, candidates=None):
+
+        requests = self._example_selection_requests(integration=integration, tasks=tasks, max_examples=max_examples, candidates=candidates)
+        try:
+            model, prompt = next(requests)
+            while True:
+                output = await self.__invoke_llm_api(llm_name=model, query=prompt)
+                model, prompt = requests.send(output)
+        except StopIteration as stop:
+            return stop.value
+
+    async def __invoke_llm_api(self, llm_name, query, **params):
+        """
+        Generic method to call LLM API asynchronously
+        """
+
+        with trace_llm_call(model=llm_name) as llm_call:
+            cache_key = self._llm_cache_key(llm_name=llm_name, query=query, **params)
+            cached_output = await asyncio.to_thread(self._cached_llm_output, cache_key)
+            if cached_output is not None:
+                llm_call["cache_hit"] = True
+                return cached_output
+
+            completion = await self.main_llm_client.chat.completions.create(**self._completion_params(llm_name=llm_name, query=query, **params))
+            output = self._completion_output(llm_call, completion)
+
+        await asyncio.to_thread(self._store_llm_output, cache_key, output)
+
+        return output
+
+    async def __stream_llm_api(self, llm_name, query):
+        """
+        Generic method to call LLM API with a streamed response. Yields the content deltas.
+        A cached response is yielded in one piece.
+        """
+        cache_key = self._llm_cache_key(llm_name=llm_name, query=query)
+        cached_output = await asyncio.to_thread(self._cached_llm_output, cache_key)
+        if cached_output is not None:
+            with trace_llm_call(model=llm_name, streamed=True) as llm_call:
+                llm_call["cache_hit"] = True
+            yield cached_output
+            return
+
+        output_chunks = []
+        with trace_llm_call(model=llm_name, streamed=True):
+            stream = await self.main_llm_client.chat.completions.create(**self._completion_params(llm_name=llm_name, query=query, stream=True))
+
+            async for chunk in stream:
+                delta = self._stream_delta(chunk)
+                if delta:
+                    output_chunks.append(delta)
+                    yield delta
+
+        await asyncio.to_thread(self._store_llm_output, cache_key, "".join(output_chunks))
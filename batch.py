@@ -0,0 +1,203 @@
+"""
+Batch mode for the RAG pipelines.
+
+Reads job descriptions from a JSONL file, runs them through a bounded pool of worker threads and streams every
+result to an output JSONL file as soon as it is ready. Job IDs that already have a successful result in the
+output file are skipped, so an interrupted run can be restarted without paying again for the finished jobs.
+
+Rate limits and retries are handled per LLM request by the shared client layer (see `llm_clients.py`): the
+`--llm-rpm`/`--llm-tpm` limits are shared by all the workers.
+
+python batch.py requests.jsonl results.jsonl --mode smart_automate --workers 8 --llm-rpm 500
+
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_clients import SUPPORTED_PROVIDERS, set_rate_limits
+from embedders import SUPPORTED_EMBEDDERS
+
+SUPPORTED_MODES = ("automate", "smart_automate")
+
+
+def read_jobs(input_path, id_field="request_id", text_field="body"):
+    """
+    Read job descriptions from a JSONL file.
+
+    :param input_path: JSONL file with one job per line
+    :param id_field: field holding the unique ID of a job
+    :param text_field: field holding the job description
+    :return: list of (job_id, job_description) tuples in file order
+    """
+    jobs = []
+    with open(input_path, 'r', encoding='utf-8') as infile:
+        for line_number, line in enumerate(infile, start=1):
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            if id_field not in record or text_field not in record:
+                raise ValueError(f"Line {line_number} of {input_path} has no '{id_field}' or '{text_field}' field.")
+
+            jobs.append((str(record[id_field]), record[text_field]))
+
+    return jobs
+
+
+def read_completed_ids(output_path, id_field="request_id"):
+    """
+    IDs of the jobs that already have a successful result in `output_path`.
+    Failed jobs are not returned, so that they are retried on the next run.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r', encoding='utf-8') as infile:
+        for line in infile:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash in the middle of a write can leave a truncated last line behind
+                continue
+
+            # Records without an ID cannot be matched to a job
+            job_id = record.get(id_field) if isinstance(record, dict) else None
+            if job_id is not None and "error" not in record:
+                completed.add(str(job_id))
+
+    return completed
+
+
+def ends_with_truncated_line(path):
+    """
+    Whether the last line of `path` is missing its newline, e.g. after a crash in the middle of a write
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+
+    with open(path, 'rb') as infile:
+        infile.seek(-1, os.SEEK_END)
+        return infile.read(1) != b"\n"
+
+
+def run_batch(input_path, output_path, mode="smart_automate", workers=4, id_field="request_id", text_field="body", rag=None):
+    """
+    Run every job of `input_path` through `mode` and append the results to `output_path`.
+
+    :param input_path: JSONL file with the job descriptions
+    :param output_path: JSONL file the results are streamed to. Existing successful results are skipped.
+    :param mode: pipeline to run, either 'automate' or 'smart_automate'
+    :param workers: number of jobs processed in parallel
+    :param id_field: field holding the unique ID of a job
+    :param text_field: field holding the job description
+    :param rag: pipeline instance shared by all workers. A new `AutomateRAG` is created by default.
+    :return: dictionary with the number of succeeded, failed and skipped jobs
+    """
+    if mode not in SUPPORTED_MODES:
+        raise ValueError(f"{mode} is not a supported mode. Please use one of {SUPPORTED_MODES}.")
+
+    if rag is None:
+        from rag import AutomateRAG
+        rag = AutomateRAG()
+
+    jobs = read_jobs(input_path, id_field=id_field, text_field=text_field)
+    completed_ids = read_completed_ids(output_path, id_field=id_field)
+    pending_jobs = [(job_id, job_description) for job_id, job_description in jobs if job_id not in completed_ids]
+
+    print (f"{len(jobs)} jobs found, {len(jobs) - len(pending_jobs)} already completed, {len(pending_jobs)} to run.")
+
+    summary = {"succeeded": 0, "failed": 0, "skipped": len(jobs) - len(pending_jobs)}
+
+    truncated = ends_with_truncated_line(output_path)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(output_path, 'a', encoding='utf-8') as outfile:
+        # Terminate a truncated last line so that the next result is not glued to it
+        if truncated:
+            outfile.write("\n")
+
+        futures = {}
+        for job_id, job_description in pending_jobs:
+            future = executor.submit(getattr(rag, mode), job_description)
+            futures[future] = (job_id, time.perf_counter())
+
+        for future in as_completed(futures):
+            job_id, start = futures[future]
+            record = {id_field: job_id, "mode": mode}
+
+            try:
+                record["output"] = future.result()
+                summary["succeeded"] += 1
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                summary["failed"] += 1
+
+            record["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+
+            # Stream the result right away so that a crash never loses finished jobs
+            outfile.write(json.dumps(record) + "\n")
+            outfile.flush()
+
+            print (f"Job {job_id} finished ({'error' if 'error' in record else 'ok'}).")
+
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of job descriptions through the RAG pipelines.")
+    parser.add_argument("input_path", help="JSONL file with one job description per line")
+    parser.add_argument("output_path", help="JSONL file the results are appended to")
+    parser.add_argument("--mode", choices=SUPPORTED_MODES, default="smart_automate")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--id-field", default="request_id")
+    parser.add_argument("--text-field", default="body")
+    parser.add_argument("--llm-cache", default=None, help="SQLite file used to cache LLM responses across runs")
+    parser.add_argument("--llm-provider", choices=SUPPORTED_PROVIDERS, default="openai")
+    parser.add_argument("--llm-base-url", default=None, help="endpoint of an OpenAI compatible server")
+    parser.add_argument("--llm-rpm", type=float, default=None, help="requests per minute limit of the main LLM")
+    parser.add_argument("--llm-tpm", type=float, default=None, help="tokens per minute limit of the main LLM")
+    parser.add_argument("--semantic-cache-threshold", type=float, default=None,
+                        help="reuse the task breakdown of similar job descriptions (cosine similarity threshold)")
+    parser.add_argument("--embedder", choices=SUPPORTED_EMBEDDERS, default="openai",
+                        help="embedder of the semantic cache and the example index, 'local' embeds without any network call")
+    parser.add_argument("--stage-model", action="append", default=[], metavar="STAGE=MODEL",
+                        help="model of a pipeline stage, e.g. break_job_into_tasks=gpt-3.5-turbo-0125")
+    args = parser.parse_args()
+
+    from rag import AutomateRAG
+    from utils.llm_cache import SQLiteLLMCache
+    from semantic_cache import SemanticCache
+    from embedders import create_embedder
+
+    embedder = create_embedder(args.embedder, provider=args.llm_provider, base_url=args.llm_base_url)
+    rag = AutomateRAG(
+                llm_cache=SQLiteLLMCache(path=args.llm_cache) if args.llm_cache else None,
+                llm_provider=args.llm_provider,
+                llm_base_url=args.llm_base_url,
+                stage_models=dict(stage_model.split("=", 1) for stage_model in args.stage_model),
+                semantic_cache=SemanticCache(threshold=args.semantic_cache_threshold, embedder=embedder) if args.semantic_cache_threshold else None,
+                embedder=embedder
+            )
+    # The stages may run on smaller models than `main_llm`, each of them is throttled
+    for model in dict.fromkeys([rag.main_llm, *rag.stage_models.values()]):
+        set_rate_limits(model, requests_per_minute=args.llm_rpm, tokens_per_minute=args.llm_tpm)
+
+    summary = run_batch(
+                    input_path=args.input_path,
+                    output_path=args.output_path,
+                    mode=args.mode,
+                    workers=args.workers,
+                    id_field=args.id_field,
+                    text_field=args.text_field,
+                    rag=rag
+            )
+
+    print (f"\nBatch finished: {summary}")
+
+    if rag.llm_cache is not None:
+        print (f"LLM cache: {rag.llm_cache.stats()}")
+
+    if rag.semantic_cache is not None:
+        print (f"Semantic cache: {rag.semantic_cache.stats()}")
@@ -0,0 +1,165 @@
+"""
+Startup cost benchmark: import time of the modules and construction / first use time of the pipelines.
+
+Every measurement runs in a fresh interpreter, so that nothing is already imported or cached, and is repeated
+`--repeats` times. For every module the benchmark reports the median and minimum import time, and the modules with
+the largest cumulative import time according to `python -X importtime`. For the pipelines it reports the time to
+construct `AutomateRAG` / `AsyncAutomateRAG` and to load the integration catalog on first use, with and without a
+catalog snapshot (see `integration_catalog.py`). The results are written as JSON so that two commits can be compared.
+
+Run it from the project folder:
+
+python benchmarks/bench_import.py --repeats 10 --output bench_import.json
+
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import git_commit
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["rag", "async_rag", "embeddings", "server"]
+
+IMPORT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import_ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+PIPELINE_SCRIPT = """
+import contextlib, io, json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    rag = {module}.{class_name}(prompt_token_budget=None)
+    constructed = time.perf_counter()
+    rag.integration_catalog
+    catalog_loaded = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "construct_ms": (constructed - imported) * 1000,
+    "catalog_ms": (catalog_loaded - constructed) * 1000,
+}}))
+"""
+
+
+def run_python(code, env=None, importtime=False):
+    """
+    Run `code` in a fresh interpreter from the project folder.
+
+    :return: (JSON printed on the last line of stdout, stderr)
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(command, cwd=PROJECT_DIR, env=env, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark subprocess failed:\n{result.stderr}")
+
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def summarize(samples):
+    """
+    Median and minimum of every measurement of `samples`
+    """
+    return {
+        field: {
+            "median": round(statistics.median(sample[field] for sample in samples), 3),
+            "min": round(min(sample[field] for sample in samples), 3),
+        }
+        for field in samples[0]
+    }
+
+
+def slowest_imports(importtime_output, top=10):
+    """
+    Modules with the largest cumulative import time (ms) in the output of `python -X importtime`
+    """
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports.append((module.strip(), round(int(cumulative_us) / 1000, 3)))
+
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure_import(module, repeats, env):
+    samples = [run_python(IMPORT_SCRIPT.format(module=module), env=env)[0] for _ in range(repeats)]
+    result, importtime_output = run_python(IMPORT_SCRIPT.format(module=module), env=env, importtime=True)
+
+    return {"module": module, **summarize(samples), "slowest_imports": slowest_imports(importtime_output)}
+
+
+def measure_pipeline(module, class_name, repeats, env):
+    samples = [run_python(PIPELINE_SCRIPT.format(module=module, class_name=class_name), env=env)[0] for _ in range(repeats)]
+
+    return {"pipeline": f"{module}.{class_name}", **summarize(samples)}
+
+
+def main(args):
+    env = dict(os.environ)
+    env.pop("INTEGRATION_CATALOG_SNAPSHOT", None)
+
+    imports = []
+    for module in args.modules:
+        imports.append(measure_import(module, args.repeats, env))
+        print (f"import {module}: {imports[-1]['import_ms']['median']} ms (median)", file=sys.stderr)
+
+    pipelines = []
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        snapshot_env = dict(env, INTEGRATION_CATALOG_SNAPSHOT=os.path.join(snapshot_dir, "integration_catalog.pickle"))
+
+        for label, pipeline_env in (("metadata", env), ("snapshot", snapshot_env)):
+            # The first run writes the snapshot
+            run_python(PIPELINE_SCRIPT.format(module="rag", class_name="AutomateRAG"), env=pipeline_env)
+
+            for module, class_name in (("rag", "AutomateRAG"), ("async_rag", "AsyncAutomateRAG")):
+                result = measure_pipeline(module, class_name, args.repeats, pipeline_env)
+                result["catalog_source"] = label
+                pipelines.append(result)
+
+                print (f"{module}.{class_name} ({label}): construct {result['construct_ms']['median']} ms, "
+                       f"catalog {result['catalog_ms']['median']} ms (median)", file=sys.stderr)
+
+    return {
+        "benchmark": "import",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {"repeats": args.repeats, "modules": args.modules},
+        "imports": imports,
+        "pipelines": pipelines,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the import and construction time of the pipelines.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="modules whose import time is measured")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--output", default=None, help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+
+    benchmark = main(args)
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(benchmark, outfile, indent=4)
+    else:
+        print (json.dumps(benchmark, indent=4))
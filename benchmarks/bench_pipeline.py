@@ -0,0 +1,297 @@
+"""
+Offline benchmark of the RAG pipelines.
+
+The OpenAI client of the pipeline is replaced by the deterministic fake of `benchmarks/fake_llm.py`, so the benchmark
+measures the pipeline's own overhead and its behaviour under load for free. The job descriptions of a JSONL file
+(`requests.jsonl` by default, same format as `batch.py`) are replayed through `automate` and `smart_automate` at
+several concurrency levels. For every (mode, concurrency) pair the benchmark reports the throughput, the p50/p95/p99
+request latency, the LLM tokens per request and the peak traced memory. The results are written as JSON so that
+two commits can be compared.
+
+Run it from the project folder:
+
+python benchmarks/bench_pipeline.py --concurrency 1 4 16 --latency-median-ms 200 --output bench_output.json
+
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_rag import AsyncAutomateRAG
+from batch import SUPPORTED_MODES, read_jobs
+from llm_clients import AsyncLLMClient, LLMClient
+from benchmarks.fake_llm import CannedResponder, FakeAsyncOpenAI, FakeOpenAI, LatencyModel, SUPPORTED_DISTRIBUTIONS
+from rag import AutomateRAG, CODE_GENERATION_MODES
+
+# Used when there is no job file to replay
+DEFAULT_JOBS = [
+    ("default-1", "Every Monday at 9 AM, fetch the open Linear issues and post a summary to the #team Slack channel."),
+    ("default-2", "When a new row is added to the Airtable 'Leads' table, send a welcome email with SendGrid."),
+    ("default-3", "When a GitHub issue is labelled 'bug', create a Linear issue and notify the on-call channel on Slack."),
+    ("default-4", "Every day at 6 PM, summarize the new Supabase sign ups with OpenAI and email the summary via Gmail."),
+]
+
+
+def load_jobs(jobs_path, id_field="request_id", text_field="body", num_requests=None):
+    """
+    Job descriptions to replay: the jobs of `jobs_path` when it exists, the built-in jobs otherwise.
+    When `num_requests` is given, the jobs are cycled (or cut) to exactly that many requests.
+    """
+    if jobs_path and os.path.exists(jobs_path):
+        jobs = read_jobs(jobs_path, id_field=id_field, text_field=text_field)
+    else:
+        print (f"No job file found at {jobs_path}, using the {len(DEFAULT_JOBS)} built-in job descriptions.")
+        jobs = list(DEFAULT_JOBS)
+
+    if not jobs:
+        raise ValueError(f"No job description found in {jobs_path}.")
+
+    if num_requests is not None:
+        jobs = [jobs[i % len(jobs)] for i in range(num_requests)]
+
+    return jobs
+
+
+def percentile(values, q):
+    """
+    q-th percentile of `values` with linear interpolation between the closest ranks
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return round(values[lower] + (values[upper] - values[lower]) * (position - lower), 3)
+
+
+def summarize_run(mode, concurrency, samples, duration_seconds, peak_memory_bytes):
+    """
+    :param samples: one dictionary per request with `latency_ms`, `error` and the tracing `totals` of the run
+    """
+    succeeded = [sample for sample in samples if sample["error"] is None]
+    latencies = [sample["latency_ms"] for sample in succeeded]
+
+    def per_request(field):
+        return round(sum(sample["totals"][field] for sample in succeeded) / len(succeeded), 2) if succeeded else None
+
+    prompt_tokens = per_request("prompt_tokens")
+    completion_tokens = per_request("completion_tokens")
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "first_error": next((sample["error"] for sample in samples if sample["error"] is not None), None),
+        "duration_seconds": round(duration_seconds, 3),
+        "throughput_rps": round(len(succeeded) / duration_seconds, 3) if duration_seconds else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=None),
+        },
+        "llm_calls_per_request": per_request("llm_calls"),
+        "tokens_per_request": {
+            "prompt": prompt_tokens,
+            "completion": completion_tokens,
+            "total": round(prompt_tokens + completion_tokens, 2) if succeeded else None,
+        },
+        "peak_memory_mb": round(peak_memory_bytes / 2**20, 3),
+    }
+
+
+def run_request(rag, mode, job_description):
+    start = time.perf_counter()
+    try:
+        output, report = getattr(rag, mode)(job_description, return_report=True)
+        totals, error = report["totals"], None
+    except Exception as e:
+        totals, error = None, f"{type(e).__name__}: {e}"
+
+    return {"latency_ms": round((time.perf_counter() - start) * 1000, 3), "totals": totals, "error": error}
+
+
+async def run_request_async(rag, mode, job_description, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            output, report = await getattr(rag, mode)(job_description, return_report=True)
+            totals, error = report["totals"], None
+        except Exception as e:
+            totals, error = None, f"{type(e).__name__}: {e}"
+
+        return {"latency_ms": round((time.perf_counter() - start) * 1000, 3), "totals": totals, "error": error}
+
+
+def run_benchmark(rag, mode, jobs, concurrency, use_async=False):
+    """
+    Replay `jobs` through `rag.<mode>` with `concurrency` requests in flight.
+
+    :param rag: `AutomateRAG` (worker threads) or `AsyncAutomateRAG` (asyncio tasks when `use_async` is set)
+    :return: summary of the run (see `summarize_run`)
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+
+    if use_async:
+        async def run_all():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*[run_request_async(rag, mode, job_description, semaphore) for job_id, job_description in jobs])
+
+        samples = asyncio.run(run_all())
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(lambda job: run_request(rag, mode, job[1]), jobs))
+
+    duration_seconds = time.perf_counter() - start
+    current_memory_bytes, peak_memory_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return summarize_run(mode, concurrency, samples, duration_seconds, peak_memory_bytes)
+
+
+def create_benchmark_rag(latency, responder, use_async=False, prompt_token_budget=16000, **rag_kwargs):
+    """
+    Pipeline whose LLM calls are answered by the fake OpenAI client
+    """
+    # The fake sits behind the same retrying client layer as the real API
+    if use_async:
+        rag = AsyncAutomateRAG(prompt_token_budget=prompt_token_budget, **rag_kwargs)
+        rag.main_llm_client = AsyncLLMClient(FakeAsyncOpenAI(latency=latency, responder=responder))
+    else:
+        rag = AutomateRAG(prompt_token_budget=prompt_token_budget, **rag_kwargs)
+        rag.main_llm_client = LLMClient(FakeOpenAI(latency=latency, responder=responder))
+
+    return rag
+
+
+def parse_assignment(value):
+    """
+    Split a 'key=value' command line argument
+    """
+    key, separator, value = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"Expected key=value, got {key}.")
+
+    return key, value
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    jobs = load_jobs(args.jobs, id_field=args.id_field, text_field=args.text_field, num_requests=args.num_requests)
+
+    latency = LatencyModel(
+                    distribution=args.latency_distribution,
+                    median_ms=args.latency_median_ms,
+                    sigma=args.latency_sigma,
+                    low_ms=args.latency_low_ms,
+                    high_ms=args.latency_high_ms,
+                    per_token_ms=args.latency_per_token_ms,
+                    model_scales=dict((model, float(scale)) for model, scale in map(parse_assignment, args.model_latency_scale)),
+                    seed=args.seed
+                )
+    responder = CannedResponder(code_tokens=args.code_tokens)
+    prompt_token_budget = args.prompt_token_budget or None
+    stage_models = dict(map(parse_assignment, args.stage_model))
+    # Only the async pipeline speculates
+    rag_kwargs = {"speculative_examples": True} if args.speculative_examples else {}
+    rag_kwargs["code_generation"] = args.code_generation
+
+    results = []
+    for mode in args.modes:
+        for concurrency in args.concurrency:
+            # The pipelines print every step, which would dominate the measurements
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                rag = create_benchmark_rag(latency, responder, use_async=args.use_async, prompt_token_budget=prompt_token_budget,
+                                           stage_models=stage_models, **rag_kwargs)
+                result = run_benchmark(rag, mode, jobs, concurrency, use_async=args.use_async)
+
+            results.append(result)
+            print (f"{mode} @ concurrency {concurrency}: {result['throughput_rps']} req/s, "
+                   f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms, {result['errors']} errors", file=sys.stderr)
+
+    return {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "jobs": args.jobs if os.path.exists(args.jobs) else "built-in",
+            "requests": len(jobs),
+            "async": args.use_async,
+            "prompt_token_budget": prompt_token_budget,
+            "stage_models": stage_models,
+            "speculative_examples": args.speculative_examples,
+            "code_generation": args.code_generation,
+            "code_tokens": args.code_tokens,
+            "latency": latency.config(),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipelines against a fake LLM backend.")
+    parser.add_argument("--jobs", default="requests.jsonl", help="JSONL file of job descriptions to replay")
+    parser.add_argument("--id-field", default="request_id", help="field holding the unique ID of a job")
+    parser.add_argument("--text-field", default="body", help="field holding the job description")
+    parser.add_argument("--num-requests", type=int, default=None, help="number of requests per run (jobs are cycled)")
+    parser.add_argument("--modes", nargs="+", choices=SUPPORTED_MODES, default=list(SUPPORTED_MODES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="concurrency levels to measure")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="benchmark AsyncAutomateRAG instead of worker threads")
+    parser.add_argument("--latency-distribution", choices=SUPPORTED_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-median-ms", type=float, default=200.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="shape of the lognormal distribution")
+    parser.add_argument("--latency-low-ms", type=float, default=100.0, help="lower bound of the uniform distribution")
+    parser.add_argument("--latency-high-ms", type=float, default=300.0, help="upper bound of the uniform distribution")
+    parser.add_argument("--latency-per-token-ms", type=float, default=0.0, help="extra latency per completion token")
+    parser.add_argument("--model-latency-scale", action="append", default=[], metavar="MODEL=SCALE",
+                        help="latency multiplier of a model, e.g. gpt-3.5-turbo-0125=0.25")
+    parser.add_argument("--stage-model", action="append", default=[], metavar="STAGE=MODEL",
+                        help="model of a pipeline stage, e.g. break_job_into_tasks=gpt-3.5-turbo-0125")
+    parser.add_argument("--speculative-examples", action="store_true",
+                        help="select the examples of the integrations named in the job while the breakdown runs (requires --async)")
+    parser.add_argument("--code-generation", choices=CODE_GENERATION_MODES, default="single",
+                        help="generate the code in one call or as a skeleton plus one call per task")
+    parser.add_argument("--code-tokens", type=int, default=400, help="size of the canned generated code")
+    parser.add_argument("--prompt-token-budget", type=int, default=16000, help="code generation prompt budget, 0 for no limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="keep the output of the pipelines")
+    args = parser.parse_args()
+
+    if min(args.concurrency) < 1:
+        parser.error("--concurrency levels must be at least 1")
+
+    if args.speculative_examples and not args.use_async:
+        parser.error("--speculative-examples requires --async")
+
+    benchmark = main(args)
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(benchmark, outfile, indent=4)
+    else:
+        print (json.dumps(benchmark, indent=4))
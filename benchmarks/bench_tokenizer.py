@@ -0,0 +1,165 @@
+"""
+Tokenizer benchmark: the shared tokenizer of `utils/tokenizer.py` against the previous per call functions.
+
+The previous functions of `utils/rag_utils.py` looked the encoding up with `tiktoken.get_encoding` on every call and
+encoded one text at a time. The benchmark counts, truncates and chunks the same texts (the integration examples and
+the markdown of a crawl dump) with both, and reports the median time of `--repeats` runs and the speedup of every
+operation. The results are written as JSON so that two commits can be compared.
+
+The tiktoken encoding files must be available (downloaded once, or cached in `TIKTOKEN_CACHE_DIR`).
+
+Run it from the project folder:
+
+python benchmarks/bench_tokenizer.py --repeats 5 --output bench_tokenizer.json
+
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import git_commit
+from utils.dataset_loader import iter_records
+from utils.tokenizer import Tokenizer
+
+DEFAULT_DATASET = "datasets/dataset_trigger-dev-examples_2024-03-16_13-56-52-250.json"
+
+
+def legacy_count(text, encoding_name):
+    import tiktoken
+    encoding = tiktoken.get_encoding(encoding_name)
+    return len(encoding.encode(text))
+
+
+def legacy_truncate(text, max_tokens, encoding_name):
+    import tiktoken
+    encoding = tiktoken.get_encoding(encoding_name)
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def legacy_chunk(text, max_tokens, encoding_name):
+    import tiktoken
+    encoding = tiktoken.get_encoding(encoding_name)
+    tokens = encoding.encode(text)
+    return [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+
+
+def load_texts(dataset_path, num_texts=None):
+    """
+    The integration examples and the markdown of the pages of a crawl dump
+    """
+    texts = []
+    for path in sorted(glob.glob(os.path.join("integrations", "*", "*.txt"))):
+        with open(path, "r", encoding="utf-8") as file:
+            texts.append(file.read())
+
+    if dataset_path:
+        texts.extend(record["markdown"] for record in iter_records(dataset_path, fields=["markdown"]) if record.get("markdown"))
+
+    return texts[:num_texts] if num_texts else texts
+
+
+def measure(function, repeats):
+    """
+    Median wall time (ms) of `repeats` calls of `function`
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return round(statistics.median(durations), 3)
+
+
+def main(args):
+    texts = load_texts(args.dataset, num_texts=args.num_texts)
+    tokenizer = Tokenizer(encoding_name=args.encoding, num_threads=args.num_threads)
+
+    # Load the encoding outside of the measurements, for both implementations
+    tokenizer.count("warm up")
+    legacy_count("warm up", args.encoding)
+
+    # Both implementations must agree before being compared (the texts have no special tokens)
+    assert [legacy_count(text, args.encoding) for text in texts] == tokenizer.count_batch(texts)
+    assert [legacy_chunk(text, args.chunk_size, args.encoding) for text in texts] == tokenizer.chunk_batch(texts, args.chunk_size)
+
+    operations = {
+        "count": (
+            lambda: [legacy_count(text, args.encoding) for text in texts],
+            lambda: [tokenizer.count(text) for text in texts],
+            lambda: tokenizer.count_batch(texts),
+        ),
+        "truncate": (
+            lambda: [legacy_truncate(text, args.max_tokens, args.encoding) for text in texts],
+            lambda: [tokenizer.truncate(text, args.max_tokens) for text in texts],
+            lambda: tokenizer.truncate_batch(texts, args.max_tokens),
+        ),
+        "chunk": (
+            lambda: [legacy_chunk(text, args.chunk_size, args.encoding) for text in texts],
+            lambda: [tokenizer.chunk(text, args.chunk_size) for text in texts],
+            lambda: tokenizer.chunk_batch(texts, args.chunk_size),
+        ),
+    }
+
+    results = []
+    for operation, (legacy, per_text, batched) in operations.items():
+        result = {
+            "operation": operation,
+            "legacy_ms": measure(legacy, args.repeats),
+            "tokenizer_ms": measure(per_text, args.repeats),
+            "tokenizer_batch_ms": measure(batched, args.repeats),
+        }
+        result["speedup"] = round(result["legacy_ms"] / result["tokenizer_ms"], 2)
+        result["batch_speedup"] = round(result["legacy_ms"] / result["tokenizer_batch_ms"], 2)
+        results.append(result)
+
+        print (f"{operation}: legacy {result['legacy_ms']} ms, tokenizer {result['tokenizer_ms']} ms (x{result['speedup']}), "
+               f"batch {result['tokenizer_batch_ms']} ms (x{result['batch_speedup']})", file=sys.stderr)
+
+    return {
+        "benchmark": "tokenizer",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "encoding": args.encoding,
+            "texts": len(texts),
+            "characters": sum(len(text) for text in texts),
+            "num_threads": tokenizer.num_threads,
+            "max_tokens": args.max_tokens,
+            "chunk_size": args.chunk_size,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the shared tokenizer against the per call functions.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="crawl dump whose markdown is tokenized, '' for the examples only")
+    parser.add_argument("--num-texts", type=int, default=None, help="only tokenize the first texts")
+    parser.add_argument("--encoding", default="cl100k_base")
+    parser.add_argument("--num-threads", type=int, default=None, help="thread pool size of the batch methods (default: up to 8, one per CPU)")
+    parser.add_argument("--max-tokens", type=int, default=200, help="truncation length")
+    parser.add_argument("--chunk-size", type=int, default=512, help="chunk length in tokens")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+
+    benchmark = main(args)
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(benchmark, outfile, indent=4)
+    else:
+        print (json.dumps(benchmark, indent=4))
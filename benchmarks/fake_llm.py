@@ -0,0 +1,243 @@
+"""
+Deterministic stand-in for the OpenAI chat completions API, used to benchmark the pipelines offline.
+
+`FakeOpenAI` and `FakeAsyncOpenAI` expose the small part of the OpenAI client the pipelines use
+(`client.chat.completions.create(...)`, streamed or not) and answer every prompt with a canned response:
+
+    - task breakdown prompt: a schema conforming JSON with one task per integration named in the job description
+    - example selection prompt: the first examples listed in the prompt
+    - code generation prompt: a fixed TypeScript snippet of `code_tokens` tokens
+    - per task code generation prompts (see `task_codegen.py`): a skeleton with the placeholders of the prompt,
+      and task statements of about `code_tokens` tokens divided by the number of tasks
+
+Every call waits for a latency drawn from a configurable distribution. The latency and the response only depend on
+the seed and the prompt, so two runs of a benchmark issue exactly the same calls with exactly the same delays,
+whatever the order in which concurrent requests reach the fake.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+SUPPORTED_DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+
+BREAKDOWN_MARKER = "**Predefined list of 3rd party APIs/integrations**"
+SELECTION_MARKER = "You are given some example usecases"
+SKELETON_MARKER = "Generated `trigger.dev` Typescript code skeleton"
+TASK_MARKER = "Generated Typescript statements of the task"
+
+CODE_SNIPPET = """import { TriggerClient, eventTrigger } from "@trigger.dev/sdk";
+
+const client = new TriggerClient({ id: "benchmark" });
+
+client.defineJob({
+  id: "benchmark-job",
+  name: "Benchmark job",
+  version: "1.0.0",
+  trigger: eventTrigger({ name: "benchmark.event" }),
+  run: async (payload, io, ctx) => {
+    await io.logger.info("Hello world!", { payload });
+  },
+});
+"""
+
+TASK_STATEMENT = """await io.logger.info("Running the task", { payload });"""
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token), good enough to report plausible usage without a tokenizer
+    """
+    return max(1, len(text) // 4)
+
+
+class LatencyModel:
+    """
+    Latency of a fake LLM call: a base latency drawn from `distribution` plus `per_token_ms` per completion token.
+
+    :param distribution: 'constant' (always `median_ms`), 'uniform' (between `low_ms` and `high_ms`)
+                         or 'lognormal' (median `median_ms`, shape `sigma`)
+    :param model_scales: optional model name -> latency multiplier, e.g. to make a small model 4x faster
+    :param seed: the latency of a call is derived from the seed and the prompt only
+    """
+    def __init__(self, distribution="lognormal", median_ms=200.0, sigma=0.5, low_ms=100.0, high_ms=300.0,
+                 per_token_ms=0.0, model_scales=None, seed=0) -> None:
+        if distribution not in SUPPORTED_DISTRIBUTIONS:
+            raise ValueError(f"{distribution} latency distribution currently not supported. Please use one of {SUPPORTED_DISTRIBUTIONS}.")
+
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.low_ms = low_ms
+        self.high_ms = high_ms
+        self.per_token_ms = per_token_ms
+        self.model_scales = dict(model_scales or {})
+        self.seed = seed
+
+    def sample(self, prompt, completion_tokens=0, model=None):
+        """
+        Latency in seconds of the call of `model` answering `prompt` with `completion_tokens` tokens
+        """
+        rng = random.Random(f"{self.seed}:{prompt}")
+
+        if self.distribution == "constant":
+            latency_ms = self.median_ms
+        elif self.distribution == "uniform":
+            latency_ms = rng.uniform(self.low_ms, self.high_ms)
+        else:
+            latency_ms = self.median_ms * math.exp(self.sigma * rng.gauss(0.0, 1.0))
+
+        return (latency_ms + self.per_token_ms * completion_tokens) * self.model_scales.get(model, 1.0) / 1000
+
+    def config(self):
+        return dict(vars(self))
+
+
+class CannedResponder:
+    """
+    Canned answers to the kinds of prompts sent by the pipelines
+    """
+    def __init__(self, code_tokens=400, default_integrations=("slack",)) -> None:
+        # Repeat the snippet until it is about `code_tokens` tokens long
+        repeats = max(1, round(code_tokens / estimate_tokens(CODE_SNIPPET)))
+        self.code = "\n".join([CODE_SNIPPET] * repeats)
+        self.code_tokens = code_tokens
+        self.default_integrations = list(default_integrations)
+
+    def respond(self, prompt):
+        if BREAKDOWN_MARKER in prompt:
+            return self.__tasks_and_trigger(prompt)
+
+        if SELECTION_MARKER in prompt:
+            return self.__selected_examples(prompt)
+
+        if SKELETON_MARKER in prompt:
+            placeholders = "\n".join(f"    {placeholder}" for placeholder in dict.fromkeys(re.findall(r"^// TASK \d+$", prompt, re.MULTILINE)))
+            return CODE_SNIPPET.replace('    await io.logger.info("Hello world!", { payload });', placeholders)
+
+        if TASK_MARKER in prompt:
+            num_tasks = max(1, prompt.count('"task_sequence_id"'))
+            repeats = max(1, round(self.code_tokens / num_tasks / estimate_tokens(TASK_STATEMENT)))
+            return "\n".join([TASK_STATEMENT] * repeats)
+
+        return self.code
+
+    def __tasks_and_trigger(self, prompt):
+        job_description, _, valid_integrations = prompt.partition(BREAKDOWN_MARKER)
+        # The instructions above the job description mention integrations too
+        job_description = job_description.rpartition("**Job Description**")[2]
+        valid_integrations = re.findall(r"'([\w-]+)'", valid_integrations)
+
+        integrations = [integration for integration in valid_integrations if integration in job_description.lower()]
+        integrations = integrations or self.default_integrations
+
+        tasks_and_trigger = {
+            "job_trigger": {
+                "type": "schedule",
+                "explanation": "Run the job every day at 9 AM",
+                "params": "0 9 * * *",
+                "integrations": []
+            },
+            "tasks": [
+                {
+                    "task_sequence_id": sequence_id,
+                    "task_desc": f"Use {integration} to complete step {sequence_id} of the job",
+                    "integrations": [integration]
+                }
+                for sequence_id, integration in enumerate(integrations, start=1)
+            ]
+        }
+
+        return json.dumps(tasks_and_trigger, indent=4)
+
+    def __selected_examples(self, prompt):
+        example_names = list(dict.fromkeys(re.findall(r"[\w-]+\.txt", prompt)))
+
+        return "\n".join(f"{rank}. {name}: helpful for the tasks" for rank, name in enumerate(example_names[:2], start=1))
+
+
+class FakeCompletions:
+    def __init__(self, llm, sleep) -> None:
+        self.llm = llm
+        self.sleep = sleep
+
+    def create(self, model, messages, stream=False, **kwargs):
+        content, latency, usage = self.llm.answer(model, messages)
+        self.sleep(latency)
+
+        if stream:
+            return iter(self.llm.stream_chunks(content))
+
+        return self.llm.completion(content, usage)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, model, messages, stream=False, **kwargs):
+        content, latency, usage = self.llm.answer(model, messages)
+        await asyncio.sleep(latency)
+
+        if stream:
+            return self.__aiterate(self.llm.stream_chunks(content))
+
+        return self.llm.completion(content, usage)
+
+    async def __aiterate(self, chunks):
+        for chunk in chunks:
+            yield chunk
+
+
+class FakeOpenAI:
+    """
+    Synchronous fake OpenAI client. Counts the calls it served and the tokens it "used".
+    """
+    def __init__(self, latency=None, responder=None, chunk_size=20) -> None:
+        self.latency = latency or LatencyModel()
+        self.responder = responder or CannedResponder()
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.num_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=self._completions())
+
+    def _completions(self):
+        return FakeCompletions(llm=self, sleep=time.sleep)
+
+    def answer(self, model, messages):
+        """
+        :return: (content, latency in seconds, usage) of the answer of `model` to `messages`
+        """
+        prompt = "\n".join(message["content"] for message in messages)
+        content = self.responder.respond(messages[-1]["content"])
+        usage = SimpleNamespace(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(content))
+
+        with self.lock:
+            self.num_calls += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+
+        return content, self.latency.sample(prompt, usage.completion_tokens, model=model), usage
+
+    def completion(self, content, usage):
+        return SimpleNamespace(
+                    choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+                    usage=usage
+                )
+
+    def stream_chunks(self, content):
+        return [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + self.chunk_size]))])
+            for start in range(0, len(content), self.chunk_size)
+        ]
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """
+    asyncio variant of `FakeOpenAI`, waiting with `asyncio.sleep`
+    """
+    def _completions(self):
+        return FakeAsyncCompletions(llm=self, sleep=None)
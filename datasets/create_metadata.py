@@ -7,19 +7,45 @@ We then use GPT-4 to generate two line summary of each code snippet and then app
 The JSON object is stored in `integration_metadata.json`.
 
 As part of the code, we already have run this script and provided the output JSON file.
-If you want to overwrite this file, run this script in your CLI.
+If you want to update this file, run this script in your CLI from the project folder.
 
-python create_metadata.py
+python datasets/create_metadata.py
+
+Every example is stored with the SHA-256 of its content. Examples whose hash is already described in the existing
+metadata are not sent to the LLM again, and examples shared by several integration directories are described once.
+The remaining descriptions are generated concurrently and the output file is replaced atomically.
+Use `--force` to describe every example again.
 
 """
+import argparse
+import hashlib
 import os
 import json
-from openai import OpenAI
+import stat
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_clients import create_llm_client, set_rate_limits
 
 # Assuming 'integrations' is your base directory
 base_dir = 'integrations'
+metadata_path = './datasets/integration_metadata.json'
+
+_llm_client = None
+
+def get_llm_client():
+    """
+    Shared client layer: pooled connections, and retries with backoff when the concurrent workers get rate limited.
+    Created on first use, so that importing this module does not load the OpenAI SDK.
+    """
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = create_llm_client()
 
-llm_client = OpenAI()
+    return _llm_client
 
 def code2text(example_file_path):
 
@@ -38,7 +64,7 @@ Code snippet:
 Description:
 
 """
-        completion = llm_client.chat.completions.create(
+        completion = get_llm_client().chat.completions.create(
                                     model="gpt-4-0125-preview",
                                     temperature=0.0,
                                     messages=[
@@ -46,49 +72,130 @@ Description:
                                         {"role": "user", "content": code2text_prompt}
                                     ]
                                 )
-        
+
         print (f"Code explanantion: {completion.choices[0].message.content}\n\n")
 
         return completion.choices[0].message.content
 
 
-if __name__ == "__main__":
+def file_content_hash(file_path):
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
 
-    # Initialize the JSON structure
-    integrations_json = {"integrations": []}
 
-    # Iterate over each API directory within 'integrations'
-    for api_name in os.listdir(base_dir):
+def scan_examples(base_dir):
+    """
+    Walk the integration directories.
+
+    :return: list of (api_name, example_file, example_path, content_hash) tuples, in a stable order
+    """
+    examples = []
+    for api_name in sorted(os.listdir(base_dir)):
         api_path = os.path.join(base_dir, api_name)
-        
+
         if os.path.isdir(api_path):
+            for example_file in sorted(os.listdir(api_path)):
+                if example_file.endswith(".txt"):
+                    example_path = os.path.join(api_path, example_file)
+                    examples.append((api_name, example_file, example_path, file_content_hash(example_path)))
+
+    return examples
+
+
+def load_known_descriptions(metadata_path):
+    """
+    Content hash -> description of the examples that are already described in the existing metadata
+    """
+    if not os.path.exists(metadata_path):
+        return {}
+
+    with open(metadata_path, 'r') as infile:
+        integrations_json = json.load(infile)
+
+    known_descriptions = {}
+    for api_dict in integrations_json["integrations"]:
+        for example_dict in api_dict["examples"]:
+            if "content_hash" in example_dict:
+                known_descriptions.setdefault(example_dict["content_hash"], example_dict["description"])
+
+    return known_descriptions
+
+
+def write_json_atomically(data, path):
+    """
+    Write to a temporary file in the same directory and move it over `path`,
+    so that readers never see a partially written file. The file keeps its permissions (0644 for a new file),
+    not the owner only ones of the temporary file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    mode = stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, 'w') as outfile:
+            json.dump(data, outfile, indent=4)
+        os.chmod(temporary_path, mode)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def build_metadata(base_dir=base_dir, metadata_path=metadata_path, workers=8, force=False, describe=code2text):
+    """
+    Build the integrations metadata, only describing the examples whose content is not described yet.
+
+    :param base_dir: directory containing one sub directory of examples per integration
+    :param metadata_path: existing metadata, reused unless `force` is set
+    :param workers: number of concurrent LLM calls
+    :param force: describe every example again
+    :param describe: function generating the description of an example file
+    :return: the metadata dictionary
+    """
+    examples = scan_examples(base_dir)
+    known_descriptions = {} if force else load_known_descriptions(metadata_path)
+
+    # Describe every unique content once, whatever the number of directories it is copied to
+    paths_to_describe = {}
+    for api_name, example_file, example_path, content_hash in examples:
+        if content_hash not in known_descriptions:
+            paths_to_describe.setdefault(content_hash, example_path)
+
+    print (f"{len(examples)} examples found, {len(paths_to_describe)} unique examples to describe.")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        descriptions = executor.map(describe, paths_to_describe.values())
+        known_descriptions.update(zip(paths_to_describe.keys(), descriptions))
+
+    # Initialize the JSON structure
+    integrations_json = {"integrations": []}
+    api_dicts = {}
 
+    for api_name, example_file, example_path, content_hash in examples:
+        if api_name not in api_dicts:
             # Prepare the dictionary for this API
-            api_dict = {"api_name": api_name, "examples": []}
+            api_dicts[api_name] = {"api_name": api_name, "examples": []}
+            integrations_json["integrations"].append(api_dicts[api_name])
 
-            # Iterate over each example file within the API directory
-            for example_file in os.listdir(api_path):
+        api_dicts[api_name]["examples"].append({
+            "name": example_file,
+            "description": known_descriptions[content_hash],
+            "content_hash": content_hash
+        })
 
-                
-                if example_file.endswith(".txt"):
-                    # Add the example file to the API's list of examples
-                    print (f"Processing {example_file}...")
-    
-                    example_path = os.path.join(api_path, example_file)
+    return integrations_json
 
-                    example_dict = {
-                        "name": example_file,
-                        "description": code2text(example_file_path=example_path)
-                    }
-                    api_dict["examples"].append(example_dict)
 
-            # Add the API dictionary to the main JSON structure
-            integrations_json["integrations"].append(api_dict)
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate the descriptions of the integration examples.")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent LLM calls")
+    parser.add_argument("--force", action="store_true", help="describe every example again")
+    parser.add_argument("--requests-per-minute", type=float, default=None, help="requests per minute limit of the LLM")
+    parser.add_argument("--tokens-per-minute", type=float, default=None, help="tokens per minute limit of the LLM")
+    args = parser.parse_args()
 
-    # Convert the Python dictionary to a JSON string for display or use
-    # json_output = json.dumps(integrations_json, indent=4)
+    set_rate_limits("gpt-4-0125-preview", requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute)
 
+    integrations_json = build_metadata(workers=args.workers, force=args.force)
 
-    with open("./datasets/integration_metadata.json", "w") as outfile:
-        json.dump(integrations_json, outfile, indent=4)
-    
\ No newline at end of file
+    write_json_atomically(integrations_json, metadata_path)
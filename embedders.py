@@ -0,0 +1,327 @@
+"""
+Pluggable text embedders used by the retrieval components (example index, semantic cache, documentation ingestion).
+
+Every embedder turns a batch of texts into a float32 matrix of L2 normalized rows:
+
+    - `OpenAIEmbedder`: the embeddings endpoint of an OpenAI compatible provider (text-embedding-ada-002 by default),
+      in multi-input requests of `batch_size` texts
+    - `HashingEmbedder`: local TF-IDF vectors of hashed character n-grams, computed with NumPy. It needs no network
+      and no model files, so retrieval works in air-gapped CI and a query is embedded without any round trip.
+
+The `name` of an embedder identifies its vector space: the persisted indexes only reuse vectors computed by an embedder
+of the same name.
+
+The IDF weights of the local embedder are fitted on the integration examples and the crawl dumps. `get_local_embedder`
+fits them once and caches them in `.cache/local_embedder.npz`, and fits them again when the corpus changes.
+To fit them ahead of time, run this script in your CLI.
+
+python embedders.py
+
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+from utils.rag_utils import embed_texts, normalize_rows
+
+# numpy is imported by the methods using it, so that importing the pipelines stays cheap
+
+SUPPORTED_EMBEDDERS = ("openai", "local")
+
+DEFAULT_OPENAI_MODEL = "text-embedding-ada-002"
+OPENAI_DIMENSIONS = {"text-embedding-ada-002": 1536, "text-embedding-3-small": 1536, "text-embedding-3-large": 3072}
+
+LOCAL_EMBEDDER_PATH = ".cache/local_embedder.npz"
+LOCAL_CORPUS_EXAMPLES = "integrations/*/*.txt"
+LOCAL_CORPUS_DATASETS = "datasets/dataset_*.json"
+
+# Multipliers of the rolling hash and of its final mixing step (64 bit, odd)
+HASH_BASE = 0x100000001B3
+HASH_MIX = 0xFF51AFD7ED558CCD
+
+
+class BaseEmbedder:
+    """
+    Interface of the embedders: `embed` a batch of texts into a float32 matrix of shape (len(texts), dimension)
+    with L2 normalized rows.
+    """
+    name = None
+    dimension = None
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+class OpenAIEmbedder(BaseEmbedder):
+    """
+    Embeddings endpoint of an OpenAI compatible provider.
+
+    :param model: embedding model, also the name of the embedder
+    :param client: OpenAI compatible client, created on first use (see `llm_clients.create_llm_client`) when None
+    :param batch_size: maximum number of texts per request
+    :param dimension: size of the vectors, known for the OpenAI models
+    """
+    def __init__(self, model=DEFAULT_OPENAI_MODEL, client=None, batch_size=256, provider="openai", base_url=None,
+                 dimension=None) -> None:
+        self.model = model
+        self.name = model
+        self.client = client
+        self.batch_size = batch_size
+        self.provider = provider
+        self.base_url = base_url
+        self.dimension = dimension or OPENAI_DIMENSIONS.get(model)
+
+    def embed(self, texts):
+        import numpy as np
+
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+        client = self.__client()
+        return np.vstack([
+            embed_texts(client, texts[start:start + self.batch_size], model=self.model)
+            for start in range(0, len(texts), self.batch_size)
+        ])
+
+    def __client(self):
+        # The shared client layer pools the HTTP connections and retries rate limited batches
+        if self.client is None:
+            from llm_clients import create_llm_client
+            self.client = create_llm_client(provider=self.provider, base_url=self.base_url)
+
+        return self.client
+
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    TF-IDF vectors of hashed character n-grams.
+
+    Texts are lowercased, their whitespace collapsed and padded with a space, and every n-gram of `ngram_range` bytes
+    of their UTF-8 encoding is hashed into one of `dimension` buckets. The n-grams of a whole batch are hashed at once
+    with vectorized rolling hashes and counted with a single `np.bincount`. Counts are dampened (log(1 + count)) and
+    weighted by the IDF of their bucket when the embedder is fitted, plain term frequencies otherwise.
+
+    :param dimension: number of hash buckets, the size of the vectors
+    :param ngram_range: (smallest, largest) n-gram length in bytes
+    :param idf: IDF weight of every bucket, see `fit`
+    """
+    def __init__(self, dimension=1024, ngram_range=(3, 5), idf=None) -> None:
+        if dimension < 1:
+            raise ValueError(f"dimension must be at least 1, got {dimension}.")
+
+        if not 1 <= ngram_range[0] <= ngram_range[1]:
+            raise ValueError(f"Invalid ngram_range {ngram_range}.")
+
+        if idf is not None and len(idf) != dimension:
+            raise ValueError(f"idf has {len(idf)} weights, expected {dimension}.")
+
+        self.dimension = dimension
+        self.ngram_range = tuple(ngram_range)
+        self.idf = idf
+
+    @property
+    def name(self):
+        weights = hashlib.sha256(self.idf.tobytes()).hexdigest()[:12] if self.idf is not None else "tf"
+        return f"hashing-{self.dimension}-{self.ngram_range[0]}-{self.ngram_range[1]}-{weights}"
+
+    def counts(self, texts):
+        """
+        Matrix of the n-gram counts of every text in every bucket
+        """
+        import numpy as np
+
+        encoded = [(" " + " ".join(text.lower().split()) + " ").encode("utf-8") for text in texts]
+        lengths = np.array([len(data) for data in encoded], dtype=np.int64)
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+        # Text of every byte, and end offset of every text
+        rows = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+        ends = np.cumsum(lengths)
+
+        flat_buckets = []
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            num_windows = len(data) - n + 1
+            if num_windows <= 0:
+                continue
+
+            hashes = np.full(num_windows, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = hashes * np.uint64(HASH_BASE) + data[offset:offset + num_windows]
+
+            # Only the windows within a single text
+            valid = np.arange(num_windows) + n <= ends[rows[:num_windows]]
+            hashes = hashes[valid]
+
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= np.uint64(HASH_MIX)
+            hashes ^= hashes >> np.uint64(33)
+
+            buckets = (hashes % np.uint64(self.dimension)).astype(np.int64)
+            flat_buckets.append(rows[:num_windows][valid] * self.dimension + buckets)
+
+        flat_buckets = np.concatenate(flat_buckets) if flat_buckets else np.zeros(0, dtype=np.int64)
+        counts = np.bincount(flat_buckets, minlength=len(encoded) * self.dimension)
+
+        return counts.reshape(len(encoded), self.dimension).astype(np.float32)
+
+    def embed(self, texts, batch_size=256):
+        import numpy as np
+
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            weights = np.log1p(self.counts(texts[start:start + batch_size]))
+            if self.idf is not None:
+                weights *= self.idf
+            vectors.append(normalize_rows(weights))
+
+        return np.vstack(vectors).astype(np.float32)
+
+    def fit(self, texts, batch_size=256):
+        """
+        Fit the IDF weights on a corpus, smoothed as if every bucket appeared in one extra document
+
+        :param texts: iterable of documents, consumed once in batches of `batch_size`
+        """
+        import numpy as np
+
+        document_frequencies = np.zeros(self.dimension, dtype=np.int64)
+        num_documents = 0
+
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == batch_size:
+                document_frequencies += (self.counts(batch) > 0).sum(axis=0)
+                num_documents += len(batch)
+                batch = []
+
+        if batch:
+            document_frequencies += (self.counts(batch) > 0).sum(axis=0)
+            num_documents += len(batch)
+
+        self.idf = (np.log((1 + num_documents) / (1 + document_frequencies)) + 1).astype(np.float32)
+
+        return self
+
+    def save(self, path, signature=""):
+        import numpy as np
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary_path = path + ".tmp.npz"
+        np.savez_compressed(
+            temporary_path,
+            idf=self.idf,
+            ngram_range=np.array(self.ngram_range),
+            signature=np.array(signature)
+        )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return: (embedder, signature of the corpus it was fitted on)
+        """
+        import numpy as np
+
+        with np.load(path) as saved:
+            embedder = cls(dimension=len(saved["idf"]), ngram_range=tuple(int(n) for n in saved["ngram_range"]), idf=saved["idf"])
+            return embedder, str(saved["signature"])
+
+
+def local_corpus_paths(examples_pattern=LOCAL_CORPUS_EXAMPLES, datasets_pattern=LOCAL_CORPUS_DATASETS):
+    return sorted(glob.glob(examples_pattern)), sorted(glob.glob(datasets_pattern))
+
+
+def iter_local_corpus(example_paths, dataset_paths):
+    """
+    The integration examples, then the markdown of every page of the crawl dumps
+    """
+    from utils.dataset_loader import iter_records
+
+    for path in example_paths:
+        with open(path, "r", encoding="utf-8") as file:
+            yield file.read()
+
+    for path in dataset_paths:
+        for record in iter_records(path, fields=["markdown"]):
+            if record.get("markdown"):
+                yield record["markdown"]
+
+
+def local_corpus_signature(paths, dimension, ngram_range):
+    entries = [[dimension, list(ngram_range)]]
+    for path in paths:
+        stat = os.stat(path)
+        entries.append([path, stat.st_size, stat.st_mtime_ns])
+
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+_local_embedders = {}
+_local_embedders_lock = threading.Lock()
+
+
+def get_local_embedder(path=LOCAL_EMBEDDER_PATH, dimension=1024, ngram_range=(3, 5)):
+    """
+    Process-wide `HashingEmbedder` fitted on the integration examples and the crawl dumps.
+    The IDF weights are loaded from `path`, or fitted and saved there when the corpus changed since.
+    """
+    key = (os.path.abspath(path), dimension, tuple(ngram_range))
+    with _local_embedders_lock:
+        if key in _local_embedders:
+            return _local_embedders[key]
+
+        example_paths, dataset_paths = local_corpus_paths()
+        signature = local_corpus_signature(example_paths + dataset_paths, dimension, ngram_range)
+
+        embedder = None
+        if os.path.exists(path):
+            saved_embedder, saved_signature = HashingEmbedder.load(path)
+            if saved_signature == signature:
+                embedder = saved_embedder
+
+        if embedder is None:
+            print (f"Fitting the local embedder on {len(example_paths)} examples and {len(dataset_paths)} crawl dumps...")
+            embedder = HashingEmbedder(dimension=dimension, ngram_range=ngram_range).fit(iter_local_corpus(example_paths, dataset_paths))
+            embedder.save(path, signature=signature)
+
+        _local_embedders[key] = embedder
+        return embedder
+
+
+def create_embedder(embedder="openai", embed_llm=DEFAULT_OPENAI_MODEL, client=None, provider="openai", base_url=None):
+    """
+    Embedder selected by name: 'openai' (`embed_llm` through `client`, or a client of `provider`) or 'local'
+    (see `get_local_embedder`). A `BaseEmbedder` is returned as is.
+    """
+    if isinstance(embedder, BaseEmbedder):
+        return embedder
+
+    if embedder == "openai":
+        return OpenAIEmbedder(model=embed_llm, client=client, provider=provider, base_url=base_url)
+
+    if embedder == "local":
+        return get_local_embedder()
+
+    raise ValueError(f"{embedder} embedder currently not supported. Please use one of {SUPPORTED_EMBEDDERS} or a BaseEmbedder.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit the IDF weights of the local embedder.")
+    parser.add_argument("--path", default=LOCAL_EMBEDDER_PATH, help="where the fitted embedder is saved")
+    parser.add_argument("--dimension", type=int, default=1024)
+    args = parser.parse_args()
+
+    local_embedder = get_local_embedder(path=args.path, dimension=args.dimension)
+    print (f"Local embedder {local_embedder.name} saved at {args.path}")
@@ -1,58 +1,182 @@
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from openai import OpenAI
+import hashlib
 import json
+import os
 import sys
-from config import Config
-from utils.rag_utils import truncate_text_tokens, num_tokens_from_string, EMBEDDING_CTX_LENGTH
+import uuid
+from typing import NamedTuple, Optional, Sequence, Union
+from urllib.parse import urlsplit, urlunsplit
+from utils.rag_utils import chunk_text_tokens_batch
+from utils.dataset_loader import DOCUMENTATION_FIELDS, iter_records, prefetch
+from embedders import SUPPORTED_EMBEDDERS, OpenAIEmbedder, create_embedder
+
+VECTOR_NAME = "example_code"
+
+# Payload fields the searches and the incremental updates filter on, indexed by the Qdrant server
+PAYLOAD_INDEX_FIELDS = ("referrerUrl", "canonical_url")
+
+
+class DocumentationQuery(NamedTuple):
+    """
+    One query of `DocumentationEmbedding.search_batch`: its text, number of hits and the `referrerUrl` (or list of
+    them) the hits are restricted to, e.g. the section of the documentation the page was linked from.
+    """
+    text: str
+    top_k: int = 5
+    referrer_url: Optional[Union[str, Sequence[str]]] = None
+
+def canonicalize_url(url):
+    """
+    Normalize a page URL so that the same page always maps to the same points:
+    lowercase scheme and host, no fragment and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+def page_content_hash(canonical_url, markdown):
+    """Hash identifying the content of a crawled page."""
+    return hashlib.sha256(f"{canonical_url}\n{markdown}".encode("utf-8")).hexdigest()
+
+def job_queries(tasks_and_trigger):
+    """
+    Retrieval query text of the job trigger and of every task of a task breakdown
+
+    :return: dictionary where key is 'job_trigger' or the task_sequence_id and value is the query text
+    """
+    def with_integrations(text, integrations):
+        return f"{text} ({', '.join(integrations)})" if integrations else text
+
+    job_trigger = tasks_and_trigger["job_trigger"]
+    queries = {
+        "job_trigger": with_integrations(f"{job_trigger['type']} trigger: {job_trigger['params']}. {job_trigger['explanation']}",
+                                         job_trigger.get("integrations", []))
+    }
+    for task in tasks_and_trigger["tasks"]:
+        queries[task["task_sequence_id"]] = with_integrations(task["task_desc"], task.get("integrations", []))
+
+    return queries
 
 class DocumentationEmbedding:
-    def __init__(self, collection_name, json_dataset_file_path, vector_size=1536) -> None:
+    """
+    Ingestion pipeline of the crawled trigger.dev documentation into Qdrant.
+
+    The `markdown` field of every page is split into chunks of at most `chunk_size` tokens, consecutive chunks sharing
+    `chunk_overlap` tokens so that a passage cut at a chunk boundary is still whole in one of them. The pages are
+    tokenized `chunk_batch_size` at a time by the shared tokenizer (see `utils/tokenizer.py`). The chunks are embedded
+    in multi-input requests of `embedding_batch_size` texts over a single OpenAI client and upserted to Qdrant in
+    batches of `upsert_batch_size` points. The URLs of the fully ingested pages are checkpointed after every upsert,
+    so an interrupted run resumes where it stopped.
+
+    Every chunk is stored with the content hash of its page. `update_embeddings_in_qdrant` uses it to only
+    re-embed the pages of a new crawl dump that are new or changed, and to delete the pages that disappeared.
+
+    The dataset (a JSON array or JSONL crawl dump) is never loaded whole: its records are parsed incrementally, with
+    only the fields used here, in a background thread at most `prefetch_records` records ahead of the embedding
+    requests (see `utils.dataset_loader`). Memory use stays flat with the size of the dump and the first chunks are
+    embedded while the rest of the dump is still being parsed.
+
+    Set `vectordb_location` to ':memory:' or to a local directory to use Qdrant without a server.
+    The Qdrant client is imported and connected on first use, not when the pipeline is created.
+    """
+    def __init__(self, collection_name, json_dataset_file_path, vector_size=None, vectordb_location=None,
+                 embed_llm="text-embedding-ada-002", embedding_client=None, chunk_size=512, chunk_overlap=0,
+                 embedding_batch_size=64, upsert_batch_size=128, checkpoint_path=None, prefetch_records=256,
+                 embedder=None, chunk_batch_size=64) -> None:
 
-        self.vectordb_client = self.create_vectordb_client(is_testing=True, vectordb_provider='qdrant')
-        self.vector_size = vector_size
+        self.vectordb_location = vectordb_location
+        self._vectordb_client = None
+        # The chunks are embedded by `embedder` (see `embedders.py`), by default the `embed_llm` OpenAI embeddings
+        # through `embedding_client`. The size of the vectors defaults to the dimension of the embedder.
+        self.embedder = embedder if embedder is not None else OpenAIEmbedder(model=embed_llm, client=embedding_client)
+        self.vector_size = vector_size or self.embedder.dimension
+        if self.vector_size is None:
+            raise ValueError(f"The vector size of the {self.embedder.name} embedder is unknown. Please set vector_size.")
         self.collection_name = collection_name
-        self.all_collections = self.vectordb_client.get_collections()
 
-        if collection_name not in self.all_collections:
-            print (f"Collection {collection_name} does not exists. Creating a new collection...")
-            self.vectordb_client.create_collection(
-                collection_name=collection_name,
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_batch_size = chunk_batch_size
+        self.embedding_batch_size = embedding_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.checkpoint_path = checkpoint_path or f".cache/{collection_name}_ingestion_checkpoint.json"
+
+        self.json_dataset_file_path = json_dataset_file_path
+        self.prefetch_records = prefetch_records
+
+    def iter_records(self):
+        """
+        Records of the dataset, parsed incrementally in a background thread
+        """
+        if not os.path.exists(self.json_dataset_file_path):
+            raise ValueError(f"No records to ingest from {self.json_dataset_file_path}.")
+
+        records = iter_records(self.json_dataset_file_path, fields=DOCUMENTATION_FIELDS)
+
+        return prefetch(records, max_pending=self.prefetch_records)
+
+    @property
+    def vectordb_client(self):
+        """
+        Qdrant client, connected on first use. The collection is created when it does not exist yet.
+        """
+        if self._vectordb_client is None:
+            self._vectordb_client = self.create_vectordb_client(is_testing=True, vectordb_provider='qdrant', location=self.vectordb_location)
+            self.__create_collection_if_missing()
+
+        return self._vectordb_client
+
+    def __create_collection_if_missing(self):
+        from qdrant_client.http import models
+
+        self.all_collections = [collection.name for collection in self._vectordb_client.get_collections().collections]
+
+        if self.collection_name not in self.all_collections:
+            print (f"Collection {self.collection_name} does not exists. Creating a new collection...")
+            self._vectordb_client.create_collection(
+                collection_name=self.collection_name,
                 vectors_config = {
-                    "example_code": models.VectorParams(
+                    VECTOR_NAME: models.VectorParams(
                         distance=models.Distance.COSINE,
                         size=self.vector_size,
                     )
                 }
             )
 
-            print (f"New collection with the name {collection_name} created\n")
-        
-        self.json_dataset_file_path = json_dataset_file_path
-        
-        try:
-            with open(json_dataset_file_path, "r") as file:
-                print (f"Dataset at path {json_dataset_file_path} loading...")
-                self.json_dataset = json.load(file)
-                print (f"Loaded successfully.")
-                print (f"Total records loaded: {len(self.json_dataset)}")
+            print (f"New collection with the name {self.collection_name} created\n")
 
-        except Exception as e:
-            print (f"Dataset at path {json_dataset_file_path} could not be loaded successfully.\nError: {e}")
-            self.json_dataset = None
+        # Qdrant in local mode has no payload indexes
+        if self.vectordb_location is None:
+            self.__create_payload_indexes()
 
-        if self.json_dataset:   
-            for record in self.json_dataset:
-                print (record.keys())
-            
-            print (f"Total records processed: {len(self.json_dataset)}")
+    def __create_payload_indexes(self):
+        from qdrant_client.http import models
 
+        payload_schema = self._vectordb_client.get_collection(self.collection_name).payload_schema
+        for field in PAYLOAD_INDEX_FIELDS:
+            if field not in payload_schema:
+                self._vectordb_client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD
+                )
+                print (f"Payload index created on field {field}")
 
-    def create_vectordb_client(self, is_testing: bool, vectordb_provider: str):
+    def create_vectordb_client(self, is_testing: bool, vectordb_provider: str, location: str = None):
 
         if vectordb_provider == "qdrant":
+            from qdrant_client import QdrantClient
+
             try:
-                if is_testing:
+                if location is not None:
+                    # ':memory:' keeps everything in RAM, any other value is a directory used for on-disk storage
+                    if location == ":memory:":
+                        vectordb_client = QdrantClient(location=location)
+                    else:
+                        vectordb_client = QdrantClient(path=location)
+
+                    print (f"Using Qdrant in local mode ({location})...")
+
+                elif is_testing:
                     vectordb_client = QdrantClient(
                         host='localhost',
                         port=6333
@@ -62,10 +186,10 @@ class DocumentationEmbedding:
 
                 else:
                     vectordb_client = QdrantClient(
-                        url=Config.QDRANT_DB_URL, 
-                        api_key=Config.QDRANT_CLOUD_KEY,
+                        url=os.getenv("QDRANT_DB_URL"),
+                        api_key=os.getenv("QDRANT_CLOUD_KEY"),
                     )
-                    
+
                     print ("Connecting to Qdrant cloud instance...")
 
                 print ('Connected successfully.')
@@ -76,63 +200,327 @@ class DocumentationEmbedding:
         else:
             raise ValueError(f"{vectordb_provider} vectordb provider currently not supported. Please use Qdrant vector db.")
 
-    def __text2embedding(text: str):
-        pass
+    def create_and_save_embeddings_in_qdrant(self):
+        """
+            1. Iterate over all each record in the JSON dataset
+                - Split the markdown field into token bounded chunks
+                - Create vector embeddings for the chunks in batches
+                - Also add metadata in payload
+            2. Save all the records as Points in Qdrant DB, in batches
+            3. Checkpoint the ingested pages after every batch
+
+        :return: dictionary with the number of ingested pages, skipped pages and upserted chunks
+        """
+        completed_urls = self.__load_checkpoint()
+        summary = {"pages": 0, "skipped_pages": 0, "chunks": 0}
 
-    def __code2embedding(text: str):
-        # first check how many tokens does the content correspond to
-        num_tokens = num_tokens_from_string(text)
-        
-        # truncate input string if the number of tokens exceed maximum context length
-        if num_tokens > EMBEDDING_CTX_LENGTH:
-            print (f"Input string contain {num_tokens} tokens that exceeds token limit of {EMBEDDING_CTX_LENGTH}.")
-            print ("Truncating the string..")
-            text = truncate_text_tokens(text=text)
+        def pending_records():
+            for record in self.iter_records():
+                if record['url'] in completed_urls:
+                    summary["skipped_pages"] += 1
+                    continue
+                yield record
 
-        # initialize OpenAI client
-        client = OpenAI()
+        pending_chunks, pending_urls = [], []
+        for record, chunks in self.__iter_chunked_records(pending_records()):
+            pending_chunks.extend(chunks)
+            pending_urls.append(record['url'])
 
-        # generate embeddings using OpenAI Embeddings endpoint
-        response = client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
+            # Only flush at page boundaries, so that a checkpointed page is always fully ingested
+            if len(pending_chunks) >= self.upsert_batch_size:
+                summary["chunks"] += self.__embed_and_upsert(pending_chunks)
+                summary["pages"] += len(pending_urls)
+                completed_urls.update(pending_urls)
+                self.__save_checkpoint(completed_urls)
+                pending_chunks, pending_urls = [], []
 
-        return response.data[0].embedding
+        if pending_urls:
+            summary["chunks"] += self.__embed_and_upsert(pending_chunks)
+            summary["pages"] += len(pending_urls)
+            completed_urls.update(pending_urls)
+            self.__save_checkpoint(completed_urls)
 
+        if not summary["pages"] and not summary["skipped_pages"]:
+            raise ValueError(f"No records to ingest from {self.json_dataset_file_path}.")
 
-    def create_and_save_embeddings_in_qdrant(self):
+        print (f"Ingestion finished: {summary}")
+
+        return summary
+
+    def update_embeddings_in_qdrant(self):
         """
-            1. Iterate over all each record in the JSON dataset
-                - Create vector embeddings for the markdown/text fields
-                - Also add metadata in payload
-            2. Save all the records as Points in Qdrant DB
+        Incrementally sync the collection with the JSON dataset, e.g. a new crawl dump of the documentation.
+
+            1. Fetch the canonical URL and content hash of every point already in the collection
+            2. Embed and upsert only the pages that are new or whose content hash changed
+            3. Delete the points of the pages that are no longer in the dataset, and the leftover
+               chunks of changed pages that now have fewer chunks
+
+        :return: dictionary with the number of new, changed, unchanged and deleted pages,
+                 and the number of upserted and deleted points
+        """
+        stored_pages = self.__fetch_stored_pages()
+        summary = {"new_pages": 0, "changed_pages": 0, "unchanged_pages": 0, "deleted_pages": 0, "upserted_chunks": 0, "deleted_chunks": 0}
+
+        seen_urls = set()
+
+        def new_and_changed_records():
+            for record in self.iter_records():
+                canonical_url = self.__canonical_url(record)
+                if canonical_url in seen_urls:
+                    continue
+                seen_urls.add(canonical_url)
+
+                stored_page = stored_pages.get(canonical_url)
+                if stored_page is not None and stored_page["content_hash"] == page_content_hash(canonical_url, record['markdown']):
+                    summary["unchanged_pages"] += 1
+                    continue
+                yield record
+
+        stale_point_ids = []
+        pending_chunks = []
+        for record, chunks in self.__iter_chunked_records(new_and_changed_records()):
+            stored_page = stored_pages.get(self.__canonical_url(record))
+            pending_chunks.extend(chunks)
+
+            if stored_page is None:
+                summary["new_pages"] += 1
+            else:
+                summary["changed_pages"] += 1
+                stale_point_ids.extend(stored_page["point_ids"] - {chunk["id"] for chunk in chunks})
+
+            if len(pending_chunks) >= self.upsert_batch_size:
+                summary["upserted_chunks"] += self.__embed_and_upsert(pending_chunks)
+                pending_chunks = []
+
+        if pending_chunks:
+            summary["upserted_chunks"] += self.__embed_and_upsert(pending_chunks)
+
+        # An empty dump must not delete the whole collection
+        if not seen_urls:
+            raise ValueError(f"No records to ingest from {self.json_dataset_file_path}.")
+
+        for canonical_url, stored_page in stored_pages.items():
+            if canonical_url not in seen_urls:
+                summary["deleted_pages"] += 1
+                stale_point_ids.extend(stored_page["point_ids"])
+
+        if stale_point_ids:
+            from qdrant_client.http import models
+
+            self.vectordb_client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=stale_point_ids)
+            )
+            summary["deleted_chunks"] = len(stale_point_ids)
+
+        print (f"Incremental update finished: {summary}")
+
+        return summary
+
+    def search_batch(self, queries, deduplicate=True):
+        """
+        Search the collection for several queries at once: the query texts are embedded in one batch and searched
+        with a single batched request, each with its own number of hits and `referrerUrl` filter.
+        Needs qdrant-client 1.10 or later (`query_batch_points`).
+
+        :param queries: list of `DocumentationQuery` (or query texts, with the default top-k and no filter)
+        :param deduplicate: a chunk found by several queries is only returned for the one it matches best. Every query
+                            then still gets up to `top_k` distinct hits.
+        :return: list with the hits of every query, best first. A hit is the payload of a chunk with its `id` and `score`.
+        """
+        from qdrant_client.http import models
+
+        queries = [query if isinstance(query, DocumentationQuery) else DocumentationQuery(text=query) for query in queries]
+        if not queries:
+            return []
+
+        # Up to `top_k` hits of a query can be claimed by each of the other queries
+        total_top_k = sum(query.top_k for query in queries)
+        vectors = self.embedder.embed([query.text for query in queries])
+
+        requests = []
+        for query, vector in zip(queries, vectors):
+            query_filter = None
+            if query.referrer_url is not None:
+                match = (models.MatchValue(value=query.referrer_url) if isinstance(query.referrer_url, str)
+                         else models.MatchAny(any=list(query.referrer_url)))
+                query_filter = models.Filter(must=[models.FieldCondition(key="referrerUrl", match=match)])
+
+            requests.append(models.QueryRequest(
+                                query=vector.tolist(),
+                                using=VECTOR_NAME,
+                                filter=query_filter,
+                                limit=total_top_k if deduplicate else query.top_k,
+                                with_payload=True
+                            ))
+
+        responses = self.vectordb_client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        candidates = [[dict(point.payload, id=str(point.id), score=point.score) for point in response.points] for response in responses]
+
+        if not deduplicate:
+            return candidates
+
+        # Best matches first: every chunk goes to the query it matches best, among those that still have room
+        hits, claimed = [[] for _ in queries], set()
+        ranked = sorted(((hit["score"], position, hit) for position, query_hits in enumerate(candidates) for hit in query_hits),
+                        key=lambda item: item[0], reverse=True)
+        for score, position, hit in ranked:
+            if hit["id"] not in claimed and len(hits[position]) < queries[position].top_k:
+                hits[position].append(hit)
+                claimed.add(hit["id"])
+
+        return hits
+
+    def retrieve_job_documentation(self, tasks_and_trigger, top_k=5, referrer_url=None, deduplicate=True):
+        """
+        Documentation chunks relevant to the job trigger and to every task of a task breakdown, in one embedding
+        call and one search request whatever the number of tasks (see `search_batch`).
+
+        :param top_k: maximum number of hits of every task and of the trigger
+        :param referrer_url: optional `referrerUrl` (or list of them) the hits are restricted to
+        :return: dictionary where key is 'job_trigger' or the task_sequence_id and value is the list of hits, best first
+        """
+        queries = job_queries(tasks_and_trigger)
+        hits = self.search_batch(
+                        [DocumentationQuery(text=text, top_k=top_k, referrer_url=referrer_url) for text in queries.values()],
+                        deduplicate=deduplicate
+                    )
+
+        return dict(zip(queries, hits))
+
+    def __fetch_stored_pages(self):
+        """
+        Canonical URL -> content hash and point IDs of every page stored in the collection
         """
-        qdrant_json_dataset = []
-        for i, record in enumerate(self.json_dataset[1:2]):
-            print (f"Index: {i}")
-            # create embedding for the record['markdown'] field
-            print (f"\t1. Markdown: \n\t\t{record['markdown']}")
-            print (f"\t2. URL: {record['url']}")
-            print (f"\t3. Metadata:")
-            print (f"\t\t- ReferrerURL: {record['crawl']['referrerUrl']}")
-            print (f"\t\t- Page title: {record['metadata']['title']}")
-            print (f"\t\t- Page description: {record['metadata']['description']}")
+        stored_pages = {}
+        offset = None
+        while True:
+            points, offset = self.vectordb_client.scroll(
+                                    collection_name=self.collection_name,
+                                    limit=1024,
+                                    offset=offset,
+                                    with_payload=["canonical_url", "content_hash"],
+                                    with_vectors=False
+                                )
 
-            print ("--"*50)
+            for point in points:
+                page = stored_pages.setdefault(point.payload["canonical_url"], {"content_hash": point.payload["content_hash"], "point_ids": set()})
+                page["point_ids"].add(str(point.id))
 
-            # add payload
-            #   - title
-            #   - url
-            #   - parentUrl
+            if offset is None:
+                return stored_pages
 
-        
-        # Save qdrant_json_dataset in qdrant vector db
+    def __canonical_url(self, record):
+        return canonicalize_url(record['metadata'].get('canonicalUrl') or record['url'])
+
+    def __iter_chunked_records(self, records):
+        """
+        (record, chunks) of every record. The markdown of `chunk_batch_size` records at a time is chunked in one batch.
+        """
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.chunk_batch_size:
+                yield from self.__chunk_records(batch)
+                batch = []
+
+        if batch:
+            yield from self.__chunk_records(batch)
+
+    def __chunk_records(self, records):
+        texts = chunk_text_tokens_batch([record['markdown'] for record in records], max_tokens=self.chunk_size, overlap=self.chunk_overlap)
+        for record, record_texts in zip(records, texts):
+            yield record, self.__record_to_chunks(record, record_texts)
+
+    def __record_to_chunks(self, record, texts):
+        """
+        Chunks of a crawled page, from the texts of its chunks. Every chunk gets a deterministic point ID, so re-running
+        the ingestion overwrites points instead of duplicating them.
+        """
+        canonical_url = self.__canonical_url(record)
+        content_hash = page_content_hash(canonical_url, record['markdown'])
+
+        chunks = []
+        for chunk_index, text in enumerate(texts):
+            chunks.append({
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{canonical_url}#{chunk_index}")),
+                "text": text,
+                "payload": {
+                    "title": record['metadata']['title'],
+                    "description": record['metadata'].get('description'),
+                    "url": record['url'],
+                    "canonical_url": canonical_url,
+                    "referrerUrl": record['crawl']['referrerUrl'],
+                    "content_hash": content_hash,
+                    "chunk_index": chunk_index,
+                    "text": text,
+                }
+            })
+
+        return chunks
+
+    def __embed_and_upsert(self, chunks):
+        """
+        Embed `chunks` in batches of `embedding_batch_size` texts and upsert them to Qdrant in one request.
+        """
+        from qdrant_client.http import models
+
+        points = []
+        for start in range(0, len(chunks), self.embedding_batch_size):
+            batch = chunks[start:start + self.embedding_batch_size]
+            vectors = self.embedder.embed([chunk["text"] for chunk in batch])
+
+            for chunk, vector in zip(batch, vectors):
+                points.append(models.PointStruct(id=chunk["id"], vector={VECTOR_NAME: vector.tolist()}, payload=chunk["payload"]))
+
+        self.vectordb_client.upsert(collection_name=self.collection_name, points=points)
+        print (f"Upserted {len(points)} chunks to collection {self.collection_name}")
+
+        return len(points)
+
+    def __load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+
+        with open(self.checkpoint_path, "r") as file:
+            checkpoint = json.load(file)
+
+        if checkpoint.get("dataset") != self.json_dataset_file_path:
+            return set()
+
+        print (f"Resuming from checkpoint {self.checkpoint_path}: {len(checkpoint['completed_urls'])} pages already ingested.")
+        return set(checkpoint["completed_urls"])
+
+    def __save_checkpoint(self, completed_urls):
+        if os.path.dirname(self.checkpoint_path):
+            os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+
+        # Write to a temporary file first, so that a crash never leaves a corrupted checkpoint behind
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"dataset": self.json_dataset_file_path, "completed_urls": sorted(completed_urls)}, file)
+        os.replace(temporary_path, self.checkpoint_path)
 
 if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Embed a crawl dump of the trigger.dev documentation into Qdrant.")
+    parser.add_argument("--dataset", default="datasets/dataset_trigger-dev-examples_2024-03-16_13-56-52-250.json")
+    parser.add_argument("--collection", default="TestDB")
+    parser.add_argument("--incremental", action="store_true", help="only embed new or changed pages and delete removed pages")
+    parser.add_argument("--embedder", choices=SUPPORTED_EMBEDDERS, default="openai", help="'local' embeds without any network call")
+    args = parser.parse_args()
+
     doc_embedding = DocumentationEmbedding(
-                            collection_name="TestDB",
-                            json_dataset_file_path="datasets/dataset_trigger-dev-examples_2024-03-16_13-56-52-250.json"
+                            collection_name=args.collection,
+                            json_dataset_file_path=args.dataset,
+                            embedder=create_embedder(args.embedder)
                     )
-    
-    doc_embedding.create_and_save_embeddings_in_qdrant()
\ No newline at end of file
+
+    if args.incremental:
+        doc_embedding.update_embeddings_in_qdrant()
+    else:
+        doc_embedding.create_and_save_embeddings_in_qdrant()
@@ -0,0 +1,138 @@
+"""
+Embedding based retrieval of integration examples.
+
+The `description` of every example in `datasets/integration_metadata.json` is embedded once and stored as a
+normalized float32 matrix next to the metadata (`datasets/integration_metadata_embeddings.npz`).
+At query time the tasks of an integration are embedded in a single batch and the examples are ranked by
+cosine similarity, which replaces the GPT-4 selection call of `AutomateRAG.identify_relevant_examples`.
+The vectors are computed by an embedder of `embedders.py`: the OpenAI embeddings endpoint by default, or the local
+hashing embedder, which needs no network.
+
+To (re)build the index, run this script in your CLI.
+
+python example_index.py
+
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from embedders import OpenAIEmbedder
+
+INDEX_PATH = "./datasets/integration_metadata_embeddings.npz"
+METADATA_PATH = "./datasets/integration_metadata.json"
+
+
+class ExampleIndex:
+    """
+    Vector index over the example descriptions of every integration.
+
+    :param embedder: `embedders.BaseEmbedder` computing the vectors. Defaults to the `embed_llm` OpenAI embeddings
+                     through `embedding_client`.
+    """
+    def __init__(self, integrations_metadata, embedding_client=None, embed_llm="text-embedding-ada-002", index_path=INDEX_PATH,
+                 embedder=None) -> None:
+        self.integrations_metadata = integrations_metadata
+        self.embedder = embedder if embedder is not None else OpenAIEmbedder(model=embed_llm, client=embedding_client)
+        self.index_path = index_path
+
+        self.vectors = None
+        self.integrations = None
+        self.names = None
+
+    def load_or_build(self):
+        """
+        Load the index from disk, or build and save it when it is missing or out of date with the metadata.
+        """
+        if self.vectors is not None:
+            return self
+
+        if os.path.exists(self.index_path):
+            with np.load(self.index_path) as index:
+                if str(index["metadata_hash"]) == self.__metadata_hash() and str(index["embed_llm"]) == self.embedder.name:
+                    self.vectors = index["vectors"]
+                    self.integrations = index["integrations"]
+                    self.names = index["names"]
+                    return self
+
+            print ("Example index is out of date with the integrations metadata. Rebuilding...")
+
+        return self.build()
+
+    def build(self):
+        """
+        Embed the description of every example and save the index next to the metadata.
+        """
+        integrations, names, descriptions = [], [], []
+        for item in self.integrations_metadata['integrations']:
+            for example in item['examples']:
+                integrations.append(item['api_name'])
+                names.append(example['name'])
+                descriptions.append(example['description'])
+
+        print (f"Embedding {len(descriptions)} example descriptions...")
+        self.vectors = self.embedder.embed(descriptions)
+        self.integrations = np.array(integrations)
+        self.names = np.array(names)
+
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        np.savez_compressed(
+            self.index_path,
+            vectors=self.vectors,
+            integrations=self.integrations,
+            names=self.names,
+            metadata_hash=np.array(self.__metadata_hash()),
+            embed_llm=np.array(self.embedder.name)
+        )
+        print (f"Example index saved at {self.index_path}")
+
+        return self
+
+    def top_k(self, integration, tasks, k=2, candidates=None):
+        """
+        Rank the examples of `integration` by their cosine similarity to each task.
+
+        :param integration: integration/third party API name
+        :param tasks: list of task descriptions
+        :param k: number of examples picked for each task
+        :param candidates: optional list of example names the ranking is restricted to
+        :return: list of (example name, score) of the union of the per task top-k, best first
+        """
+        self.load_or_build()
+
+        mask = self.integrations == integration
+        if candidates is not None:
+            mask &= np.isin(self.names, list(candidates))
+
+        rows = np.flatnonzero(mask)
+        if not len(rows) or not len(tasks):
+            return []
+
+        task_vectors = self.embedder.embed(tasks)
+        scores = task_vectors @ self.vectors[rows].T
+
+        best_scores = {}
+        for task_scores in scores:
+            for position in np.argsort(-task_scores)[:k]:
+                name = str(self.names[rows[position]])
+                best_scores[name] = max(best_scores.get(name, -1.0), float(task_scores[position]))
+
+        return sorted(best_scores.items(), key=lambda item: item[1], reverse=True)
+
+    def __metadata_hash(self):
+        entries = [
+            [item['api_name'], example['name'], example['description']]
+            for item in self.integrations_metadata['integrations']
+            for example in item['examples']
+        ]
+        return hashlib.sha256(json.dumps(entries).encode('utf-8')).hexdigest()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    with open(METADATA_PATH, 'r') as infile:
+        integrations_metadata = json.load(infile)
+
+    ExampleIndex(integrations_metadata=integrations_metadata).build()
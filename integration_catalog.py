@@ -0,0 +1,248 @@
+"""
+Catalog of the supported integrations, compiled once per process from `integrations/` and the integrations metadata.
+
+The LLM names integrations freely ("Slack", "GitHub", "cal.com", "caldotcom", "sendgrd", ...), while the examples are
+stored under the directory name of the integration (`integrations/caldotdom`, ...). The catalog maps any of these
+spellings to the canonical name with dictionary lookups:
+
+    1. exact canonical name
+    2. normalized name (lowercase, punctuation and spaces removed) or known alias, e.g. 'Cal.com' -> 'caldotdom'
+    3. closest canonical name or alias (difflib), so that a typo does not throw away the LLM calls already made
+
+Names too far from every known integration (e.g. 'stripe') resolve to None.
+
+`detect_integrations` finds the integrations named in a raw job description ("... to Slack", "via Gmail"), which lets
+the pipeline start selecting examples before the task breakdown is known.
+
+It also precomputes, for every integration, the (name, description) list of its examples shown to the LLM when
+selecting the relevant examples.
+
+For cold starts (CLI, serverless), the compiled catalog can be pickled once and loaded from the snapshot instead of
+parsing the metadata. A snapshot is ignored when the metadata or the integration directories changed since it was
+written. To write one, run this script in your CLI and point `INTEGRATION_CATALOG_SNAPSHOT` to it.
+
+python integration_catalog.py --snapshot .cache/integration_catalog.pickle
+
+"""
+import argparse
+import difflib
+import json
+import os
+import pickle
+import re
+import threading
+
+# Spellings of an integration that normalization alone does not map to its directory name
+DEFAULT_ALIASES = {
+    "caldotcom": "caldotdom",
+    "calcom": "caldotdom",
+    "googlemail": "gmail",
+    "chatgpt": "openai",
+}
+
+NON_ALPHANUMERIC_PATTERN = re.compile(r"[^a-z0-9]")
+
+# Words of a job description, keeping dots and dashes inside names such as 'cal.com' or 'send-grid'
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9.\-]*")
+
+
+def normalize_integration_name(name):
+    """
+    'Cal.com ' -> 'calcom', 'Send-Grid' -> 'sendgrid'
+    """
+    return NON_ALPHANUMERIC_PATTERN.sub("", str(name).lower())
+
+
+class IntegrationCatalog:
+    """
+    :param integrations_metadata: content of `datasets/integration_metadata.json`
+    :param base_dir: folder with one directory of examples per integration
+    :param aliases: extra alias -> canonical name mappings, on top of `DEFAULT_ALIASES`
+    :param cutoff: minimum difflib similarity ratio for a name to be routed to the closest integration
+    """
+    def __init__(self, integrations_metadata, base_dir="integrations", aliases=None, cutoff=0.75) -> None:
+        self.metadata = integrations_metadata
+        self.cutoff = cutoff
+
+        examples = {item['api_name']: item['examples'] for item in integrations_metadata['integrations']}
+        directories = [name for name in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, name))] if os.path.isdir(base_dir) else []
+
+        self.names = frozenset(examples) | frozenset(directories)
+
+        # Only the name and the description of the examples are shown to the LLM
+        self.selection_examples = {
+            name: [{"name": example['name'], "description": example['description']} for example in examples.get(name, [])]
+            for name in self.names
+        }
+
+        self.lookup = {normalize_integration_name(name): name for name in self.names}
+        for alias, name in {**DEFAULT_ALIASES, **(aliases or {})}.items():
+            if name in self.names:
+                self.lookup.setdefault(normalize_integration_name(alias), name)
+
+        # Names resolved with difflib, so that a recurring typo is matched only once
+        self.closest_matches = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(vars(self))
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def resolve(self, name):
+        """
+        Canonical name of the integration called `name` by the LLM, or None when no integration is close enough
+        """
+        if name in self.names:
+            return name
+
+        key = normalize_integration_name(name)
+        if key in self.lookup:
+            return self.lookup[key]
+
+        with self.lock:
+            if key not in self.closest_matches:
+                matches = difflib.get_close_matches(key, self.lookup.keys(), n=1, cutoff=self.cutoff)
+                self.closest_matches[key] = self.lookup[matches[0]] if matches else None
+
+                if matches:
+                    print (f"Unknown integration '{name}' routed to the closest known integration '{self.lookup[matches[0]]}'.")
+                else:
+                    print (f"Unknown integration '{name}' ignored: no known integration is close enough.")
+
+            return self.closest_matches[key]
+
+    def resolve_all(self, names):
+        """
+        Canonical names of `names`, in order, without duplicates and without the unknown integrations
+        """
+        resolved = (self.resolve(name) for name in names)
+        return list(dict.fromkeys(name for name in resolved if name is not None))
+
+    def detect_integrations(self, text, max_words=2):
+        """
+        Integrations named in a free text such as a job description, in order of first mention. Only exact names and
+        aliases of up to `max_words` words are matched ('Slack', 'Cal.com', 'open ai'), never the closest names.
+        Common words that are also integration names ('linear', 'slack') are matched too.
+        """
+        words = [normalize_integration_name(word) for word in WORD_PATTERN.findall(text.lower())]
+
+        detected = []
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + max_words, len(words)) + 1):
+                name = self.lookup.get("".join(words[start:end]))
+                if name is not None:
+                    detected.append(name)
+
+        return list(dict.fromkeys(detected))
+
+    def selection_examples_of(self, integration):
+        """
+        (name, description) of the examples of `integration`, empty when the integration is unknown
+        """
+        return self.selection_examples.get(self.resolve(integration), [])
+
+
+def compute_source_signature(metadata_path, base_dir):
+    """
+    Identifies the inputs of a catalog: modification time and size of the metadata, and the integration directories
+    """
+    metadata_stat = os.stat(metadata_path)
+    directories = sorted(name for name in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, name))) if os.path.isdir(base_dir) else []
+
+    return (metadata_stat.st_mtime_ns, metadata_stat.st_size, tuple(directories))
+
+
+def build_integration_catalog(metadata_path, base_dir):
+    with open(metadata_path, 'r') as infile:
+        integrations_metadata = json.load(infile)
+        print ("Integrations metadata loaded successfully.")
+
+    return IntegrationCatalog(integrations_metadata=integrations_metadata, base_dir=base_dir)
+
+
+def save_snapshot(catalog, snapshot_path, signature):
+    os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+
+    # Written next to the snapshot then renamed, so that a concurrent reader never sees a partial file
+    temporary_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as outfile:
+        pickle.dump({"signature": signature, "catalog": catalog}, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temporary_path, snapshot_path)
+
+
+def load_snapshot(snapshot_path, signature):
+    """
+    Catalog pickled at `snapshot_path`, or None when there is no snapshot or when it is stale.
+    Only load snapshots written by `save_snapshot`: unpickling runs arbitrary code.
+    """
+    try:
+        with open(snapshot_path, 'rb') as infile:
+            snapshot = pickle.load(infile)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print (f"Integration catalog snapshot {snapshot_path} could not be loaded: {e}")
+        return None
+
+    if snapshot.get("signature") != signature:
+        print (f"Integration catalog snapshot {snapshot_path} is stale.")
+        return None
+
+    return snapshot["catalog"]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_integration_catalog(metadata_path="./datasets/integration_metadata.json", base_dir="integrations", snapshot_path=None):
+    """
+    Process-wide integration catalog of `metadata_path` and `base_dir`.
+
+    :param snapshot_path: optional pickled catalog. It is used when it is up to date, and (re)written otherwise
+                          when the filesystem allows it.
+    """
+    key = (os.path.abspath(metadata_path), os.path.abspath(base_dir))
+    with _catalogs_lock:
+        if key not in _catalogs:
+            catalog = None
+
+            if snapshot_path:
+                signature = compute_source_signature(metadata_path, base_dir)
+                if os.path.exists(snapshot_path):
+                    catalog = load_snapshot(snapshot_path, signature)
+
+            if catalog is None:
+                catalog = build_integration_catalog(metadata_path, base_dir)
+
+                if snapshot_path:
+                    try:
+                        save_snapshot(catalog, snapshot_path, signature)
+                    except OSError as e:
+                        # e.g. a read-only filesystem: the catalog just built is used all the same
+                        print (f"Integration catalog snapshot {snapshot_path} could not be written: {e}")
+
+            _catalogs[key] = catalog
+
+        return _catalogs[key]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Precompile the integration catalog into a snapshot.")
+    parser.add_argument("--metadata", default="./datasets/integration_metadata.json")
+    parser.add_argument("--base-dir", default="integrations")
+    parser.add_argument("--snapshot", default=".cache/integration_catalog.pickle")
+    args = parser.parse_args()
+
+    catalog = build_integration_catalog(args.metadata, args.base_dir)
+    save_snapshot(catalog, args.snapshot, compute_source_signature(args.metadata, args.base_dir))
+
+    print (f"Snapshot of {len(catalog.names)} integrations written to {args.snapshot}")
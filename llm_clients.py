@@ -0,0 +1,394 @@
+"""
+Shared LLM client layer.
+
+Every component talking to an LLM endpoint (`AutomateRAG`, `datasets/create_metadata.py`, `DocumentationEmbedding`,
+`ExampleIndex`) gets its client from `create_llm_client`:
+
+    - one pooled HTTP client (keep-alive connections, timeouts) is shared by all OpenAI clients of the process
+      (one per event loop for the asynchronous clients, whose connections are bound to the loop that opened them)
+    - the OpenAI SDK retries are disabled and replaced by retries with jittered exponential backoff that honor the
+      `Retry-After` header of rate limited responses, on rate limits, timeouts, connection and server errors
+    - requests and tokens per minute can be capped per model with token buckets (`set_rate_limits`), so that
+      concurrent callers wait for capacity instead of running into 429s
+    - besides OpenAI, any OpenAI compatible endpoint (vLLM, Ollama, LM Studio, ...) can be used as the 'local' provider
+
+The returned clients expose the same `chat.completions.create` and `embeddings.create` methods as the OpenAI client.
+The OpenAI SDK, httpx and the `.env` file are only loaded when the first client is created.
+"""
+import os
+import random
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+from tracing import record_retry
+
+SUPPORTED_PROVIDERS = ("openai", "local")
+
+# OpenAI compatible server used by the 'local' provider
+DEFAULT_LOCAL_BASE_URL = "http://localhost:8000/v1"
+
+# Timeouts (seconds) and connection pool size of the shared HTTP clients
+HTTP_TIMEOUT_SECONDS = 120.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 10.0
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+
+_retryable_errors = None
+_environment_loaded = False
+_http_clients = {}
+_openai_clients = {}
+# Asynchronous HTTP and OpenAI clients of every event loop
+_loop_clients = weakref.WeakKeyDictionary()
+_rate_limiters = {}
+_lock = threading.Lock()
+
+
+def retryable_errors():
+    """
+    Errors worth retrying: rate limits, timeouts, connection errors and 5xx responses
+    """
+    global _retryable_errors
+    if _retryable_errors is None:
+        import openai
+        _retryable_errors = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+    return _retryable_errors
+
+
+def load_environment():
+    """
+    Load the `.env` file (OPENAI_API_KEY, LOCAL_LLM_BASE_URL, ...) once, before the first client is created
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (~4 characters per token) used to reserve rate limit capacity before a request
+    """
+    return len(text) // 4 + 1
+
+
+def retry_after_seconds(error, attempt, base_delay=2.0, max_delay=60.0):
+    """
+    Seconds to wait before retrying a failed request. Honors the `retry-after-ms` / `Retry-After` headers
+    (seconds or HTTP date) when the API sends one, otherwise falls back to jittered exponential backoff.
+    """
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+
+    try:
+        return min(float(headers.get("retry-after-ms")) / 1000, max_delay)
+    except (TypeError, ValueError):
+        pass
+
+    retry_after = headers.get("retry-after")
+    try:
+        return min(float(retry_after), max_delay)
+    except (TypeError, ValueError):
+        pass
+
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0), max_delay)
+    except (TypeError, ValueError):
+        return min(base_delay * (2 ** attempt), max_delay) * random.uniform(0.5, 1.0)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate_per_minute` tokens per minute, holding at most `capacity` tokens.
+
+    `reserve` takes the tokens right away, possibly leaving the bucket in debt, and returns how long the caller
+    must wait before using them. Callers are therefore served in the order they reserved.
+    """
+    def __init__(self, rate_per_minute, capacity=None) -> None:
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute must be positive, got {rate_per_minute}.")
+
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """
+        :return: seconds to wait until the reserved tokens are available
+        """
+        with self.lock:
+            self.__refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        """
+        Give back tokens reserved in excess (or take more when `amount` is negative)
+        """
+        with self.lock:
+            self.__refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class ModelRateLimiter:
+    """
+    Requests per minute and tokens per minute limits of a model
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, estimated_tokens):
+        """
+        :return: seconds to wait before sending a request of about `estimated_tokens` tokens
+        """
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.reserve(estimated_tokens))
+
+        return max(delays)
+
+    def settle(self, estimated_tokens, used_tokens):
+        """
+        Correct the token reservation once the actual usage of the request is known
+        """
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.refund(estimated_tokens - used_tokens)
+
+
+def set_rate_limits(model, requests_per_minute=None, tokens_per_minute=None):
+    """
+    Cap the requests and tokens per minute sent to `model` by all the clients of the process.
+    Passing no limit removes the limits of the model.
+    """
+    with _lock:
+        if requests_per_minute or tokens_per_minute:
+            _rate_limiters[model] = ModelRateLimiter(requests_per_minute, tokens_per_minute)
+        else:
+            _rate_limiters.pop(model, None)
+
+
+def get_rate_limiter(model):
+    return _rate_limiters.get(model)
+
+
+def get_http_client(asynchronous=False):
+    """
+    Pooled HTTP client shared by all the OpenAI clients: one for the process, or one per event loop when
+    `asynchronous` (to be called from a coroutine)
+    """
+    import httpx
+
+    with _lock:
+        clients = _event_loop_clients() if asynchronous else _http_clients
+        if "http" not in clients:
+            http_client_class = httpx.AsyncClient if asynchronous else httpx.Client
+            clients["http"] = http_client_class(
+                                    timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+                                    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                                        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS)
+                                )
+
+        return clients["http"]
+
+
+def get_openai_client(provider="openai", base_url=None, api_key=None, asynchronous=False):
+    """
+    Cached OpenAI SDK client of a provider, using the shared HTTP client and no SDK level retries.
+    The asynchronous clients are cached per event loop, and must be requested from a coroutine.
+    """
+    if provider not in SUPPORTED_PROVIDERS:
+        raise ValueError(f"{provider} LLM provider currently not supported. Please use one of {SUPPORTED_PROVIDERS}.")
+
+    load_environment()
+
+    if provider == "local":
+        base_url = base_url or os.getenv("LOCAL_LLM_BASE_URL", DEFAULT_LOCAL_BASE_URL)
+        # Local servers usually ignore the key, but the SDK requires one
+        api_key = api_key or os.getenv("LOCAL_LLM_API_KEY", "local")
+
+    key = (provider, base_url, api_key)
+    http_client = get_http_client(asynchronous=asynchronous)
+
+    import openai
+
+    with _lock:
+        clients = _event_loop_clients() if asynchronous else _openai_clients
+        if key not in clients:
+            client_class = openai.AsyncOpenAI if asynchronous else openai.OpenAI
+            clients[key] = client_class(base_url=base_url, api_key=api_key, max_retries=0, http_client=http_client)
+
+        return clients[key]
+
+
+def _event_loop_clients():
+    """
+    Clients of the running event loop. The clients of the loops closed since (e.g. by a previous `asyncio.run`)
+    are dropped, as their connections cannot be reused. Called with `_lock` held.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    for closed_loop in [other_loop for other_loop in _loop_clients if other_loop.is_closed()]:
+        del _loop_clients[closed_loop]
+
+    return _loop_clients.setdefault(loop, {})
+
+
+def create_llm_client(provider="openai", base_url=None, api_key=None, asynchronous=False, **retry_options):
+    """
+    OpenAI compatible client of `provider` with rate limiting and retries.
+
+    :param provider: 'openai' or 'local' (any OpenAI compatible server, see `DEFAULT_LOCAL_BASE_URL`)
+    :param base_url: endpoint of the provider. Defaults to OpenAI, or to `LOCAL_LLM_BASE_URL` for the 'local' provider.
+    :param asynchronous: return an `AsyncLLMClient` instead of an `LLMClient`. Its SDK client is looked up on every
+                         request, so that the client can be used from several event loops.
+    :param retry_options: `max_retries`, `base_delay` and `max_delay` of the client
+    """
+    if provider not in SUPPORTED_PROVIDERS:
+        raise ValueError(f"{provider} LLM provider currently not supported. Please use one of {SUPPORTED_PROVIDERS}.")
+
+    if asynchronous:
+        return AsyncLLMClient(None, provider=provider, base_url=base_url, api_key=api_key, **retry_options)
+
+    client = get_openai_client(provider=provider, base_url=base_url, api_key=api_key)
+    return LLMClient(client, **retry_options)
+
+
+def estimate_request_tokens(messages=None, input=None, max_tokens=None):
+    if messages is not None:
+        text = "".join(str(message.get("content") or "") for message in messages)
+    else:
+        text = "".join(input) if isinstance(input, list) else str(input)
+
+    return estimate_tokens(text) + (max_tokens or 0)
+
+
+def used_tokens(response):
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+class LLMClient:
+    """
+    Wraps an OpenAI compatible client: every request waits for the rate limits of its model and is retried with
+    backoff on rate limits and transient errors. Retries are counted in the LLM call being traced, if any.
+
+    :param client: OpenAI compatible client doing the actual requests
+    :param max_retries: retries of a request before its error is raised
+    :param base_delay: first backoff delay in seconds, doubled on every retry
+    :param max_delay: upper bound of a backoff delay in seconds
+    """
+    def __init__(self, client, max_retries=5, base_delay=1.0, max_delay=60.0) -> None:
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+        self.embeddings = SimpleNamespace(create=self.create_embedding)
+
+    def create_chat_completion(self, model, messages, **kwargs):
+        estimated_tokens = estimate_request_tokens(messages=messages, max_tokens=kwargs.get("max_tokens"))
+        return self._request(self.client.chat.completions.create, estimated_tokens, model=model, messages=messages, **kwargs)
+
+    def create_embedding(self, input, model, **kwargs):
+        estimated_tokens = estimate_request_tokens(input=input)
+        return self._request(self.client.embeddings.create, estimated_tokens, input=input, model=model, **kwargs)
+
+    def _request(self, create, estimated_tokens, **kwargs):
+        rate_limiter = get_rate_limiter(kwargs["model"])
+
+        for attempt in range(self.max_retries + 1):
+            if rate_limiter is not None:
+                time.sleep(rate_limiter.reserve(estimated_tokens))
+
+            try:
+                response = create(**kwargs)
+            except retryable_errors() as e:
+                time.sleep(self._retry_delay(e, attempt))
+                continue
+
+            if rate_limiter is not None:
+                rate_limiter.settle(estimated_tokens, used_tokens(response))
+
+            return response
+
+    def _retry_delay(self, error, attempt):
+        """
+        Delay before the next attempt, or re-raise `error` when no retry is left
+        """
+        if attempt == self.max_retries:
+            raise error
+
+        delay = retry_after_seconds(error, attempt, base_delay=self.base_delay, max_delay=self.max_delay)
+        record_retry()
+        print (f"{type(error).__name__} from the LLM API. Retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})...")
+
+        return delay
+
+
+class AsyncLLMClient(LLMClient):
+    """
+    asyncio variant of `LLMClient`, waiting with `asyncio.sleep`.
+
+    :param client: asynchronous OpenAI compatible client, or None to use the SDK client of `provider` cached for the
+                   running event loop (see `get_openai_client`)
+    """
+    def __init__(self, client, provider="openai", base_url=None, api_key=None, **retry_options) -> None:
+        self.provider = provider
+        self.base_url = base_url
+        self.api_key = api_key
+        super().__init__(client, **retry_options)
+
+    @property
+    def client(self):
+        if self._client is None:
+            return get_openai_client(provider=self.provider, base_url=self.base_url, api_key=self.api_key, asynchronous=True)
+
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    async def create_chat_completion(self, model, messages, **kwargs):
+        estimated_tokens = estimate_request_tokens(messages=messages, max_tokens=kwargs.get("max_tokens"))
+        return await self._request(self.client.chat.completions.create, estimated_tokens, model=model, messages=messages, **kwargs)
+
+    async def create_embedding(self, input, model, **kwargs):
+        estimated_tokens = estimate_request_tokens(input=input)
+        return await self._request(self.client.embeddings.create, estimated_tokens, input=input, model=model, **kwargs)
+
+    async def _request(self, create, estimated_tokens, **kwargs):
+        import asyncio
+
+        rate_limiter = get_rate_limiter(kwargs["model"])
+
+        for attempt in range(self.max_retries + 1):
+            if rate_limiter is not None:
+                await asyncio.sleep(rate_limiter.reserve(estimated_tokens))
+
+            try:
+                response = await create(**kwargs)
+            except retryable_errors() as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+
+            if rate_limiter is not None:
+                rate_limiter.settle(estimated_tokens, used_tokens(response))
+
+            return response
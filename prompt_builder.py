@@ -0,0 +1,148 @@
+"""
+Token budgeted assembly of the code generation prompt.
+
+The examples of every integration are ranked by relevance (the order in which the example selector returned them).
+They are added to the prompt round robin across integrations, best first, until the token budget is used.
+The example that does not fit anymore is truncated when enough room is left, otherwise it is dropped along with every
+lower ranked example that does not fit either.
+"""
+import json
+from typing import Dict, List, NamedTuple, Optional
+from prompt_templates import AUTOMATION_CODE_PROMPT, AUTOMATION_CODE_OUTPUT_GUIDELINES
+from utils.rag_utils import num_tokens_from_string, truncate_text_tokens
+
+
+class CodeGenerationPrompt(NamedTuple):
+    prompt: str
+    num_tokens: Optional[int]
+    token_budget: Optional[int]
+    included: List[str]
+    truncated: List[str]
+    dropped: List[str]
+
+
+def render_code_generation_prompt(job_description, tasks_and_trigger, usable_integrations, examples):
+    """
+    Render the code generation prompt.
+
+    :param examples: dictionary where key is the integration name and value is a dictionary of filename -> code
+    """
+    parts = [AUTOMATION_CODE_PROMPT.format(usable_integrations=usable_integrations), "\n\n", "Here are the examples:\n"]
+
+    for integration, integration_examples in examples.items():
+        parts.append(f"\n\nThird party API name: {integration}")
+        parts.append(f"\n\nExamples of {integration}")
+
+        for name, code in integration_examples.items():
+            parts.append(render_example(name, code))
+
+        parts.append("\n\n" + "**"*20)
+
+    parts.append(f"\n\n**Job description**: {job_description}")
+    parts.append("\n\n**JSON string representing the job trigger details and the sequence of tasks**\n\n")
+    parts.append(json.dumps(tasks_and_trigger, indent=4))
+    parts.append(AUTOMATION_CODE_OUTPUT_GUIDELINES)
+    parts.append("\n\nGenerated `trigger.dev` Typescript code:\n\n")
+
+    return "".join(parts)
+
+
+def render_example(name, code):
+    return f"\n\nExample: {name}\n\nCode:\n\n{code}"
+
+
+def rank_examples(examples: Dict[str, Dict[str, str]]):
+    """
+    Interleave the examples of all integrations by rank: the best example of every integration comes first,
+    then the second best of every integration, and so on.
+
+    :return: list of (integration, name, code) tuples, most relevant first
+    """
+    per_integration = [[(integration, name, code) for name, code in integration_examples.items()]
+                       for integration, integration_examples in examples.items()]
+
+    ranked = []
+    for rank in range(max((len(items) for items in per_integration), default=0)):
+        for items in per_integration:
+            if rank < len(items):
+                ranked.append(items[rank])
+
+    return ranked
+
+
+def build_code_generation_prompt(job_description, tasks_and_trigger, usable_integrations, examples, token_budget=None,
+                                 count_tokens=num_tokens_from_string, truncate=truncate_text_tokens, min_example_tokens=200):
+    """
+    Build the code generation prompt, fitting as many examples as possible into `token_budget` tokens.
+
+    :param examples: dictionary where key is the integration name and value is a dictionary of filename -> code,
+                     ordered from most to least relevant
+    :param token_budget: maximum number of prompt tokens. No limit (and no token counting) when None.
+    :param count_tokens: function returning the number of tokens of a string
+    :param truncate: function truncating a string to a number of tokens
+    :param min_example_tokens: an example is only truncated when at least this many tokens of its code fit
+    :return: `CodeGenerationPrompt` with the prompt, its token count and the included/truncated/dropped examples
+             as 'integration/filename' strings
+    """
+    def render(selected):
+        return render_code_generation_prompt(job_description, tasks_and_trigger, usable_integrations, selected)
+
+    return fit_examples(render, examples, token_budget=token_budget, count_tokens=count_tokens, truncate=truncate,
+                        min_example_tokens=min_example_tokens)
+
+
+def fit_examples(render, examples, token_budget=None, count_tokens=num_tokens_from_string, truncate=truncate_text_tokens,
+                 min_example_tokens=200):
+    """
+    Fit as many examples as possible into a prompt of `token_budget` tokens, most relevant first.
+    Shared by every prompt embedding examples (see `build_code_generation_prompt`).
+
+    :param render: function rendering the prompt from a dictionary of integration -> {filename: code}
+    :return: `CodeGenerationPrompt`, see `build_code_generation_prompt`
+    """
+    ranked = rank_examples(examples)
+    all_keys = [f"{integration}/{name}" for integration, name, code in ranked]
+
+    if token_budget is None:
+        return CodeGenerationPrompt(render(examples), None, None, all_keys, [], [])
+
+    # Every integration keeps its header, even when all of its examples are dropped
+    selected = {integration: {} for integration in examples}
+    remaining = token_budget - count_tokens(render(selected))
+    truncated = []
+
+    for integration, name, code in ranked:
+        cost = count_tokens(render_example(name, code))
+        if cost <= remaining:
+            selected[integration][name] = code
+            remaining -= cost
+            continue
+
+        room_for_code = remaining - count_tokens(render_example(name, ""))
+        if room_for_code >= min_example_tokens:
+            selected[integration][name] = truncate(code, max_tokens=room_for_code)
+            truncated.append(f"{integration}/{name}")
+            remaining -= count_tokens(render_example(name, selected[integration][name]))
+
+    # Token counts of the parts do not exactly add up to the count of the whole prompt,
+    # so drop the lowest ranked examples until the rendered prompt really fits
+    prompt = render(selected)
+    num_tokens = count_tokens(prompt)
+    included = [(integration, name) for integration, name, code in ranked if name in selected[integration]]
+
+    while num_tokens > token_budget and included:
+        integration, name = included.pop()
+        del selected[integration][name]
+        prompt = render(selected)
+        num_tokens = count_tokens(prompt)
+
+    included_keys = [f"{integration}/{name}" for integration, name in included]
+
+    return CodeGenerationPrompt(
+                prompt=prompt,
+                num_tokens=num_tokens,
+                token_budget=token_budget,
+                included=included_keys,
+                truncated=[key for key in truncated if key in included_keys],
+                dropped=[key for key in all_keys if key not in included_keys]
+            )
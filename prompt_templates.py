@@ -96,4 +96,101 @@ Output:
     ]
 }
 
-"""
\ No newline at end of file
+"""
+AUTOMATION_CODE_PROMPT = """
+**Goal**
+
+You are given the following inputs:
+1. Job description: A job is defined as a sequence of tasks and it can be triggered due to an event, webhook or a schedule.
+2. Sequence of tasks and job trigger as a JSON string
+3. A list of third party APIs that you will need to accomplish your goal.
+4. Examples showcasing different use cases of the third party APIs.
+
+Your goal is to generate an equivalent [trigger.dev](https://trigger.dev/docs/documentation/introduction) Typescript code. Use the examples intelligently
+to generate the code.
+
+List of the third party APIs you can use: {usable_integrations}
+
+"""
+
+AUTOMATION_CODE_OUTPUT_GUIDELINES = """
+
+**Output guidelines**
+
+1. Only generate the typescript code as output. Do not include any backticks, quotes, explanatory text as part of the output.
+2. The generated code should be valid Typescript code.
+3. Add inline comments in the generated code to make it easy to understand.
+"""
+
+SKELETON_CODE_PROMPT = """
+**Goal**
+
+You are given the following inputs:
+1. Job description: A job is defined as a sequence of tasks and it can be triggered due to an event, webhook or a schedule.
+2. Sequence of tasks and job trigger as a JSON string
+3. A list of third party APIs that the job uses.
+4. Examples showcasing different use cases of the third party APIs.
+
+Your goal is to generate the skeleton of the equivalent [trigger.dev](https://trigger.dev/docs/documentation/introduction) Typescript code:
+the imports, the `TriggerClient`, the integration clients and the `client.defineJob` call with its trigger.
+
+Do not implement the tasks. The body of the `run: async (payload, io, ctx) => {{ ... }}` function must only contain the
+following placeholder lines, in this order and exactly as written:
+
+{placeholders}
+
+Declare the client of every third party API in a constant named after the API (for example `const slack = new Slack({{ id: "slack" }});`)
+and pass all of them to the `integrations` of `client.defineJob`, so that the tasks can use them as `io.<API name>`.
+
+List of the third party APIs you can use: {usable_integrations}
+
+"""
+
+TASK_CODE_PROMPT = """
+**Goal**
+
+You are given the following inputs:
+1. Job description: A job is defined as a sequence of tasks and it can be triggered due to an event, webhook or a schedule.
+2. Sequence of tasks and job trigger as a JSON string
+3. Examples showcasing different use cases of the third party APIs of one of the tasks.
+
+The job is implemented as a [trigger.dev](https://trigger.dev/docs/documentation/introduction) job. The client of every third party API
+is passed to the `integrations` of `client.defineJob`, so that it is available as `io.<API name>` (for example `io.slack`) inside the
+`run: async (payload, io, ctx) => {{ ... }}` function.
+
+Your goal is to generate the Typescript statements of the `run` function implementing only the task {task_sequence_id}: {task_desc}
+
+List of the third party APIs this task can use: {task_integrations}
+
+"""
+
+TASK_CODE_OUTPUT_GUIDELINES = """
+
+**Output guidelines**
+
+1. Only generate the typescript statements of the task. Do not include any imports, client declarations, `client.defineJob` call,
+   backticks, quotes or explanatory text as part of the output.
+2. Store the result of the task in a constant named `task{task_sequence_id}Result`. The results of the previous tasks are available
+   as `task<task_sequence_id>Result`, e.g. `task1Result`.
+3. Add inline comments in the generated code to make it easy to understand.
+"""
+
+TASKS_REPAIR_PROMPT = """
+Your previous output for the job description below is not valid. It must be a JSON object conforming to the JSON schema below.
+
+**Job description**
+{job_description}
+
+**JSON schema**
+{schema}
+
+**Your previous output**
+{output}
+
+**Validation errors**
+{errors}
+
+Fix the validation errors and return only the corrected JSON object, without any explanation or code fence.
+
+Output:
+"""
@@ -1,29 +1,180 @@
 from typing import List, Dict
-from openai import OpenAI
 import os
 import re
 import json
+import contextvars
 import schemas
-from utils.rag_utils import is_valid_json, load_examples
+from utils.rag_utils import num_tokens_from_string
+from utils.example_corpus import get_example_corpus
+from integration_catalog import get_integration_catalog
+from utils.llm_cache import make_cache_key
 from collections import defaultdict
-from dotenv import load_dotenv
-from prompt_templates import TASKS_BREAKDOWN_PROMPT
+from tracing import traced_pipeline, traced_stage, trace_llm_call, record_usage
+from llm_clients import create_llm_client
 
-load_dotenv()
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
+# Importing this module must stay cheap (CLI and serverless cold starts, see `benchmarks/bench_import.py`):
+# the OpenAI SDK, jsonschema, the prompt templates, the `.env` file and the example index are loaded on first use.
+
+SYSTEM_MESSAGE = "You are an expert software engineer who is proficient in TypeScript."
+
+# Pipeline stages calling an LLM, whose model can be configured with `stage_models`
+LLM_STAGES = ("break_job_into_tasks", "select_examples", "generate_code")
+
+# Values of the `code_generation` option
+CODE_GENERATION_MODES = ("single", "per_task")
+
+# Markdown code fence around an LLM output, e.g. ```json ... ```
+CODE_FENCE_PATTERN = re.compile(r"^```[\w-]*\s*(.*?)\s*```$", re.DOTALL)
 
 class AutomateRAG:
-    def __init__(self, main_llm: str = "gpt-4-0125-preview", embed_llm: str = "text-embedding-ada-002") -> None:
+    def __init__(self, main_llm: str = "gpt-4-0125-preview", embed_llm: str = "text-embedding-ada-002", llm_cache=None,
+                 example_selector: str = "llm", rerank_examples: bool = False, prompt_token_budget: int = 16000,
+                 export_otel: bool = False, llm_provider: str = "openai", llm_base_url: str = None,
+                 stage_models: Dict[str, str] = None, json_mode: bool = True, semantic_cache=None,
+                 code_generation: str = "single", embedder="openai") -> None:
         self.main_llm = main_llm
-        self.main_llm_client = OpenAI()
         self.embed_llm = embed_llm
+
+        # Model of every LLM stage (see `LLM_STAGES`), `main_llm` unless overridden. The short structured stages can run
+        # on a small fast model, e.g. {"break_job_into_tasks": "gpt-3.5-turbo-0125", "select_examples": "gpt-3.5-turbo-0125"}.
+        # Whenever the output of a smaller model is unusable, the stage is run again on `main_llm`.
+        unknown_stages = set(stage_models or {}) - set(LLM_STAGES)
+        if unknown_stages:
+            raise ValueError(f"Unknown stages {sorted(unknown_stages)} in stage_models. Please use some of {LLM_STAGES}.")
+
+        self.stage_models = {stage: main_llm for stage in LLM_STAGES}
+        self.stage_models.update(stage_models or {})
+
+        # The task breakdown is requested in JSON mode (`response_format`, disable it for servers that do not support
+        # it) and validated against `schemas.TASKS_SCHEMA`. An invalid output is sent back with its validation
+        # errors up to `max_repair_attempts` times, which is cheaper than running the whole breakdown again.
+        self.json_mode = json_mode
+        self.max_repair_attempts = 1
+
+        # LLM calls go through the shared client layer (see `llm_clients.py`): pooled HTTP connections,
+        # per model rate limits and retries with backoff. 'local' targets any OpenAI compatible server.
+        self.llm_provider = llm_provider
+        self.llm_base_url = llm_base_url
+        self._main_llm_client = None
+
+        # Optional response cache (see `utils.llm_cache`). All LLM calls run at temperature 0,
+        # so identical prompts can be answered from the cache.
+        self.llm_cache = llm_cache
+
+        # Optional cache of task breakdowns keyed by the embedding of the job description (see `semantic_cache.py`),
+        # so that paraphrases of a previous job description skip the breakdown call.
+        self.semantic_cache = semantic_cache
+
+        # How `smart_automate` picks the relevant examples of an integration:
+        #   - 'llm': ask the LLM to pick them from the example descriptions
+        #   - 'embedding': rank them by cosine similarity with the tasks (see `example_index.py`),
+        #     optionally letting the LLM re-rank the top candidates when `rerank_examples` is set
+        if example_selector not in ("llm", "embedding"):
+            raise ValueError(f"{example_selector} example selector currently not supported. Please use 'llm' or 'embedding'.")
+
+        self.example_selector = example_selector
+        self.rerank_examples = rerank_examples
+        self.rerank_candidates = 4
+        self._example_index = None
+
+        # Embedder of the example index (see `embedders.py`): 'openai' (`embed_llm` through `llm_provider`),
+        # 'local' (hashed character n-gram TF-IDF, no network call) or any `embedders.BaseEmbedder`
+        if isinstance(embedder, str) and embedder not in ("openai", "local"):
+            raise ValueError(f"{embedder} embedder currently not supported. Please use 'openai', 'local' or a BaseEmbedder.")
+
+        self._embedder = embedder
+
+        # Upper bound on the size of the code generation prompt. The least relevant examples are
+        # truncated or dropped to stay within it. Set to None to include every example.
+        self.prompt_token_budget = prompt_token_budget
+        self.count_tokens = num_tokens_from_string
+
+        # How the code is generated (see `task_codegen.py`):
+        #   - 'single': one call writes the whole job from the examples of every integration
+        #   - 'per_task': a skeleton call and one call per task, given only the examples of its integrations,
+        #     run concurrently (at most `max_code_generation_workers` at a time) and assembled in task order
+        if code_generation not in CODE_GENERATION_MODES:
+            raise ValueError(f"{code_generation} code generation currently not supported. Please use one of {CODE_GENERATION_MODES}.")
+
+        self.code_generation = code_generation
+        self.max_code_generation_workers = 8
+
+        # Every pipeline run records the latency and token usage of its stages (see `tracing.py`).
+        # When set, the stages and LLM calls are also exported as OpenTelemetry spans.
+        self.export_otel = export_otel
         self.valid_integrations = ['sendgrid', 'airtable', 'gmail', 'linear', 'slack', 'supabase', 'github', 'openai', 'caldotcom']
-        
-        with open("./datasets/integration_metadata.json", 'r') as infile:
-            self.integrations_metadata = json.load(infile)
-            print ("Integrations metadata loaded successfully.")
-        
 
+        # Integrations metadata and name lookups are compiled once per process on first use (see `integration_catalog.py`).
+        # Integration names of the task breakdown are resolved to the directory names of `integrations/`.
+        self._integration_catalog = None
+
+        # Examples are read from disk once per process and kept in memory (see `utils.example_corpus`)
+        self.example_corpus = get_example_corpus(base_dir="integrations")
+
+    @property
+    def main_llm_client(self):
+        """
+        Client of every LLM call of the pipeline, created on first use. Can be replaced, e.g. by a fake in tests.
+        """
+        if self._main_llm_client is None:
+            self._main_llm_client = self._create_main_llm_client()
+
+        return self._main_llm_client
+
+    @main_llm_client.setter
+    def main_llm_client(self, client):
+        self._main_llm_client = client
+
+    def _create_main_llm_client(self):
+        return create_llm_client(provider=self.llm_provider, base_url=self.llm_base_url)
+
+    @property
+    def integration_catalog(self):
+        """
+        Integration catalog shared by the pipelines of the process, loaded on first use.
+        Set `INTEGRATION_CATALOG_SNAPSHOT` to load it from a precompiled snapshot (see `integration_catalog.py`).
+        """
+        if self._integration_catalog is None:
+            self._integration_catalog = get_integration_catalog(
+                                                metadata_path="./datasets/integration_metadata.json",
+                                                base_dir="integrations",
+                                                snapshot_path=os.getenv("INTEGRATION_CATALOG_SNAPSHOT")
+                                            )
+
+        return self._integration_catalog
+
+    @property
+    def integrations_metadata(self):
+        return self.integration_catalog.metadata
+
+    @property
+    def embedder(self):
+        """
+        Embedder of the example index, created on first use
+        """
+        if isinstance(self._embedder, str):
+            from embedders import create_embedder
+
+            self._embedder = create_embedder(self._embedder, embed_llm=self.embed_llm, provider=self.llm_provider, base_url=self.llm_base_url)
+
+        return self._embedder
+
+    @property
+    def example_index(self):
+        """
+        Vector index over the example descriptions, loaded (or built) on first use
+        """
+        if self._example_index is None:
+            from example_index import ExampleIndex
+
+            self._example_index = ExampleIndex(
+                                        integrations_metadata=self.integrations_metadata,
+                                        embedder=self.embedder
+                                    ).load_or_build()
+
+        return self._example_index
+
+    @traced_pipeline("automate")
     def automate(self, job_description: str):
         """
         Given a job description, break down into tasks and then generate equivalent `trigger.dev` TypeScript code
@@ -54,12 +205,8 @@ class AutomateRAG:
 
         # Step 3: 
         # Identify unique integrations/third party APIs that are required to complete the job
-        if is_valid_json(json_data=tasks_and_trigger, schema=schemas.TASKS_SCHEMA):
-            usable_integrations = self.__parse_integrations(json_data=tasks_and_trigger)
-            print (f"\nIdentified unique integrations:\n{'--'*50}\n{usable_integrations}\n")
-        else:
-            print ("\nLLM output does not conform to the tasks schema\n")
-            usable_integrations = None      
+        usable_integrations = self._parse_integrations(json_data=tasks_and_trigger)
+        print (f"\nIdentified unique integrations:\n{'--'*50}\n{usable_integrations}\n")
 
         # Step 4: 
         # Based on the identified integrations in step 3, fetch all code examples for each identied integration
@@ -83,6 +230,7 @@ class AutomateRAG:
         
         return automation_code
 
+    @traced_pipeline("smart_automate")
     def smart_automate(self, job_description: str):
         """
         Given a job description, break down into tasks and then generate equivalent `trigger.dev` TypeScript code
@@ -113,12 +261,8 @@ class AutomateRAG:
 
         # Step 3:
         # Identify unique integrations/third party APIs that are required to complete the job
-        if is_valid_json(json_data=tasks_and_trigger, schema=schemas.TASKS_SCHEMA):
-            usable_integrations = self.__parse_integrations(json_data=tasks_and_trigger)
-            print (f"\nUnique integrations:\n{'--'*50}\n{usable_integrations}\n")
-        else:
-            print ("\nLLM output does not conform to the tasks schema")
-            usable_integrations = None
+        usable_integrations = self._parse_integrations(json_data=tasks_and_trigger)
+        print (f"\nUnique integrations:\n{'--'*50}\n{usable_integrations}\n")
 
         # Step 4:
         # Based on the outputs of points 1, 2, and 3, fetch only relevant examples
@@ -145,92 +289,312 @@ class AutomateRAG:
         
         return automation_code
 
+    def stream_automate(self, job_description: str):
+        """
+        Streaming version of `automate`. Returns a generator of pipeline events, see `stream_smart_automate`.
+        """
+        return self._stream_pipeline(job_description=job_description, select_relevant_examples=False)
+
+    def stream_smart_automate(self, job_description: str):
+        """
+        Streaming version of `smart_automate`. Returns a generator of pipeline events (dictionaries with an `event`
+        and a `data` key), yielded as soon as they are available:
+
+            - 'tasks_and_trigger': the JSON output of the task breakdown
+            - 'integrations': the unique integrations used by the job
+            - 'examples': the names of the loaded examples of every integration
+            - 'code': the next piece of the generated TypeScript code, as streamed by the LLM
+            - 'done': the complete generated code
+        """
+        return self._stream_pipeline(job_description=job_description, select_relevant_examples=True)
+
+    def _stream_pipeline(self, job_description, select_relevant_examples):
+
+        # Step 1 and 2: Break down the job into tasks and identify the job trigger
+        tasks_and_trigger = self.break_job_into_tasks(job_description=job_description)
+        yield {"event": "tasks_and_trigger", "data": tasks_and_trigger}
+
+        # Step 3: Identify unique integrations/third party APIs that are required to complete the job
+        usable_integrations = self._parse_integrations(json_data=tasks_and_trigger)
+        yield {"event": "integrations", "data": usable_integrations}
+
+        # Step 4: Load all or only the relevant examples of the integrations
+        if select_relevant_examples:
+            examples = self.fetch_select_integrations_examples(tasks_and_trigger=tasks_and_trigger, integrations=usable_integrations)
+        else:
+            examples = self.fetch_all_integration_examples(integrations=usable_integrations)
+        yield {"event": "examples", "data": {integration: list(api_examples) for integration, api_examples in examples.items()}}
+
+        # Step 5: Stream the generated code
+        code_chunks = []
+        for code_chunk in self.stream_code(
+                                job_description=job_description,
+                                tasks_and_trigger=tasks_and_trigger,
+                                usable_integrations=usable_integrations,
+                                examples=examples
+                            ):
+            code_chunks.append(code_chunk)
+            yield {"event": "code", "data": code_chunk}
+
+        yield {"event": "done", "data": "".join(code_chunks)}
+
+    def stream_code(self, job_description, tasks_and_trigger, usable_integrations, examples):
+        """
+        Same as `generate_code`, but yields the generated code piece by piece as the LLM streams it.
+        In the 'per_task' mode, the code is yielded in one piece once every fragment is assembled.
+        """
+        if self.code_generation == "per_task":
+            yield self.generate_code(job_description, tasks_and_trigger, usable_integrations, examples)
+            return
+
+        prompt = self._build_code_generation_prompt(
+                                    job_description=job_description,
+                                    tasks_and_trigger=tasks_and_trigger,
+                                    usable_integrations=usable_integrations,
+                                    examples=examples
+                    )
+
+        yield from self.__stream_llm_api(llm_name=self.stage_models["generate_code"], query=prompt)
+
+    @traced_stage("generate_code")
     def generate_code(self, job_description, tasks_and_trigger, usable_integrations, examples):
 
-        examples_string = "Here are the examples:\n"  
+        if self.code_generation == "per_task":
+            return self._generate_code_per_task(job_description, tasks_and_trigger, usable_integrations, examples)
+
+        prompt = self._build_code_generation_prompt(
+                                    job_description=job_description,
+                                    tasks_and_trigger=tasks_and_trigger,
+                                    usable_integrations=usable_integrations,
+                                    examples=examples
+                    )
         
-        for integration, examples in examples.items():
-            examples_string += f"\n\nThird party API name: {integration}"
-            examples_string += f"\n\nExamples of {integration}"
+        code_output = self.__invoke_llm_api(llm_name=self.stage_models["generate_code"], query=prompt)
 
-            for name, code in examples.items():
-                examples_string += f"\n\nExample: {name}"
-                examples_string += f"\n\nCode:\n\n{code}"
-                
-            examples_string += ("\n\n" + "**"*20)
+        return code_output
 
-        AUTOMATION_CODE_PROMPT_TEMPLATE = f"""
-**Goal**
+    def _build_code_generation_prompt(self, job_description, tasks_and_trigger, usable_integrations, examples):
+        """
+        Build the final code generation prompt from the job description, the tasks breakdown and the loaded examples.
+        The examples are fitted into `prompt_token_budget` tokens, most relevant first (see `prompt_builder.py`).
+        Shared by the sync and async pipelines.
+        """
+        from prompt_builder import build_code_generation_prompt
+
+        code_prompt = build_code_generation_prompt(
+                                job_description=job_description,
+                                tasks_and_trigger=tasks_and_trigger,
+                                usable_integrations=usable_integrations,
+                                examples=examples,
+                                token_budget=self.prompt_token_budget,
+                                count_tokens=self.count_tokens
+                        )
 
-You are given the following inputs:
-1. Job description: A job is defined as a sequence of tasks and it can be triggered due to an event, webhook or a schedule.
-2. Sequence of tasks and job trigger as a JSON string
-3. A list of third party APIs that you will need to accomplish your goal.
-4. Examples showcasing different use cases of the third party APIs.
+        if code_prompt.num_tokens is not None:
+            print (f"Code generation prompt: {code_prompt.num_tokens} tokens (budget {code_prompt.token_budget}), "
+                   f"{len(code_prompt.included)} examples included, {len(code_prompt.truncated)} truncated, {len(code_prompt.dropped)} dropped.\n")
 
-Your goal is to generate an equivalent [trigger.dev](https://trigger.dev/docs/documentation/introduction) Typescript code. Use the examples intelligently
-to generate the code.
+            if code_prompt.dropped:
+                print (f"Examples dropped to fit the token budget: {code_prompt.dropped}\n")
 
-List of the third party APIs you can use: {usable_integrations}
+        return code_prompt.prompt
 
-"""
+    def _generate_code_per_task(self, job_description, tasks_and_trigger, usable_integrations, examples):
+        """
+        Generate the skeleton and the code of every task in a thread pool, then assemble them (see `task_codegen.py`)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from task_codegen import assemble_job_code
 
-        prompt = AUTOMATION_CODE_PROMPT_TEMPLATE + "\n\n" + examples_string
+        prompts = self._build_task_code_prompts(job_description, tasks_and_trigger, usable_integrations, examples)
+        model = self.stage_models["generate_code"]
 
-        prompt += f"\n\n**Job description**: {job_description}"
+        # Every call runs in a copy of the current context, so that it is traced in the 'generate_code' stage
+        with ThreadPoolExecutor(max_workers=min(self.max_code_generation_workers, len(prompts))) as executor:
+            futures = {key: executor.submit(contextvars.copy_context().run, self.__invoke_llm_api, llm_name=model, query=prompt)
+                       for key, prompt in prompts.items()}
+            outputs = {key: future.result() for key, future in futures.items()}
 
-        prompt += "\n\n**JSON string representing the job trigger details and the sequence of tasks**\n\n"
+        skeleton = outputs.pop("skeleton")
 
-        tasks_and_trigger_string = json.dumps(tasks_and_trigger, indent=4)
+        return assemble_job_code(skeleton, outputs)
 
-        prompt += tasks_and_trigger_string
+    def _build_task_code_prompts(self, job_description, tasks_and_trigger, usable_integrations, examples):
+        """
+        Build the prompts of the 'per_task' code generation, each one fitted into `prompt_token_budget` tokens.
+        Shared by the sync and async pipelines.
 
-        prompt += """
+        :return: dictionary with the skeleton prompt under 'skeleton' and the prompt of every task under its task_sequence_id
+        """
+        from task_codegen import build_task_code_prompts
+
+        skeleton_prompt, task_prompts = build_task_code_prompts(
+                                job_description=job_description,
+                                tasks_and_trigger=tasks_and_trigger,
+                                usable_integrations=usable_integrations,
+                                examples=examples,
+                                token_budget=self.prompt_token_budget,
+                                count_tokens=self.count_tokens
+                        )
 
-**Output guidelines**
+        if skeleton_prompt.num_tokens is not None:
+            print (f"Per task code generation prompts: skeleton {skeleton_prompt.num_tokens} tokens, tasks "
+                   f"{[task_prompt.num_tokens for task_prompt in task_prompts.values()]} tokens (budget {skeleton_prompt.token_budget} each).\n")
 
-1. Only generate the typescript code as output. Do not include any backticks, quotes, explanatory text as part of the output.
-2. The generated code should be valid Typescript code.
-3. Add inline comments in the generated code to make it easy to understand.
-"""
-        prompt += "\n\nGenerated `trigger.dev` Typescript code:\n\n"
-        
-        code_output = self.__invoke_llm_api(llm_name=self.main_llm, query=prompt)
+        prompts = {"skeleton": skeleton_prompt.prompt}
+        prompts.update({task_sequence_id: task_prompt.prompt for task_sequence_id, task_prompt in task_prompts.items()})
 
-        return code_output
+        return prompts
 
+    @traced_stage("break_job_into_tasks")
     def break_job_into_tasks(self, job_description: str) -> List[str]:
         """
         Given a job description, break down into one or more tasks
+
+        :raises ValueError: when neither the stage model nor `main_llm` return a valid breakdown, even after repair
         """
-        
+
+        # Paraphrases of a previous job description reuse its breakdown (see `semantic_cache.py`)
+        if self.semantic_cache is not None:
+            tasks_and_trigger = self.semantic_cache.get(job_description)
+            if tasks_and_trigger is not None:
+                return tasks_and_trigger
+
+        tasks_and_trigger = self._request_tasks_and_trigger(job_description=job_description)
+
+        if self.semantic_cache is not None:
+            self.semantic_cache.set(job_description, tasks_and_trigger)
+
+        return tasks_and_trigger
+
+    def _request_tasks_and_trigger(self, job_description):
+        """
+        Ask the LLM for a valid task breakdown: JSON mode, schema validation, repair and fallback to `main_llm`
+        """
+        requests = self._tasks_breakdown_requests(job_description=job_description)
+        try:
+            model, prompt = next(requests)
+            while True:
+                output = self.__invoke_llm_api(llm_name=model, query=prompt, **self._tasks_breakdown_params())
+                model, prompt = requests.send(output)
+        except StopIteration as stop:
+            return stop.value
+
+    def _tasks_breakdown_requests(self, job_description):
+        """
+        Decide the LLM calls of the task breakdown, shared by the sync and async pipelines.
+
+        Generator yielding the (model, prompt) of each call and receiving its output through `send()`. It returns the
+        valid task breakdown, and raises ValueError when neither the stage model nor `main_llm` produced one.
+        """
+        prompt = self._build_tasks_breakdown_prompt(job_description=job_description)
+
+        # Small stage model first, then the main model when the stage runs on another one
+        for model in dict.fromkeys([self.stage_models["break_job_into_tasks"], self.main_llm]):
+            output = yield model, prompt
+            tasks_and_trigger, errors = self._validate_tasks_and_trigger(output)
+
+            for attempt in range(self.max_repair_attempts):
+                if not errors:
+                    break
+
+                print (f"Task breakdown of {model} is invalid: {errors}. Asking for a repair ({attempt + 1}/{self.max_repair_attempts})...")
+                repair_prompt = self._build_tasks_repair_prompt(job_description=job_description, output=output, errors=errors)
+                output = yield model, repair_prompt
+                tasks_and_trigger, errors = self._validate_tasks_and_trigger(output)
+
+            if not errors:
+                return tasks_and_trigger
+
+            print (f"Output of {model} does not conform to the tasks schema: {errors}")
+
+        raise ValueError(f"LLM output does not conform to the tasks schema: {errors}")
+
+    def _build_tasks_breakdown_prompt(self, job_description: str) -> str:
+        """
+        Build the prompt used to break down a job description into a trigger and a sequence of tasks.
+        """
+        from prompt_templates import TASKS_BREAKDOWN_PROMPT
+
         prompt = TASKS_BREAKDOWN_PROMPT + f"\n**Job Description**\n{job_description}"
         
         prompt += "\n\n**Predefined list of 3rd party APIs/integrations**\n" + f"{self.valid_integrations}"
         
         prompt += "\n\nOutput:\n"
 
-        output = self.__invoke_llm_api(llm_name=self.main_llm, query=prompt)
+        return prompt
 
-        tasks_and_trigger = self.__parse_tasks_and_trigger(input_text=output)
 
-        return tasks_and_trigger
+    def _tasks_breakdown_params(self):
+        """
+        Extra request parameters of the task breakdown calls
+        """
+        return {"response_format": {"type": "json_object"}} if self.json_mode else {}
 
+    def _build_tasks_repair_prompt(self, job_description, output, errors):
+        """
+        Build the prompt sending an invalid task breakdown back to the LLM along with its validation errors.
+        """
+        from prompt_templates import TASKS_REPAIR_PROMPT
 
-    def __parse_tasks_and_trigger(self, input_text):
+        return TASKS_REPAIR_PROMPT.format(
+                    job_description=job_description,
+                    schema=json.dumps(schemas.TASKS_SCHEMA, indent=2),
+                    output=output,
+                    errors="\n".join(f"- {error}" for error in errors)
+                )
+
+    def _validate_tasks_and_trigger(self, output):
+        """
+        Parse and validate the output of the task breakdown.
 
+        :return: (tasks_and_trigger, errors) where `errors` lists the reasons why the output is not a JSON
+                 conforming to the tasks schema, and is empty when the output is valid
+        """
         try:
-            json_data = json.loads(input_text)
-            return json_data
+            tasks_and_trigger = self._parse_tasks_and_trigger(input_text=output)
         except json.JSONDecodeError as e:
-            print (f"LLM output is not a valid JSON.\n\nThe output:\n\n{input_text}")
-            print (f"\n\nTrying out some strategies to convert the output into a valid JSON....")
-            cleaned_input_text = input_text.lstrip("```json").rstrip("```")
-            json_data = json.loads(cleaned_input_text)
-            return json_data
-        
-    
-    def __parse_integrations(self, json_data):
+            return None, [f"the output is not a valid JSON: {e}"]
+
+        errors = schemas.tasks_validation_errors(tasks_and_trigger)
+        if not errors:
+            self._resolve_integrations(tasks_and_trigger)
+
+        return tasks_and_trigger, errors
+
+    def _resolve_integrations(self, tasks_and_trigger):
+        """
+        Replace in place the integration names of a valid task breakdown by their canonical names
+        ('Slack' -> 'slack', 'caldotcom' -> 'caldotdom', ...), dropping the unknown integrations
+        """
+        sections = [tasks_and_trigger['job_trigger']] + tasks_and_trigger['tasks']
+
+        for section in sections:
+            section['integrations'] = self.integration_catalog.resolve_all(section['integrations'])
+
+    def _parse_tasks_and_trigger(self, input_text):
+        """
+        Parse the JSON output of the task breakdown, ignoring a surrounding markdown code fence (```json ... ```)
+        and any text before or after the JSON object.
+
+        :raises json.JSONDecodeError: when no JSON object can be parsed
+        """
+        text = (input_text or "").strip()
+
+        code_fence = CODE_FENCE_PATTERN.match(text)
+        if code_fence:
+            text = code_fence.group(1)
+
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            start, end = text.find("{"), text.rfind("}")
+            if start == -1 or end < start:
+                raise
+
+            return json.loads(text[start:end + 1])
+
+    def _parse_integrations(self, json_data):
         """
         Extracts unique integration values from both the job_trigger and tasks sections
         of a JSON object conforming to the specified schema.
@@ -253,6 +617,7 @@ List of the third party APIs you can use: {usable_integrations}
 
         return list(unique_integrations)
 
+    @traced_stage("load_examples")
     def fetch_all_integration_examples(self, integrations):
         """
         Given a list of integrations, load all the examples for each integration
@@ -260,21 +625,41 @@ List of the third party APIs you can use: {usable_integrations}
         all_examples = {}
 
         for integration in integrations:
-            if integration in self.valid_integrations:
-                all_examples[integration] = load_examples(dataset_path=f"integrations/{integration}")
+            if integration in self.integration_catalog:
+                all_examples[integration] = self.example_corpus.get_examples(integration=integration)
         
         return all_examples
     
 
+    @traced_stage("select_examples")
     def fetch_select_integrations_examples(self, tasks_and_trigger, integrations):
         """
         Given a list of integrations and a JSON object representing the task breakdown of a job,
         use LLM to identify 'relevant' examples that will help generate automation code
         for the given job.
         """
-        # Group tasks by integration and create a dictionary
-        # where keys are the integration/third party API names
-        # and values are the list of tasks that these APIs are relevant for
+        integrations_to_tasks_mapping = self._map_integrations_to_tasks(
+                                                tasks_and_trigger=tasks_and_trigger,
+                                                integrations=integrations
+                                            )
+
+        all_examples = {}
+
+        # Identify relevant code examples from a given list of code examples
+        for integration, tasks in integrations_to_tasks_mapping.items():
+            all_examples[integration] = self.select_relevant_examples(integration, tasks, max_examples=2)
+        
+        # Load selected examples from their respective files
+        selected_code_snippets = self.load_relevant_examples(all_examples)
+
+        return selected_code_snippets
+    
+    def _map_integrations_to_tasks(self, tasks_and_trigger, integrations):
+        """
+        Group tasks by integration and create a dictionary
+        where keys are the integration/third party API names
+        and values are the list of tasks that these APIs are relevant for
+        """
         integrations_to_tasks_mapping = defaultdict(list)
         for task in tasks_and_trigger['tasks']:
             if len(task['integrations']):
@@ -288,35 +673,90 @@ List of the third party APIs you can use: {usable_integrations}
         
         assert set(integrations_to_tasks_mapping.keys()) == set(integrations), "Mismatch in the integrations."
 
-        all_examples = {}
-
-        # Use LLM to identify relevant code examples from a given list of code examples
-        for integration, tasks in integrations_to_tasks_mapping.items():
-            all_examples[integration] = self.identify_relevant_examples(integration, tasks, max_examples=2)
-        
-        # Load selected examples from their respective files
-        selected_code_snippets = self.load_relevant_examples(all_examples)
+        return integrations_to_tasks_mapping
 
-        return selected_code_snippets
-    
+    @traced_stage("load_examples")
     def load_relevant_examples(self, input_dict):
         output_dict = defaultdict(list)
 
         for integration, examples_list in input_dict.items():
-            if integration in self.valid_integrations:
-                output_dict[integration] = load_examples(dataset_path=f"integrations/{integration}", select_examples=examples_list)
+            if integration in self.integration_catalog:
+                output_dict[integration] = self.example_corpus.get_examples(integration=integration, select_examples=examples_list)
 
         return output_dict
     
-    def identify_relevant_examples(self, integration, tasks, max_examples=1):
+    def select_relevant_examples(self, integration, tasks, max_examples=1):
+        """
+        Pick the examples of `integration` that are relevant for `tasks` with the configured example selector.
+        """
+        if self.example_selector == "llm":
+            return self.identify_relevant_examples(integration, tasks, max_examples=max_examples)
+
+        candidates = self._rank_examples_by_embedding(integration=integration, tasks=tasks, max_examples=max_examples)
+
+        if self.rerank_examples and len(candidates) > max_examples:
+            return self.identify_relevant_examples(integration, tasks, max_examples=max_examples, candidates=candidates)
+
+        return candidates[:max_examples]
+
+    def _rank_examples_by_embedding(self, integration, tasks, max_examples=1):
+        """
+        Names of the examples of `integration` closest to `tasks` in the embedding space, best first.
+        When re-ranking is enabled, a larger pool of candidates is returned for the LLM to choose from.
+        """
+        k = max(self.rerank_candidates, max_examples) if self.rerank_examples else max_examples
+        ranked_examples = self.example_index.top_k(integration=integration, tasks=tasks, k=k)
+
+        candidates = [name for name, score in ranked_examples]
+        print (f"Examples of API {integration} ranked by similarity:\n\n{ranked_examples}\n\n")
 
+        return candidates
+
+    def identify_relevant_examples(self, integration, tasks, max_examples=1, candidates=None):
+
+        requests = self._example_selection_requests(integration=integration, tasks=tasks, max_examples=max_examples, candidates=candidates)
+        try:
+            model, prompt = next(requests)
+            while True:
+                output = self.__invoke_llm_api(llm_name=model, query=prompt)
+                model, prompt = requests.send(output)
+        except StopIteration as stop:
+            return stop.value
+
+    def _example_selection_requests(self, integration, tasks, max_examples=1, candidates=None):
+        """
+        Decide the LLM calls of the example selection, shared by the sync and async pipelines.
+
+        Generator yielding the (model, prompt) of each call and receiving its output through `send()`. It returns the
+        selected examples, falling back to `main_llm` when the stage model did not select any.
+        """
         print (f"Finding relevant examples for API: {integration}...")
-        for item in self.integrations_metadata['integrations']:
-            if item['api_name'] == integration:
-                all_examples = item['examples']
-                break
-        
 
+        prompt = self._build_example_selection_prompt(integration=integration, tasks=tasks, max_examples=max_examples, candidates=candidates)
+
+        model = self.stage_models["select_examples"]
+        output = yield model, prompt
+        selected_examples = self._extract_selected_examples(integration=integration, output=output, max_examples=max_examples)
+
+        if not selected_examples and model != self.main_llm:
+            print (f"{model} did not select any example of API {integration}. Falling back to {self.main_llm}.")
+            output = yield self.main_llm, prompt
+            selected_examples = self._extract_selected_examples(integration=integration, output=output, max_examples=max_examples)
+
+        return selected_examples
+
+    def _build_example_selection_prompt(self, integration, tasks, max_examples=1, candidates=None):
+        """
+        Build the prompt that asks the LLM to pick the examples of `integration` that are relevant for `tasks`.
+        When `candidates` is given, only these examples are shown to the LLM.
+        """
+        # Only the name and the description of the examples are useful to the LLM
+        all_examples = [
+            example
+            for example in self.integration_catalog.selection_examples_of(integration)
+            if candidates is None or example['name'] in candidates
+        ]
+        
         prompt = f"""
 You are given some example usecases for a third party API called {integration}.
 
@@ -346,8 +786,12 @@ Output
 
 """
 
-        output = self.__invoke_llm_api(llm_name=self.main_llm, query=prompt)
+        return prompt
 
+    def _extract_selected_examples(self, integration, output, max_examples=1):
+        """
+        Extract the example filenames picked by the LLM from its free text answer.
+        """
         pattern = r"\b[\w-]+\.txt\b"
         selected_examples = re.findall(pattern, output)
 
@@ -355,21 +799,103 @@ Output
 
         return selected_examples[:max_examples]
     
-    def __invoke_llm_api(self, llm_name, query, llm_provider='openai'):
+    def __invoke_llm_api(self, llm_name, query, **params):
         """
         Generic method to call LLM API
         """
 
-        if llm_provider == "openai":
-            completion = self.main_llm_client.chat.completions.create(
-                            model=llm_name,
-                            temperature=0.0,
-                            messages=[
-                                {"role": "system", "content": "You are an expert software engineer who is proficient in TypeScript."},
-                                {"role": "user", "content": query}
-                            ]
-                        )
-            return completion.choices[0].message.content
-        else:
-            raise ValueError(f"{llm_provider} LLM provider currently not supported. Please use OpenAI.")
+        with trace_llm_call(model=llm_name) as llm_call:
+            cache_key = self._llm_cache_key(llm_name=llm_name, query=query, **params)
+            cached_output = self._cached_llm_output(cache_key)
+            if cached_output is not None:
+                llm_call["cache_hit"] = True
+                return cached_output
+
+            completion = self.main_llm_client.chat.completions.create(**self._completion_params(llm_name=llm_name, query=query, **params))
+            output = self._completion_output(llm_call, completion)
+
+        self._store_llm_output(cache_key, output)
+
+        return output
+
+    def __stream_llm_api(self, llm_name, query):
+        """
+        Generic method to call LLM API with a streamed response. Yields the content deltas.
+        A cached response is yielded in one piece.
+        """
+        cache_key = self._llm_cache_key(llm_name=llm_name, query=query)
+        cached_output = self._cached_llm_output(cache_key)
+        if cached_output is not None:
+            with trace_llm_call(model=llm_name, streamed=True) as llm_call:
+                llm_call["cache_hit"] = True
+            yield cached_output
+            return
+
+        output_chunks = []
+        with trace_llm_call(model=llm_name, streamed=True):
+            stream = self.main_llm_client.chat.completions.create(**self._completion_params(llm_name=llm_name, query=query, stream=True))
+
+            for chunk in stream:
+                delta = self._stream_delta(chunk)
+                if delta:
+                    output_chunks.append(delta)
+                    yield delta
+
+        self._store_llm_output(cache_key, "".join(output_chunks))
+
+    def _llm_cache_key(self, llm_name, query, **params):
+        """
+        Cache key of an LLM call, or None when caching is disabled
+        """
+        if self.llm_cache is None:
+            return None
+
+        return make_cache_key(model=llm_name, system_message=SYSTEM_MESSAGE, prompt=query, **params)
+
+    def _cached_llm_output(self, cache_key):
+        """
+        Cached output of an LLM call, or None on a miss or when caching is disabled
+        """
+        if cache_key is None:
+            return None
+
+        return self.llm_cache.get(cache_key)
+
+    def _store_llm_output(self, cache_key, output):
+        """
+        Cache the output of an LLM call. An empty output (e.g. a stream cut short by the provider) is not cached,
+        so that the prompt is tried again
+        """
+        if cache_key is not None and output:
+            self.llm_cache.set(cache_key, output)
+
+    def _completion_params(self, llm_name, query, **params):
+        """
+        Keyword arguments of the chat completion request of an LLM call
+        """
+        return dict(model=llm_name, temperature=0.0, messages=self._build_messages(query=query), **params)
+
+    def _completion_output(self, llm_call, completion):
+        """
+        Record the token usage of a chat completion on its traced LLM call and return its content
+        """
+        record_usage(llm_call, getattr(completion, "usage", None))
+        return completion.choices[0].message.content
+
+    def _stream_delta(self, chunk):
+        """
+        Content delta of a streamed chat completion chunk, or None
+        """
+        if chunk.choices:
+            return chunk.choices[0].delta.content
+        return None
+
+    def _build_messages(self, query):
+        """
+        Chat messages sent to the LLM for a single user query
+        """
+        return [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": query}
+        ]
 
@@ -1,3 +1,5 @@
+import functools
+
 TASKS_SCHEMA = {
   "type": "object",
   "properties": {
@@ -51,3 +53,39 @@ TASKS_SCHEMA = {
   "required": ["job_trigger", "tasks"],
   "additionalProperties": False
 }
+
+
+@functools.lru_cache(maxsize=None)
+def get_tasks_validator():
+    """
+    Validator of `TASKS_SCHEMA`, compiled once on first use: `jsonschema.validate` checks the schema and builds
+    a new validator on every call. jsonschema is only imported here, so that importing the pipelines stays cheap.
+    """
+    from jsonschema import Draft202012Validator
+
+    Draft202012Validator.check_schema(TASKS_SCHEMA)
+    return Draft202012Validator(TASKS_SCHEMA)
+
+
+def tasks_validation_errors(json_data, max_errors=10):
+    """
+    Human readable validation errors of a task breakdown against `TASKS_SCHEMA`, e.g.
+    "tasks/0/task_sequence_id: 0 is less than the minimum of 1". Empty when the breakdown is valid.
+
+    The task_sequence_ids must also be unique: the generated code of the tasks is assembled by task_sequence_id.
+    """
+    errors = []
+    for error in get_tasks_validator().iter_errors(json_data):
+        location = "/".join(str(part) for part in error.absolute_path) or "<root>"
+        errors.append(f"{location}: {error.message}")
+
+    tasks = json_data.get("tasks") if isinstance(json_data, dict) else None
+    if isinstance(tasks, list):
+        seen_ids = set()
+        for position, task in enumerate(tasks):
+            task_id = task.get("task_sequence_id") if isinstance(task, dict) else None
+            if isinstance(task_id, int) and task_id in seen_ids:
+                errors.append(f"tasks/{position}/task_sequence_id: {task_id} is not unique")
+            seen_ids.add(task_id)
+
+    return errors[:max_errors]
@@ -0,0 +1,172 @@
+"""
+Semantic cache of task breakdowns.
+
+Job descriptions are often paraphrases of each other ("Post Linear issues to Slack every weekday at 9am",
+"Every weekday at 9 AM, send the Linear issues to Slack", ...). An exact match cache misses them, so every paraphrase
+pays for a full `break_job_into_tasks` call. The semantic cache embeds the job description and reuses the task
+breakdown of the most similar previous description when their cosine similarity is at least `threshold`.
+
+The threshold should stay high: two descriptions that only differ by a detail (9am vs 10am) are very similar too,
+and the cached breakdown would carry the detail of the first one.
+
+The cache is optional: when a description cannot be embedded (e.g. the embeddings endpoint is down), the lookup is a
+miss and the breakdown is not stored, so that the pipeline carries on without it.
+
+    rag = AutomateRAG(semantic_cache=SemanticCache(threshold=0.97, max_entries=1000))
+
+"""
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+from embedders import OpenAIEmbedder
+
+
+class SemanticCache:
+    """
+    Bounded in-memory vector index of job descriptions and their task breakdowns, with LRU eviction.
+
+    :param embedding_client: OpenAI compatible client used to embed the job descriptions
+    :param embed_llm: embedding model
+    :param embedder: `embedders.BaseEmbedder` embedding the job descriptions, instead of `embed_llm` through `embedding_client`
+    :param threshold: minimum cosine similarity between two descriptions to reuse a breakdown
+    :param max_entries: maximum number of cached breakdowns, the least recently used one is evicted first
+    """
+    def __init__(self, embedding_client=None, embed_llm="text-embedding-ada-002", threshold=0.95, max_entries=1000,
+                 embedder=None) -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}.")
+
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}.")
+
+        self.embedder = embedder if embedder is not None else OpenAIEmbedder(model=embed_llm, client=embedding_client)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        # Row i of `vectors` is the normalized embedding of the entry stored in slot i.
+        # `entries` maps slot -> (description, JSON value), least recently used first.
+        self.vectors = None
+        self.entries = OrderedDict()
+        self.slots_by_description = {}
+
+        # Embeddings of the last looked up descriptions, so that storing a breakdown after a miss does not embed again
+        self.recent_embeddings = OrderedDict()
+
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.embedding_errors = 0
+        self.hit_similarity_sum = 0.0
+
+    def get(self, job_description):
+        """
+        Task breakdown of the most similar cached description, or None when no description is similar enough
+        or when the description cannot be embedded. Every call returns a new copy of the breakdown.
+        """
+        with self.lock:
+            # Identical descriptions do not need an embedding
+            slot = self.slots_by_description.get(job_description)
+            if slot is not None:
+                self.exact_hits += 1
+                return self.__hit(slot, similarity=1.0)
+
+        vector = self.__embed(job_description)
+
+        with self.lock:
+            if vector is not None and self.entries:
+                slots = np.fromiter(self.entries.keys(), dtype=np.int64)
+                similarities = self.vectors[slots] @ vector
+                best = int(np.argmax(similarities))
+
+                if similarities[best] >= self.threshold:
+                    return self.__hit(int(slots[best]), similarity=float(similarities[best]))
+
+            self.misses += 1
+            return None
+
+    def set(self, job_description, tasks_and_trigger):
+        """
+        Store the task breakdown of a job description, evicting the least recently used entry when the cache is full.
+        Nothing is stored when the description cannot be embedded.
+        """
+        vector = self.__embed(job_description)
+        if vector is None:
+            return
+
+        value = json.dumps(tasks_and_trigger)
+
+        with self.lock:
+            slot = self.slots_by_description.get(job_description)
+
+            if slot is None:
+                if len(self.entries) < self.max_entries:
+                    slot = len(self.entries)
+                else:
+                    slot, (evicted_description, evicted_value) = self.entries.popitem(last=False)
+                    del self.slots_by_description[evicted_description]
+                    self.evictions += 1
+
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            self.vectors[slot] = vector
+            self.entries[slot] = (job_description, value)
+            self.entries.move_to_end(slot)
+            self.slots_by_description[job_description] = slot
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "embedding_errors": self.embedding_errors,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "mean_hit_similarity": self.hit_similarity_sum / self.hits if self.hits else None,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.vectors = None
+            self.entries.clear()
+            self.slots_by_description.clear()
+            self.recent_embeddings.clear()
+
+    def __hit(self, slot, similarity):
+        self.entries.move_to_end(slot)
+        self.hits += 1
+        self.hit_similarity_sum += similarity
+
+        description, value = self.entries[slot]
+        print (f"Semantic cache hit (similarity {similarity:.3f}) with job description: {description}")
+
+        return json.loads(value)
+
+    def __embed(self, job_description):
+        """
+        Embedding of a job description, or None when the embedder fails
+        """
+        with self.lock:
+            if job_description in self.recent_embeddings:
+                return self.recent_embeddings[job_description]
+
+        try:
+            vector = self.embedder.embed_query(job_description)
+        except Exception as e:
+            with self.lock:
+                self.embedding_errors += 1
+            print (f"Semantic cache skipped, the job description could not be embedded: {type(e).__name__}: {e}")
+            return None
+
+        with self.lock:
+            self.recent_embeddings[job_description] = vector
+            if len(self.recent_embeddings) > 64:
+                self.recent_embeddings.popitem(last=False)
+
+        return vector
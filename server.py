@@ -0,0 +1,274 @@
+"""
+HTTP service exposing the RAG pipelines.
+
+A single pipeline instance is created when the server starts and kept warm across requests: the integrations
+metadata, the example corpus and the pooled LLM clients are loaded once. On top of it:
+
+    - concurrent identical requests (same mode and job description) are coalesced into a single pipeline execution
+    - at most `max_concurrency` pipelines run at the same time and at most `max_queue` requests wait for a slot.
+      Beyond that requests are rejected right away with a 429, and a request that waited `queue_timeout` seconds
+      without getting a slot gets a 503. Both carry a `Retry-After` header.
+
+Endpoints:
+
+    POST /automate, POST /smart_automate     {"job_description": "...", "return_report": false} -> {"code": "..."}
+    POST /stream/automate, /stream/smart_automate   NDJSON stream of the pipeline events (see `stream_smart_automate`)
+    GET  /health                             server, coalescing and cache statistics
+
+Run it from the project folder:
+
+python server.py --port 8000 --max-concurrency 8
+
+"""
+import argparse
+import asyncio
+import inspect
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool
+
+SUPPORTED_MODES = ("automate", "smart_automate")
+
+
+class AutomateRequest(BaseModel):
+    job_description: str = Field(min_length=1)
+    return_report: bool = False
+
+
+class RequestCoalescer:
+    """
+    Concurrent calls with the same key share a single execution and all receive its result (or its exception).
+    """
+    def __init__(self) -> None:
+        self.in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key, create_coroutine):
+        task = self.in_flight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(create_coroutine())
+            self.in_flight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self.__forget(key, done))
+        else:
+            self.coalesced += 1
+
+        # A caller that goes away (client disconnect) must not cancel the execution shared with the other callers
+        return await asyncio.shield(task)
+
+    def __forget(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+
+        # Mark the exception as retrieved when every caller went away before the end
+        if not task.cancelled():
+            task.exception()
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds the number of running pipelines and of requests waiting for one.
+    """
+    def __init__(self, max_concurrency=8, max_queue=32, queue_timeout=30.0) -> None:
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}.")
+
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.admitted = 0
+        self.running = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Wait for a free slot.
+
+        :raises HTTPException: 429 when the queue is full, 503 when no slot got free within `queue_timeout` seconds
+        """
+        if self.admitted >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Too many requests in flight.", headers={"Retry-After": "1"})
+
+        self.admitted += 1
+        try:
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise HTTPException(status_code=503, detail="No pipeline slot available.",
+                                    headers={"Retry-After": str(max(1, round(self.queue_timeout)))})
+
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+                self.semaphore.release()
+        finally:
+            self.admitted -= 1
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.admitted - self.running,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    Streaming response holding a limiter slot, released when the response ends however it ends: streamed to the
+    end, failed, or abandoned by a client that went away before the body started.
+    """
+    def __init__(self, content, slot, **kwargs) -> None:
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                await self.slot.__aexit__(None, None, None)
+
+
+async def run_pipeline(rag, mode, job_description):
+    """
+    Run `rag.<mode>` and return (code, report), whether `rag` is an `AsyncAutomateRAG` or a sync `AutomateRAG`
+    """
+    pipeline = getattr(rag, mode)
+
+    if inspect.iscoroutinefunction(pipeline):
+        return await pipeline(job_description, return_report=True)
+
+    return await asyncio.to_thread(pipeline, job_description, return_report=True)
+
+
+def create_app(rag=None, max_concurrency=8, max_queue=32, queue_timeout=30.0):
+    """
+    Create the FastAPI application.
+
+    :param rag: pipeline shared by all requests. An `AsyncAutomateRAG` is created at startup by default.
+    :param max_concurrency: maximum number of pipelines running at the same time
+    :param max_queue: maximum number of requests waiting for a free slot
+    :param queue_timeout: seconds a request waits for a free slot before getting a 503
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        if app.state.rag is None:
+            from async_rag import AsyncAutomateRAG
+            app.state.rag = AsyncAutomateRAG()
+
+        # Load the example corpus before the first request
+        app.state.rag.example_corpus.integrations()
+        yield
+
+    app = FastAPI(title="AutomateLLM", lifespan=lifespan)
+    app.state.rag = rag
+    app.state.coalescer = RequestCoalescer()
+    app.state.limiter = ConcurrencyLimiter(max_concurrency=max_concurrency, max_queue=max_queue, queue_timeout=queue_timeout)
+
+    async def execute(mode, request: AutomateRequest):
+        async def run():
+            async with app.state.limiter.slot():
+                return await run_pipeline(app.state.rag, mode, request.job_description)
+
+        try:
+            code, report = await app.state.coalescer.run((mode, request.job_description), run)
+        except ValueError as e:
+            # The LLM did not return a usable task breakdown
+            raise HTTPException(status_code=422, detail=str(e))
+
+        response = {"code": code}
+        if request.return_report:
+            response["report"] = report
+
+        return response
+
+    @app.post("/automate")
+    async def automate(request: AutomateRequest):
+        return await execute("automate", request)
+
+    @app.post("/smart_automate")
+    async def smart_automate(request: AutomateRequest):
+        return await execute("smart_automate", request)
+
+    @app.post("/stream/{mode}")
+    async def stream(mode: str, request: AutomateRequest):
+        if mode not in SUPPORTED_MODES:
+            raise HTTPException(status_code=404, detail=f"{mode} is not a supported mode. Please use one of {SUPPORTED_MODES}.")
+
+        # Enter the slot before the response starts, so that a full server answers with a 429/503 status
+        slot = app.state.limiter.slot()
+        await slot.__aenter__()
+
+        try:
+            events = getattr(app.state.rag, f"stream_{mode}")(request.job_description)
+        except BaseException:
+            await slot.__aexit__(None, None, None)
+            raise
+
+        if not inspect.isasyncgen(events):
+            events = iterate_in_threadpool(events)
+
+        async def ndjson():
+            try:
+                async for event in events:
+                    yield json.dumps(event) + "\n"
+            except ValueError as e:
+                yield json.dumps({"event": "error", "data": str(e)}) + "\n"
+
+        return SlotStreamingResponse(ndjson(), slot=slot, media_type="application/x-ndjson")
+
+    @app.get("/health")
+    async def health():
+        rag = app.state.rag
+        return {
+            "status": "ok" if rag is not None else "starting",
+            "limiter": app.state.limiter.stats(),
+            "coalescing": {
+                "in_flight": len(app.state.coalescer.in_flight),
+                "executions": app.state.coalescer.executions,
+                "coalesced": app.state.coalescer.coalesced,
+            },
+            "llm_cache": rag.llm_cache.stats() if rag is not None and rag.llm_cache is not None else None,
+            "semantic_cache": rag.semantic_cache.stats() if rag is not None and rag.semantic_cache is not None else None,
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the RAG pipelines over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=8, help="maximum number of pipelines running at the same time")
+    parser.add_argument("--max-queue", type=int, default=32, help="maximum number of requests waiting for a free slot")
+    parser.add_argument("--queue-timeout", type=float, default=30.0, help="seconds a request waits for a free slot")
+    parser.add_argument("--llm-cache", default=None, help="SQLite file used to cache LLM responses across runs")
+    args = parser.parse_args()
+
+    from async_rag import AsyncAutomateRAG
+    from utils.llm_cache import SQLiteLLMCache
+
+    rag = AsyncAutomateRAG(llm_cache=SQLiteLLMCache(path=args.llm_cache) if args.llm_cache else None)
+    app = create_app(rag=rag, max_concurrency=args.max_concurrency, max_queue=args.max_queue, queue_timeout=args.queue_timeout)
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,190 @@
+"""
+Per task code generation: the job skeleton and the body of every task are generated by separate LLM calls.
+
+A single code generation call writes the whole job, so its latency grows with the number of tasks and its prompt holds
+the examples of every integration. In the per task mode (`code_generation="per_task"` of the pipelines):
+
+    1. the skeleton call writes the imports, the integration clients, the trigger and the `client.defineJob` scaffolding,
+       with a `// TASK <task_sequence_id>` placeholder line per task in the body of `run`
+    2. one call per task writes the statements of that task, given only the examples of its own integrations
+
+All calls run concurrently: the tasks do not wait for the skeleton, since the skeleton declares the client of every
+integration under the name of the integration (used by the tasks as `io.<integration>`) and the task results are
+passed along as `task<task_sequence_id>Result` constants. `assemble_job_code` then replaces the placeholders by the
+fragments, in `task_sequence_id` order.
+"""
+import json
+import re
+import textwrap
+from prompt_builder import fit_examples, render_example
+from prompt_templates import (AUTOMATION_CODE_OUTPUT_GUIDELINES, SKELETON_CODE_PROMPT, TASK_CODE_PROMPT,
+                              TASK_CODE_OUTPUT_GUIDELINES)
+from utils.rag_utils import num_tokens_from_string, truncate_text_tokens
+
+TASK_PLACEHOLDER = "// TASK {task_sequence_id}"
+PLACEHOLDER_PATTERN = re.compile(r"^([ \t]*)//[ \t]*TASK[ \t]+(\d+)[ \t]*\n?", re.MULTILINE)
+# Opening line of the `run` function, where the fragments go when the skeleton lost its placeholders
+RUN_PATTERN = re.compile(r"^([ \t]*)run:[ \t]*async\b.*\{[ \t]*\n?", re.MULTILINE)
+# Markdown code fence around the output, even when the LLM adds text around it
+CODE_FENCE_PATTERN = re.compile(r"```[\w-]*[ \t]*\n(.*?)\n?[ \t]*```", re.DOTALL)
+INDENT = "  "
+
+
+def task_placeholder(task_sequence_id):
+    return TASK_PLACEHOLDER.format(task_sequence_id=task_sequence_id)
+
+
+def skeleton_examples(tasks_and_trigger, examples):
+    """
+    Examples shown to the skeleton call: every example of the trigger integrations, which the skeleton implements,
+    and the best example of the other integrations, for their imports and client declarations.
+    """
+    trigger_integrations = tasks_and_trigger["job_trigger"].get("integrations", [])
+
+    return {
+        integration: integration_examples if integration in trigger_integrations else dict(list(integration_examples.items())[:1])
+        for integration, integration_examples in examples.items()
+    }
+
+
+def task_examples(task, examples):
+    """
+    Examples of the integrations of `task` only
+    """
+    return {integration: examples[integration] for integration in task.get("integrations", []) if integration in examples}
+
+
+def render_examples(examples):
+    parts = ["\n\nHere are the examples:\n"]
+
+    for integration, integration_examples in examples.items():
+        parts.append(f"\n\nThird party API name: {integration}")
+        parts.append(f"\n\nExamples of {integration}")
+
+        for name, code in integration_examples.items():
+            parts.append(render_example(name, code))
+
+        parts.append("\n\n" + "**"*20)
+
+    return "".join(parts)
+
+
+def render_job(job_description, tasks_and_trigger):
+    return (f"\n\n**Job description**: {job_description}"
+            "\n\n**JSON string representing the job trigger details and the sequence of tasks**\n\n"
+            + json.dumps(tasks_and_trigger, indent=4))
+
+
+def render_skeleton_prompt(job_description, tasks_and_trigger, usable_integrations, examples):
+    placeholders = "\n".join(task_placeholder(task["task_sequence_id"]) for task in tasks_and_trigger["tasks"])
+
+    return "".join([
+        SKELETON_CODE_PROMPT.format(placeholders=placeholders, usable_integrations=usable_integrations),
+        render_examples(examples),
+        render_job(job_description, tasks_and_trigger),
+        AUTOMATION_CODE_OUTPUT_GUIDELINES,
+        "\n\nGenerated `trigger.dev` Typescript code skeleton:\n\n"
+    ])
+
+
+def render_task_prompt(job_description, tasks_and_trigger, task, examples):
+    task_sequence_id = task["task_sequence_id"]
+
+    return "".join([
+        TASK_CODE_PROMPT.format(task_sequence_id=task_sequence_id, task_desc=task["task_desc"],
+                                task_integrations=task.get("integrations", [])),
+        render_examples(examples),
+        render_job(job_description, tasks_and_trigger),
+        TASK_CODE_OUTPUT_GUIDELINES.format(task_sequence_id=task_sequence_id),
+        f"\n\nGenerated Typescript statements of the task {task_sequence_id}:\n\n"
+    ])
+
+
+def build_task_code_prompts(job_description, tasks_and_trigger, usable_integrations, examples, token_budget=None,
+                            count_tokens=num_tokens_from_string, truncate=truncate_text_tokens):
+    """
+    Build the skeleton prompt and the prompt of every task, each one fitted into `token_budget` tokens
+    (see `prompt_builder.fit_examples`).
+
+    :param examples: dictionary where key is the integration name and value is a dictionary of filename -> code,
+                     ordered from most to least relevant
+    :return: (`CodeGenerationPrompt` of the skeleton, dictionary of task_sequence_id -> `CodeGenerationPrompt` of the task)
+    """
+    def fit(render, selected_examples):
+        return fit_examples(render, selected_examples, token_budget=token_budget, count_tokens=count_tokens, truncate=truncate)
+
+    skeleton_prompt = fit(
+        lambda selected: render_skeleton_prompt(job_description, tasks_and_trigger, usable_integrations, selected),
+        skeleton_examples(tasks_and_trigger, examples)
+    )
+
+    task_prompts = {}
+    for task in tasks_and_trigger["tasks"]:
+        task_prompts[task["task_sequence_id"]] = fit(
+            lambda selected, task=task: render_task_prompt(job_description, tasks_and_trigger, task, selected),
+            task_examples(task, examples)
+        )
+
+    return skeleton_prompt, task_prompts
+
+
+def clean_code_output(output):
+    """
+    Generated code without the markdown code fence the LLM may wrap it in
+    """
+    output = output or ""
+    code_fence = CODE_FENCE_PATTERN.search(output)
+
+    return (code_fence.group(1) if code_fence else output).strip("\n")
+
+
+def indent_fragment(fragment, indent):
+    fragment = textwrap.dedent(clean_code_output(fragment)).strip("\n")
+
+    return "".join(f"{indent}{line}\n" if line.strip() else "\n" for line in fragment.split("\n"))
+
+
+def assemble_job_code(skeleton, fragments):
+    """
+    Insert the task fragments into the job skeleton, in `task_sequence_id` order.
+
+    Every `// TASK <task_sequence_id>` placeholder is replaced by its fragment, indented like the placeholder.
+    A fragment whose placeholder is missing goes right after the fragment of the previous task (or before the first
+    placeholder). Without any placeholder, the fragments go at the start of the `run` function, or at the end of the
+    skeleton. Placeholders without a fragment are removed.
+
+    :param skeleton: generated skeleton code
+    :param fragments: dictionary of task_sequence_id -> generated code of the task
+    """
+    skeleton = clean_code_output(skeleton)
+    if not skeleton.endswith("\n"):
+        skeleton += "\n"
+
+    ordered_ids = sorted(fragments)
+    placeholder_ids = {int(match.group(2)) for match in PLACEHOLDER_PATTERN.finditer(skeleton)}
+    present_ids = [task_id for task_id in ordered_ids if task_id in placeholder_ids]
+
+    if not present_ids:
+        run = RUN_PATTERN.search(skeleton)
+        if run is None:
+            return skeleton + "".join(indent_fragment(fragments[task_id], "") for task_id in ordered_ids)
+
+        body_indent = run.group(1) + INDENT
+        code = "".join(indent_fragment(fragments[task_id], body_indent) for task_id in ordered_ids)
+        return PLACEHOLDER_PATTERN.sub("", skeleton[:run.end()] + code + skeleton[run.end():])
+
+    # Fragments of every present placeholder, followed by the fragments of the next tasks whose placeholder is missing
+    blocks = {task_id: [] for task_id in present_ids}
+    leading, anchor = [], None
+    for task_id in ordered_ids:
+        if task_id in blocks:
+            anchor = task_id
+        (blocks[anchor] if anchor is not None else leading).append(task_id)
+    blocks[present_ids[0]] = leading + blocks[present_ids[0]]
+
+    def replace(match):
+        # Only the first placeholder of a task receives its block, the others are removed
+        block = blocks.pop(int(match.group(2)), [])
+        return "".join(indent_fragment(fragments[task_id], match.group(1)) for task_id in block)
+
+    return PLACEHOLDER_PATTERN.sub(replace, skeleton)
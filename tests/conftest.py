@@ -0,0 +1,5 @@
+import os
+
+# `rag` exports OPENAI_API_KEY at import time and the OpenAI clients refuse to start without one.
+# The offline tests never reach the API, so any placeholder key works.
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
@@ -0,0 +1,93 @@
+"""
+Offline tests for the asyncio pipeline. The OpenAI client is replaced by a fake with a fixed latency.
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from async_rag import AsyncAutomateRAG
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "schedule", "explanation": "Runs every weekday at 9am", "params": "0 9 * * 1-5", "integrations": []},
+    "tasks": [
+        {"task_sequence_id": 1, "task_desc": "Fetch open Linear issues", "integrations": ["linear"]},
+        {"task_sequence_id": 2, "task_desc": "Summarize the issues", "integrations": ["openai"]},
+        {"task_sequence_id": 3, "task_desc": "Post the summary to Slack", "integrations": ["slack"]},
+        {"task_sequence_id": 4, "task_desc": "Email the summary", "integrations": ["sendgrid"]},
+    ]
+}
+
+SELECTIONS = {
+    "linear": "daily-linear-issues-slack-alert.txt",
+    "openai": "openai-generate-random-joke.txt",
+    "slack": "github-star-to-slack.txt",
+    "sendgrid": "sendgrid-send-basic-email.txt",
+}
+
+
+class FakeAsyncCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, model, messages, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+
+        query = messages[-1]["content"]
+        if "**Predefined list of 3rd party APIs/integrations**" in query:
+            content = json.dumps(TASKS_AND_TRIGGER)
+        elif "You are given some example usecases" in query:
+            integration = query.split("third party API called ")[1].split(".")[0]
+            content = f"1. {SELECTIONS[integration]}: useful"
+        else:
+            content = "client.defineJob({});"
+
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def make_rag(latency, max_concurrency=4):
+    rag = AsyncAutomateRAG(max_concurrency=max_concurrency, prompt_token_budget=None)
+    completions = FakeAsyncCompletions(latency=latency)
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return rag, completions
+
+
+def test_selection_calls_run_concurrently():
+    rag, completions = make_rag(latency=0.2)
+
+    start = time.perf_counter()
+    examples = asyncio.run(rag.fetch_select_integrations_examples(
+                                tasks_and_trigger=TASKS_AND_TRIGGER,
+                                integrations=["linear", "openai", "slack", "sendgrid"]
+                            ))
+    elapsed = time.perf_counter() - start
+
+    assert completions.max_in_flight == 4
+    # 4 sequential calls would take 0.8s
+    assert elapsed < 0.6
+    assert {integration: list(code) for integration, code in examples.items()} == {
+        integration: [name] for integration, name in SELECTIONS.items()
+    }
+
+
+def test_concurrency_limit_is_respected():
+    rag, completions = make_rag(latency=0.05, max_concurrency=2)
+
+    asyncio.run(rag.fetch_select_integrations_examples(
+                    tasks_and_trigger=TASKS_AND_TRIGGER,
+                    integrations=["linear", "openai", "slack", "sendgrid"]
+                ))
+
+    assert completions.max_in_flight == 2
+
+
+def test_smart_automate_end_to_end():
+    rag, _ = make_rag(latency=0.0)
+
+    output = asyncio.run(rag.smart_automate("Post Linear issues to Slack every weekday at 9am."))
+
+    assert output == "client.defineJob({});"
@@ -0,0 +1,73 @@
+"""
+Offline tests for the batch runner, using a fake pipeline instead of AutomateRAG.
+"""
+import json
+import threading
+from batch import run_batch
+
+
+class FakeRAG:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def smart_automate(self, job_description):
+        with self.lock:
+            self.calls.append(job_description)
+        if job_description in self.fail_on:
+            raise RuntimeError("boom")
+        return f"code for {job_description}"
+
+
+def write_jobs(path, descriptions):
+    with open(path, 'w') as outfile:
+        for i, description in enumerate(descriptions):
+            outfile.write(json.dumps({"request_id": f"job-{i}", "body": description}) + "\n")
+
+
+def read_results(path):
+    with open(path) as infile:
+        return [json.loads(line) for line in infile]
+
+
+def test_results_are_streamed_to_output(tmp_path):
+    input_path, output_path = tmp_path / "jobs.jsonl", tmp_path / "results.jsonl"
+    write_jobs(input_path, ["a", "b", "c"])
+
+    summary = run_batch(input_path, output_path, workers=2, rag=FakeRAG(fail_on={"b"}))
+
+    assert summary == {"succeeded": 2, "failed": 1, "skipped": 0}
+    results = {record["request_id"]: record for record in read_results(output_path)}
+    assert results["job-0"]["output"] == "code for a"
+    assert "RuntimeError" in results["job-1"]["error"]
+
+
+def test_resume_skips_completed_jobs_and_retries_failed_ones(tmp_path):
+    input_path, output_path = tmp_path / "jobs.jsonl", tmp_path / "results.jsonl"
+    write_jobs(input_path, ["a", "b", "c"])
+    run_batch(input_path, output_path, workers=2, rag=FakeRAG(fail_on={"b"}))
+
+    rag = FakeRAG()
+    summary = run_batch(input_path, output_path, workers=2, rag=rag)
+
+    assert rag.calls == ["b"]
+    assert summary == {"succeeded": 1, "failed": 0, "skipped": 2}
+
+
+def test_resume_after_a_truncated_last_line(tmp_path):
+    input_path, output_path = tmp_path / "jobs.jsonl", tmp_path / "results.jsonl"
+    write_jobs(input_path, ["a", "b"])
+    with open(output_path, 'w') as outfile:
+        outfile.write(json.dumps({"request_id": "job-0", "output": "code for a"}) + "\n")
+        outfile.write(json.dumps({"output": "no id"}) + "\n")
+        outfile.write('{"request_id": "job-1", "out')
+
+    rag = FakeRAG()
+    summary = run_batch(input_path, output_path, workers=1, rag=rag)
+
+    assert rag.calls == ["b"]
+    assert summary == {"succeeded": 1, "failed": 0, "skipped": 1}
+    with open(output_path) as infile:
+        last_record = json.loads(infile.read().splitlines()[-1])
+    assert last_record["request_id"] == "job-1"
@@ -0,0 +1,47 @@
+"""
+Tests for the offline benchmark harness and its fake LLM backend.
+"""
+import json
+import schemas
+from benchmarks.bench_pipeline import create_benchmark_rag, load_jobs, percentile, run_benchmark
+from benchmarks.fake_llm import CannedResponder, LatencyModel
+from rag import AutomateRAG
+from utils.rag_utils import is_valid_json
+
+
+def test_fake_llm_is_deterministic():
+    latency = LatencyModel(distribution="lognormal", median_ms=100, sigma=0.5, seed=1)
+
+    assert latency.sample("prompt") == latency.sample("prompt")
+    assert latency.sample("prompt") != latency.sample("another prompt")
+    assert LatencyModel(distribution="constant", median_ms=100, per_token_ms=1).sample("prompt", completion_tokens=50) == 0.15
+
+
+def test_canned_breakdown_conforms_to_the_tasks_schema():
+    rag = AutomateRAG(prompt_token_budget=None)
+    prompt = rag._build_tasks_breakdown_prompt("Every Monday, post the open Linear issues to Slack")
+
+    tasks_and_trigger = json.loads(CannedResponder().respond(prompt))
+
+    assert is_valid_json(json_data=tasks_and_trigger, schema=schemas.TASKS_SCHEMA)
+    assert sorted(rag._parse_integrations(tasks_and_trigger)) == ["linear", "slack"]
+
+
+def test_run_benchmark_reports_latency_tokens_and_memory():
+    latency = LatencyModel(distribution="constant", median_ms=1)
+    jobs = load_jobs(None, num_requests=6)
+
+    for use_async in (False, True):
+        rag = create_benchmark_rag(latency, CannedResponder(), use_async=use_async, prompt_token_budget=None)
+        result = run_benchmark(rag, "smart_automate", jobs, concurrency=3, use_async=use_async)
+
+        assert result["requests"] == 6 and result["errors"] == 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"] <= result["latency_ms"]["max"]
+        assert result["llm_calls_per_request"] > 2
+        assert result["tokens_per_request"]["total"] > 0 and result["peak_memory_mb"] > 0
+
+
+def test_percentile():
+    assert percentile([4, 1, 3, 2], 50) == 2.5
+    assert percentile([1, 2, 3, 4, 5], 100) == 5
+    assert percentile([], 50) is None
@@ -0,0 +1,77 @@
+"""
+Tests for the incremental metadata generation, with a fake describer instead of GPT-4.
+"""
+import json
+import os
+import stat
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "datasets"))
+
+from create_metadata import build_metadata, write_json_atomically
+
+
+class FakeDescriber:
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, example_file_path):
+        self.paths.append(example_file_path)
+        return f"description of {os.path.basename(example_file_path)}"
+
+
+def write_example(base_dir, api_name, name, code):
+    os.makedirs(base_dir / api_name, exist_ok=True)
+    (base_dir / api_name / name).write_text(code)
+
+
+def test_examples_are_described_once_and_reused(tmp_path):
+    base_dir, metadata_path = tmp_path / "integrations", tmp_path / "metadata.json"
+    write_example(base_dir, "slack", "shared.txt", "shared code")
+    write_example(base_dir, "sendgrid", "shared.txt", "shared code")
+    write_example(base_dir, "slack", "post.txt", "post code")
+
+    describer = FakeDescriber()
+    metadata = build_metadata(base_dir=str(base_dir), metadata_path=str(metadata_path), describe=describer)
+    write_json_atomically(metadata, str(metadata_path))
+
+    # The example copied in two directories is described once
+    assert len(describer.paths) == 2
+    assert [item["api_name"] for item in metadata["integrations"]] == ["sendgrid", "slack"]
+
+    # Adding one example costs one description
+    write_example(base_dir, "gmail", "send.txt", "send code")
+    describer = FakeDescriber()
+    metadata = build_metadata(base_dir=str(base_dir), metadata_path=str(metadata_path), describe=describer)
+
+    assert describer.paths == [os.path.join(str(base_dir), "gmail", "send.txt")]
+    assert sum(len(item["examples"]) for item in metadata["integrations"]) == 4
+
+
+def test_force_describes_every_example_again(tmp_path):
+    base_dir, metadata_path = tmp_path / "integrations", tmp_path / "metadata.json"
+    write_example(base_dir, "slack", "post.txt", "post code")
+    write_json_atomically(build_metadata(base_dir=str(base_dir), metadata_path=str(metadata_path), describe=FakeDescriber()), str(metadata_path))
+
+    describer = FakeDescriber()
+    build_metadata(base_dir=str(base_dir), metadata_path=str(metadata_path), describe=describer, force=True)
+
+    assert len(describer.paths) == 1
+    assert json.loads(metadata_path.read_text())["integrations"][0]["examples"][0]["content_hash"]
+
+
+def test_metadata_file_keeps_its_permissions(tmp_path):
+    metadata_path = tmp_path / "metadata.json"
+
+    write_json_atomically({"integrations": []}, str(metadata_path))
+    assert stat.S_IMODE(os.stat(metadata_path).st_mode) == 0o644
+
+    os.chmod(metadata_path, 0o664)
+    write_json_atomically({"integrations": []}, str(metadata_path))
+    assert stat.S_IMODE(os.stat(metadata_path).st_mode) == 0o664
+
+
+def test_llm_client_is_created_on_first_use():
+    import create_metadata
+
+    assert create_metadata._llm_client is None
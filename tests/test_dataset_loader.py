@@ -0,0 +1,84 @@
+"""
+Tests for the streaming loader of the crawled documentation datasets.
+"""
+import io
+import json
+import threading
+import pytest
+from utils import dataset_loader
+from utils.dataset_loader import DOCUMENTATION_FIELDS, convert_to_jsonl, iter_json_array, iter_records, prefetch, project_record
+
+DATASET = "datasets/dataset_trigger-dev-examples_2024-03-16_13-56-52-250.json"
+
+
+def test_json_array_is_parsed_incrementally():
+    records = [{"url": f"https://trigger.dev/{i}", "markdown": "x" * (i * 37), "nested": {"list": [1, 2.5, None, "]"]}} for i in range(50)]
+    text = " [\n" + ",\n".join(json.dumps(record) for record in records) + "\n] "
+
+    # Records are larger than the reads, and split across them
+    assert list(iter_json_array(io.StringIO(text), read_size=16)) == records
+    assert list(iter_json_array(io.StringIO("[]"))) == []
+    # Numbers and literals ending at the end of the buffer are not cut
+    assert list(iter_json_array(io.StringIO('[12345, 678, 1.5e10, true, null]'), read_size=3)) == [12345, 678, 1.5e10, True, None]
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"url": "a"}')))
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"url": "a"}, ')))
+
+
+def test_crawl_dump_records_are_projected(monkeypatch):
+    # Without ijson, the fallback parser must give the same records as json.load
+    monkeypatch.setattr(dataset_loader, "ijson", None)
+
+    with open(DATASET) as infile:
+        expected = [project_record(record, DOCUMENTATION_FIELDS) for record in json.load(infile)]
+
+    records = list(iter_records(DATASET, fields=DOCUMENTATION_FIELDS, read_size=4096))
+
+    assert records == expected
+    assert set(records[0]) == {"url", "markdown", "metadata", "crawl"}
+    assert set(records[0]["crawl"]) == {"referrerUrl"}
+    assert project_record({"url": "a", "metadata": "not a dict"}, ["url", "metadata.title"]) == {"url": "a"}
+
+
+def test_jsonl_conversion(tmp_path):
+    jsonl_path = str(tmp_path / "dataset.jsonl")
+
+    num_records = convert_to_jsonl(DATASET, jsonl_path)
+
+    assert num_records == len(list(iter_records(DATASET)))
+    assert list(iter_records(jsonl_path)) == list(iter_records(DATASET, fields=DOCUMENTATION_FIELDS))
+
+
+def test_prefetch_propagates_errors_and_stops_with_the_consumer():
+    def failing():
+        yield 1
+        raise RuntimeError("parse error")
+
+    iterator = prefetch(failing())
+    assert next(iterator) == 1
+    with pytest.raises(RuntimeError, match="parse error"):
+        next(iterator)
+
+    produced = []
+    done = threading.Event()
+
+    def endless():
+        try:
+            i = 0
+            while True:
+                produced.append(i)
+                yield i
+                i += 1
+        finally:
+            done.set()
+
+    iterator = prefetch(endless(), max_pending=2)
+    assert [next(iterator) for _ in range(3)] == [0, 1, 2]
+    iterator.close()
+
+    assert done.wait(timeout=2)
+    # The producer never runs more than `max_pending` items ahead
+    assert len(produced) <= 3 + 2 + 1
@@ -0,0 +1,103 @@
+"""
+Tests for the pluggable embedders, and for the retrieval components running on the local embedder without network.
+"""
+import json
+import numpy as np
+import pytest
+import embedders
+import embeddings
+from embedders import HashingEmbedder, OpenAIEmbedder, create_embedder, get_local_embedder
+from embeddings import DocumentationEmbedding
+from example_index import ExampleIndex
+from rag import AutomateRAG
+from tests.test_example_index import METADATA
+
+
+def test_hashing_embedder_vectors():
+    embedder = HashingEmbedder(dimension=256)
+    texts = ["Post a message to a Slack channel", "post  a MESSAGE to a slack channel", "Send an email with Gmail", ""]
+
+    vectors = embedder.embed(texts)
+
+    assert vectors.shape == (4, 256) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0) and not vectors[3].any()
+    # Case and whitespace do not matter, and a batch gives the same vectors as single texts
+    assert np.allclose(vectors[0], vectors[1])
+    assert np.allclose(vectors, np.vstack([embedder.embed([text]) for text in texts]))
+    assert np.allclose(embedder.embed(texts, batch_size=3), vectors)
+
+    query = embedder.embed_query("send a slack message")
+    assert query @ vectors[0] > query @ vectors[2]
+
+
+def test_idf_weights_are_fitted_saved_and_loaded(tmp_path):
+    embedder = HashingEmbedder(dimension=128)
+    unfitted_name = embedder.name
+
+    embedder.fit(["slack message", "slack channel", "gmail email"], batch_size=2)
+    assert embedder.idf.shape == (128,) and embedder.name != unfitted_name
+
+    path = str(tmp_path / "embedder.npz")
+    embedder.save(path, signature="corpus")
+    loaded, signature = HashingEmbedder.load(path)
+
+    assert signature == "corpus" and loaded.name == embedder.name
+    assert np.allclose(loaded.embed(["slack"]), embedder.embed(["slack"]))
+
+
+def test_local_embedder_is_fitted_once(tmp_path, monkeypatch):
+    fits = []
+    fit = HashingEmbedder.fit
+    monkeypatch.setattr(HashingEmbedder, "fit", lambda self, texts, **kwargs: fits.append(1) or fit(self, texts, **kwargs))
+    monkeypatch.setattr(embedders, "_local_embedders", {})
+    path = str(tmp_path / "local_embedder.npz")
+
+    embedder = get_local_embedder(path=path, dimension=64)
+    assert get_local_embedder(path=path, dimension=64) is embedder
+
+    # A new process loads the fitted weights instead of fitting them again
+    monkeypatch.setattr(embedders, "_local_embedders", {})
+    assert get_local_embedder(path=path, dimension=64).name == embedder.name
+    assert len(fits) == 1
+
+
+def test_example_index_runs_offline_on_the_local_embedder(tmp_path):
+    index = ExampleIndex(METADATA, index_path=str(tmp_path / "index.npz"), embedder=HashingEmbedder(dimension=512))
+
+    ranked = index.top_k("slack", ["post a message to the slack channel"], k=1)
+
+    assert [name for name, score in ranked] == ["post-message.txt"]
+
+
+def test_documentation_is_embedded_offline(tmp_path, monkeypatch):
+    # One chunk per page, so that the test does not need the tokenizer files
+    monkeypatch.setattr(embeddings, "chunk_text_tokens_batch", lambda texts, max_tokens, **kwargs: [[text] for text in texts])
+    records = [{"url": f"https://trigger.dev/docs/page-{i}", "markdown": f"page {i} " * 10,
+                "metadata": {"title": f"Page {i}"}, "crawl": {"referrerUrl": "https://trigger.dev/docs"}} for i in range(3)]
+    (tmp_path / "dataset.json").write_text(json.dumps(records))
+
+    pipeline = DocumentationEmbedding(
+                    collection_name="docs",
+                    json_dataset_file_path=str(tmp_path / "dataset.json"),
+                    vectordb_location=":memory:",
+                    checkpoint_path=str(tmp_path / "checkpoint.json"),
+                    embedder=HashingEmbedder(dimension=64)
+                )
+
+    assert pipeline.vector_size == 64
+    assert pipeline.create_and_save_embeddings_in_qdrant()["pages"] == 3
+
+
+def test_embedder_selection():
+    assert isinstance(create_embedder("openai", embed_llm="text-embedding-3-large"), OpenAIEmbedder)
+    assert create_embedder("openai", embed_llm="text-embedding-3-large").dimension == 3072
+
+    local_embedder = HashingEmbedder(dimension=32)
+    assert AutomateRAG(embedder=local_embedder).embedder is local_embedder
+    assert AutomateRAG().embedder.name == "text-embedding-ada-002"
+
+    with pytest.raises(ValueError):
+        AutomateRAG(embedder="word2vec")
+
+    with pytest.raises(ValueError):
+        DocumentationEmbedding(collection_name="docs", json_dataset_file_path="dataset.json", embed_llm="custom-model")
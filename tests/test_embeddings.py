@@ -0,0 +1,167 @@
+"""
+Tests for the documentation ingestion pipeline, against Qdrant's in-memory mode and a fake embeddings endpoint.
+"""
+import json
+from types import SimpleNamespace
+import pytest
+import embeddings
+from embedders import HashingEmbedder
+from embeddings import DocumentationEmbedding, DocumentationQuery
+
+VECTOR_SIZE = 8
+
+
+class FakeEmbeddings:
+    def __init__(self, fail_after=None):
+        self.requests = []
+        self.fail_after = fail_after
+
+    def create(self, input, model):
+        if self.fail_after is not None and len(self.requests) >= self.fail_after:
+            raise ConnectionError("connection lost")
+        self.requests.append(list(input))
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[float(len(text) % 7 + 1)] * VECTOR_SIZE) for i, text in enumerate(input)
+        ])
+
+
+@pytest.fixture(autouse=True)
+def word_chunker(monkeypatch):
+    # Chunk by words instead of tiktoken tokens, so that the tests do not need the tokenizer files
+    batch_sizes = []
+
+    def chunk_words(texts, max_tokens, **kwargs):
+        batch_sizes.append(len(texts))
+        return [[" ".join(text.split()[i:i + max_tokens]) for i in range(0, len(text.split()), max_tokens)] for text in texts]
+
+    monkeypatch.setattr(embeddings, "chunk_text_tokens_batch", chunk_words)
+    return batch_sizes
+
+
+def write_dataset(path, num_pages, words_per_page=10):
+    records = [
+        {
+            "url": f"https://trigger.dev/docs/page-{i}",
+            "crawl": {"referrerUrl": "https://trigger.dev/docs"},
+            "metadata": {"title": f"Page {i}", "description": f"Description {i}"},
+            "markdown": " ".join(f"word{i}-{j}" for j in range(words_per_page)),
+        }
+        for i in range(num_pages)
+    ]
+    path.write_text(json.dumps(records))
+
+
+def make_pipeline(tmp_path, embeddings_endpoint, **kwargs):
+    return DocumentationEmbedding(
+                collection_name="docs",
+                json_dataset_file_path=str(tmp_path / "dataset.json"),
+                vector_size=VECTOR_SIZE,
+                vectordb_location=":memory:",
+                embedding_client=SimpleNamespace(embeddings=embeddings_endpoint),
+                checkpoint_path=str(tmp_path / "checkpoint.json"),
+                **kwargs
+            )
+
+
+def test_pages_are_chunked_embedded_in_batches_and_upserted(tmp_path, word_chunker):
+    write_dataset(tmp_path / "dataset.json", num_pages=5)
+    endpoint = FakeEmbeddings()
+    pipeline = make_pipeline(tmp_path, endpoint, chunk_size=4, embedding_batch_size=6, upsert_batch_size=6, chunk_batch_size=2)
+
+    summary = pipeline.create_and_save_embeddings_in_qdrant()
+
+    # 10 words per page and 4 words per chunk give 3 chunks per page
+    assert summary == {"pages": 5, "skipped_pages": 0, "chunks": 15}
+    assert word_chunker == [2, 2, 1]
+    assert all(len(batch) <= 6 for batch in endpoint.requests)
+    assert pipeline.vectordb_client.count("docs").count == 15
+
+    points, _ = pipeline.vectordb_client.scroll("docs", limit=1, with_payload=True)
+    assert set(points[0].payload) >= {"title", "url", "referrerUrl", "text"}
+
+
+def test_interrupted_ingestion_resumes_from_checkpoint(tmp_path):
+    write_dataset(tmp_path / "dataset.json", num_pages=6)
+    pipeline = make_pipeline(tmp_path, FakeEmbeddings(fail_after=2), chunk_size=5, upsert_batch_size=4)
+
+    with pytest.raises(ConnectionError):
+        pipeline.create_and_save_embeddings_in_qdrant()
+
+    endpoint = FakeEmbeddings()
+    pipeline.embedder.client = SimpleNamespace(embeddings=endpoint)
+    summary = pipeline.create_and_save_embeddings_in_qdrant()
+
+    assert summary == {"pages": 2, "skipped_pages": 4, "chunks": 4}
+    assert pipeline.vectordb_client.count("docs").count == 12
+
+
+def test_incremental_update_only_embeds_changed_pages(tmp_path):
+    write_dataset(tmp_path / "dataset.json", num_pages=4)
+    pipeline = make_pipeline(tmp_path, FakeEmbeddings(), chunk_size=4)
+    pipeline.update_embeddings_in_qdrant()
+
+    # New dump: page 0 changed and shrank to one chunk, page 3 disappeared, page 4 is new
+    records = json.loads((tmp_path / "dataset.json").read_text())
+    records[0] = dict(records[0], markdown="a rewritten page")
+    records[3] = dict(records[3], url="https://trigger.dev/docs/page-4", metadata={"title": "Page 4", "canonicalUrl": "https://trigger.dev/docs/page-4/"})
+    (tmp_path / "dataset.json").write_text(json.dumps(records))
+
+    endpoint = FakeEmbeddings()
+    pipeline.embedder.client = SimpleNamespace(embeddings=endpoint)
+    summary = pipeline.update_embeddings_in_qdrant()
+
+    assert summary == {"new_pages": 1, "changed_pages": 1, "unchanged_pages": 2, "deleted_pages": 1, "upserted_chunks": 4, "deleted_chunks": 5}
+    assert sum(len(batch) for batch in endpoint.requests) == 4
+    assert pipeline.vectordb_client.count("docs").count == 1 + 3 + 3 + 3
+
+    assert pipeline.update_embeddings_in_qdrant()["unchanged_pages"] == 4
+
+
+def test_job_documentation_is_retrieved_in_one_batch(tmp_path):
+    records = [
+        {
+            "url": f"https://trigger.dev/docs/{topic}",
+            "markdown": f"How to {topic} with trigger.dev",
+            "metadata": {"title": topic},
+            "crawl": {"referrerUrl": referrer_url}
+        }
+        for topic, referrer_url in [("post a slack message", "https://trigger.dev/docs/slack"),
+                                    ("react to a slack message", "https://trigger.dev/docs/slack"),
+                                    ("send an email with gmail", "https://trigger.dev/docs/gmail"),
+                                    ("schedule a job every day", "https://trigger.dev/docs/triggers")]
+    ]
+    (tmp_path / "dataset.json").write_text(json.dumps(records))
+
+    embedder = HashingEmbedder(dimension=256)
+    batches = []
+    embed = embedder.embed
+    embedder.embed = lambda texts: batches.append(list(texts)) or embed(texts)
+
+    pipeline = DocumentationEmbedding(collection_name="docs", json_dataset_file_path=str(tmp_path / "dataset.json"),
+                                      vectordb_location=":memory:", checkpoint_path=str(tmp_path / "checkpoint.json"),
+                                      embedder=embedder, chunk_size=100)
+    pipeline.create_and_save_embeddings_in_qdrant()
+
+    searches = []
+    query_batch_points = pipeline.vectordb_client.query_batch_points
+    pipeline.vectordb_client.query_batch_points = lambda **kwargs: searches.append(kwargs) or query_batch_points(**kwargs)
+    batches.clear()
+
+    tasks_and_trigger = {
+        "job_trigger": {"type": "schedule", "explanation": "Every day", "params": "schedule a job every day", "integrations": []},
+        "tasks": [{"task_sequence_id": 1, "task_desc": "Post a slack message", "integrations": ["slack"]},
+                  {"task_sequence_id": 2, "task_desc": "React to the slack message", "integrations": ["slack"]}]
+    }
+    hits = pipeline.retrieve_job_documentation(tasks_and_trigger, top_k=1)
+
+    assert len(batches) == 1 and len(batches[0]) == 3 and len(searches) == 1
+    assert {key: [hit["title"] for hit in key_hits] for key, key_hits in hits.items()} == {
+        "job_trigger": ["schedule a job every day"], 1: ["post a slack message"], 2: ["react to a slack message"]
+    }
+
+    # Both queries match the same best chunk, which is only returned once
+    hits = pipeline.search_batch([DocumentationQuery("post a slack message", top_k=2), DocumentationQuery("post slack message", top_k=2)])
+    assert len({hit["id"] for query_hits in hits for hit in query_hits}) == 4 and all(len(query_hits) == 2 for query_hits in hits)
+
+    hits = pipeline.search_batch([DocumentationQuery("post a slack message", top_k=5, referrer_url="https://trigger.dev/docs/gmail")])
+    assert [hit["title"] for hit in hits[0]] == ["send an email with gmail"]
@@ -0,0 +1,53 @@
+"""
+Tests for the in-memory example corpus.
+"""
+import os
+import pytest
+from utils.example_corpus import ExampleCorpus, get_example_corpus
+from utils.rag_utils import load_examples
+
+
+def test_corpus_matches_load_examples():
+    corpus = ExampleCorpus(base_dir="integrations")
+
+    for integration in corpus.integrations():
+        assert corpus.get_examples(integration) == load_examples(dataset_path=f"integrations/{integration}")
+
+
+def test_selected_examples_follow_the_selection_order():
+    corpus = ExampleCorpus(base_dir="integrations")
+
+    selected = corpus.get_examples("slack", select_examples=["github-star-to-slack.txt", "missing.txt", "github-issue-reminder.txt"])
+
+    assert list(selected) == ["github-star-to-slack.txt", "github-issue-reminder.txt"]
+
+
+def test_shared_examples_are_stored_once():
+    corpus = ExampleCorpus(base_dir="integrations")
+
+    name = "slack-sendgrid-send-activity-summary.txt"
+    assert corpus.get_examples("slack")[name] is corpus.get_examples("sendgrid")[name]
+
+
+def test_corpus_is_loaded_once_and_reloaded_on_changes(tmp_path):
+    os.makedirs(tmp_path / "slack")
+    example = tmp_path / "slack" / "post.txt"
+    example.write_text("v1")
+    corpus = ExampleCorpus(base_dir=str(tmp_path), refresh_interval=0.0)
+
+    assert corpus.get_examples("slack") == {"post.txt": "v1"}
+    corpus.get_examples("slack")
+    assert corpus.num_loads == 1
+
+    example.write_text("v2")
+    os.utime(example, ns=(0, 10**18))
+
+    assert corpus.get_examples("slack") == {"post.txt": "v2"}
+    assert corpus.num_loads == 2
+
+    with pytest.raises(FileNotFoundError):
+        corpus.get_examples("gmail")
+
+
+def test_corpus_is_shared_by_the_process():
+    assert get_example_corpus("integrations") is get_example_corpus("./integrations")
@@ -0,0 +1,89 @@
+"""
+Tests for the embedding based example retrieval, with a bag-of-words fake of the embeddings endpoint.
+"""
+import re
+import zlib
+from types import SimpleNamespace
+from example_index import ExampleIndex
+
+METADATA = {
+    "integrations": [
+        {
+            "api_name": "slack",
+            "examples": [
+                {"name": "post-message.txt", "description": "Post a message to a slack channel"},
+                {"name": "github-star.txt", "description": "Notify when a github repository gets a star"},
+                {"name": "meeting-alert.txt", "description": "Alert about booked meetings"},
+            ]
+        },
+        {
+            "api_name": "gmail",
+            "examples": [
+                {"name": "send-email.txt", "description": "Send an email message with gmail"},
+            ]
+        }
+    ]
+}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.requests = 0
+
+    def create(self, input, model):
+        self.requests += 1
+        data = []
+        for i, text in enumerate(input):
+            vector = [0.0] * 64
+            for word in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(word.encode()) % 64] += 1.0
+            data.append(SimpleNamespace(index=i, embedding=vector))
+        return SimpleNamespace(data=data)
+
+
+def make_index(tmp_path):
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+    index = ExampleIndex(METADATA, embedding_client=client, index_path=str(tmp_path / "index.npz"))
+    return index, client.embeddings
+
+
+def test_top_k_ranks_examples_of_the_integration(tmp_path):
+    index, _ = make_index(tmp_path)
+
+    ranked = index.top_k("slack", ["post a message about the new github star"], k=2)
+
+    assert [name for name, score in ranked] == ["github-star.txt", "post-message.txt"]
+    assert index.top_k("airtable", ["anything"]) == []
+
+
+def test_index_is_persisted_and_reused(tmp_path):
+    index, embeddings = make_index(tmp_path)
+    index.load_or_build()
+    assert embeddings.requests == 1
+
+    reloaded, reloaded_embeddings = make_index(tmp_path)
+    reloaded.load_or_build()
+
+    assert reloaded_embeddings.requests == 0
+    assert (reloaded.vectors == index.vectors).all()
+
+
+def test_all_tasks_are_embedded_in_one_request(tmp_path):
+    index, embeddings = make_index(tmp_path)
+    index.load_or_build()
+
+    index.top_k("slack", ["post a message", "alert about meetings", "star a repository"], k=1)
+
+    assert embeddings.requests == 2
+
+
+def test_rag_selects_examples_without_llm_calls(tmp_path):
+    from rag import AutomateRAG
+
+    rag = AutomateRAG(example_selector="embedding")
+    rag._example_index, _ = make_index(tmp_path)
+    rag.main_llm_client = None
+
+    selected = rag.select_relevant_examples("slack", ["post a message to the channel"], max_examples=1)
+
+    assert selected == ["post-message.txt"]
@@ -0,0 +1,118 @@
+"""
+Tests for the integration catalog and the resolution of the integration names of the task breakdown.
+"""
+import json
+from types import SimpleNamespace
+from integration_catalog import (IntegrationCatalog, build_integration_catalog, compute_source_signature, get_integration_catalog,
+                                 load_snapshot, save_snapshot)
+from rag import AutomateRAG
+
+METADATA = {
+    "integrations": [
+        {"api_name": "slack", "examples": [{"name": "post-to-slack.txt", "description": "Post a message", "content_hash": "a"}]},
+        {"api_name": "caldotdom", "examples": [{"name": "new-booking.txt", "description": "New booking", "content_hash": "b"}]},
+        {"api_name": "sendgrid", "examples": []},
+    ]
+}
+
+
+def test_names_are_resolved_with_normalization_aliases_and_closest_match(tmp_path):
+    catalog = IntegrationCatalog(integrations_metadata=METADATA, base_dir=str(tmp_path))
+
+    assert catalog.resolve("slack") == "slack"
+    assert catalog.resolve("Slack ") == "slack"
+    assert catalog.resolve("caldotcom") == "caldotdom"
+    assert catalog.resolve("Cal.com") == "caldotdom"
+    assert catalog.resolve("sendgrd") == "sendgrid"
+    assert catalog.resolve("stripe") is None
+
+    assert catalog.resolve_all(["Slack", "slack", "stripe", "caldotcom"]) == ["slack", "caldotdom"]
+    assert "slack" in catalog and "Slack" not in catalog
+
+
+def test_selection_examples_are_precomputed(tmp_path):
+    (tmp_path / "gmail").mkdir()
+    catalog = IntegrationCatalog(integrations_metadata=METADATA, base_dir=str(tmp_path))
+
+    assert catalog.selection_examples_of("caldotcom") == [{"name": "new-booking.txt", "description": "New booking"}]
+    # Integrations with examples on disk but no metadata are known too
+    assert catalog.resolve("GMail") == "gmail"
+    assert catalog.selection_examples_of("gmail") == []
+    assert catalog.selection_examples_of("stripe") == []
+
+
+def test_catalog_is_shared_by_the_pipelines():
+    assert get_integration_catalog() is get_integration_catalog()
+    assert AutomateRAG().integration_catalog is AutomateRAG().integration_catalog
+
+
+def test_llm_integration_names_are_resolved_before_selecting_examples():
+    tasks_and_trigger = {
+        "job_trigger": {"type": "event", "explanation": "A booking is created", "params": "booking.created", "integrations": ["caldotcom"]},
+        "tasks": [
+            {"task_sequence_id": 1, "task_desc": "Post the booking to Slack", "integrations": ["Slack", "Stripe"]},
+            {"task_sequence_id": 2, "task_desc": "Send a confirmation email", "integrations": ["sendgrd"]},
+        ]
+    }
+    prompts = []
+
+    def create(model, messages, **kwargs):
+        query = messages[-1]["content"]
+        prompts.append(query)
+        if "**Predefined list of 3rd party APIs/integrations**" in query:
+            content = json.dumps(tasks_and_trigger)
+        elif "You are given some example usecases" in query:
+            content = "1. cal-slack-meeting-alert.txt"
+        else:
+            content = "client.defineJob({});"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    rag = AutomateRAG(prompt_token_budget=None)
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    resolved = rag.break_job_into_tasks("When a Cal.com booking is created, post it to Slack and email a confirmation.")
+    assert resolved["job_trigger"]["integrations"] == ["caldotdom"]
+    assert [task["integrations"] for task in resolved["tasks"]] == [["slack"], ["sendgrid"]]
+
+    assert rag.smart_automate("When a Cal.com booking is created, post it to Slack and email a confirmation.") == "client.defineJob({});"
+    assert any("third party API called caldotdom" in prompt for prompt in prompts)
+
+
+def test_snapshot_is_reused_until_the_sources_change(tmp_path):
+    metadata_path, base_dir, snapshot_path = tmp_path / "metadata.json", tmp_path / "integrations", tmp_path / "catalog.pickle"
+    metadata_path.write_text(json.dumps(METADATA))
+    (base_dir / "slack").mkdir(parents=True)
+
+    signature = compute_source_signature(str(metadata_path), str(base_dir))
+    save_snapshot(build_integration_catalog(str(metadata_path), str(base_dir)), str(snapshot_path), signature)
+
+    catalog = load_snapshot(str(snapshot_path), signature)
+    assert catalog.resolve("caldotcom") == "caldotdom"
+    assert catalog.resolve("sendgrd") == "sendgrid"
+
+    (base_dir / "gmail").mkdir()
+    assert load_snapshot(str(snapshot_path), compute_source_signature(str(metadata_path), str(base_dir))) is None
+
+
+def test_snapshot_is_written_on_first_load(tmp_path):
+    metadata_path, base_dir, snapshot_path = tmp_path / "metadata.json", tmp_path / "integrations", tmp_path / "cache" / "catalog.pickle"
+    metadata_path.write_text(json.dumps(METADATA))
+    base_dir.mkdir()
+
+    catalog = get_integration_catalog(metadata_path=str(metadata_path), base_dir=str(base_dir), snapshot_path=str(snapshot_path))
+
+    assert snapshot_path.exists()
+    assert load_snapshot(str(snapshot_path), compute_source_signature(str(metadata_path), str(base_dir))).names == catalog.names
+
+
+def test_catalog_is_built_when_the_snapshot_cannot_be_written(tmp_path):
+    metadata_path, base_dir = tmp_path / "metadata.json", tmp_path / "integrations"
+    metadata_path.write_text(json.dumps(METADATA))
+    base_dir.mkdir()
+    # The snapshot folder cannot be created, as on a read-only filesystem
+    (tmp_path / "read-only").write_text("")
+
+    catalog = get_integration_catalog(metadata_path=str(metadata_path), base_dir=str(base_dir),
+                                      snapshot_path=str(tmp_path / "read-only" / "catalog.pickle"))
+
+    assert catalog.names == build_integration_catalog(str(metadata_path), str(base_dir)).names
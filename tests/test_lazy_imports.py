@@ -0,0 +1,27 @@
+"""
+Tests that importing and constructing the pipelines does not load the heavy dependencies.
+"""
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["openai", "httpx", "jsonschema", "dotenv", "tiktoken", "numpy", "qdrant_client", "prompt_templates"]
+
+
+def loaded_modules(code):
+    script = f"import json, sys\n{code}\nprint(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return set(json.loads(result.stdout.strip().splitlines()[-1]))
+
+
+def test_pipelines_load_heavy_dependencies_on_first_use():
+    modules = loaded_modules("import rag, async_rag, embeddings\nrag.AutomateRAG()\nasync_rag.AsyncAutomateRAG()")
+
+    assert not modules & set(HEAVY_MODULES)
+    assert "integration_catalog" in modules
+
+
+def test_first_client_loads_the_openai_sdk():
+    modules = loaded_modules("import rag\nrag.AutomateRAG().main_llm_client")
+
+    assert {"openai", "httpx", "dotenv"} <= modules
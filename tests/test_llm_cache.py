@@ -0,0 +1,94 @@
+"""
+Tests for the persistent LLM response cache.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from rag import AutomateRAG
+from utils.llm_cache import SQLiteLLMCache, make_cache_key
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer {self.calls}"))])
+
+
+def test_key_depends_on_model_system_message_and_prompt():
+    key = make_cache_key(model="gpt-4", system_message="system", prompt="prompt")
+
+    assert key == make_cache_key(model="gpt-4", system_message="system", prompt="prompt")
+    assert key != make_cache_key(model="gpt-3.5-turbo", system_message="system", prompt="prompt")
+    assert key != make_cache_key(model="gpt-4", system_message="other", prompt="prompt")
+    assert key != make_cache_key(model="gpt-4", system_message="system", prompt="other")
+
+
+def test_hits_misses_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SQLiteLLMCache(path=path)
+
+    assert cache.get("key") is None
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    assert SQLiteLLMCache(path=path).get("key") == "value"
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"), ttl_seconds=0.01)
+    cache.set("key", "value")
+    time.sleep(0.05)
+
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_counters_are_consistent_across_threads(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"))
+    cache.set("hit", "value")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(cache.get, ["hit", "miss"] * 200))
+
+    assert cache.stats()["hits"] == 200 and cache.stats()["misses"] == 200
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", "1")
+    time.sleep(0.01)
+    cache.set("b", "2")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_size_limit_evicts_entries(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite"), max_size_bytes=10)
+    cache.set("a", "x" * 6)
+    time.sleep(0.01)
+    cache.set("b", "y" * 6)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "y" * 6
+
+
+def test_rag_answers_repeated_prompts_from_cache(tmp_path):
+    rag = AutomateRAG(llm_cache=SQLiteLLMCache(path=str(tmp_path / "cache.sqlite")))
+    completions = FakeCompletions()
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    first = rag._AutomateRAG__invoke_llm_api(llm_name=rag.main_llm, query="Break down this job")
+    second = rag._AutomateRAG__invoke_llm_api(llm_name=rag.main_llm, query="Break down this job")
+
+    assert first == second == "answer 1"
+    assert completions.calls == 1
@@ -0,0 +1,174 @@
+"""
+Tests for the shared LLM client layer: rate limiting, retries with backoff and provider selection.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+from llm_clients import (AsyncLLMClient, LLMClient, TokenBucket, create_llm_client, get_http_client, get_rate_limiter,
+                         retry_after_seconds, set_rate_limits)
+from tracing import start_trace, trace_llm_call
+
+
+def rate_limit_error(headers):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def completion(content="ok"):
+    return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+            )
+
+
+class FlakyCompletions:
+    """Fails with the given errors before answering"""
+    def __init__(self, errors) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return completion()
+
+
+def test_retry_after_header_is_honored():
+    assert retry_after_seconds(rate_limit_error({"retry-after": "3"}), attempt=0) == 3.0
+    assert retry_after_seconds(rate_limit_error({"retry-after-ms": "250"}), attempt=0) == 0.25
+    assert retry_after_seconds(rate_limit_error({"retry-after": "600"}), attempt=0, max_delay=60) == 60
+
+    delay = retry_after_seconds(rate_limit_error({}), attempt=2, base_delay=1.0)
+    assert 2.0 <= delay <= 4.0
+
+
+def test_transient_errors_are_retried_and_counted_in_the_trace():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    completions = FlakyCompletions([rate_limit_error({"retry-after": "0"}), openai.APIConnectionError(request=request)])
+    client = LLMClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), base_delay=0.001)
+
+    with start_trace("test") as trace:
+        with trace_llm_call(model="gpt-4") as llm_call:
+            response = client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "hi"}])
+
+    assert response.choices[0].message.content == "ok"
+    assert completions.calls == 3
+    assert trace.report()["totals"]["retries"] == 2
+
+
+def test_error_is_raised_when_retries_are_exhausted():
+    completions = FlakyCompletions([rate_limit_error({"retry-after": "0"})] * 3)
+    client = LLMClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), max_retries=2)
+
+    with pytest.raises(openai.RateLimitError):
+        client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "hi"}])
+
+    assert completions.calls == 3
+
+
+def test_token_bucket_spaces_out_requests():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_requests_wait_for_the_model_rate_limits():
+    completions = FlakyCompletions([])
+    client = LLMClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    set_rate_limits("rate-limited-model", requests_per_minute=1200)
+    # Start from an empty bucket: one request every 50 ms
+    get_rate_limiter("rate-limited-model").requests.tokens = 0
+
+    try:
+        start = time.perf_counter()
+        for _ in range(4):
+            client.chat.completions.create(model="rate-limited-model", messages=[{"role": "user", "content": "hi"}])
+        elapsed = time.perf_counter() - start
+    finally:
+        set_rate_limits("rate-limited-model")
+
+    assert 0.19 <= elapsed < 1.0
+    assert get_rate_limiter("rate-limited-model") is None
+
+
+def test_async_client_retries():
+    class AsyncFlakyCompletions(FlakyCompletions):
+        async def create(self, **kwargs):
+            return super().create(**kwargs)
+
+    completions = AsyncFlakyCompletions([rate_limit_error({"retry-after": "0"})])
+    client = AsyncLLMClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+    response = asyncio.run(client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "hi"}]))
+
+    assert response.choices[0].message.content == "ok" and completions.calls == 2
+
+
+def test_providers_share_one_http_client(monkeypatch):
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", "http://localhost:11434/v1")
+
+    openai_client = create_llm_client(provider="openai")
+    local_client = create_llm_client(provider="local")
+
+    assert str(local_client.client.base_url).startswith("http://localhost:11434/v1")
+    assert openai_client.client.max_retries == 0
+    assert openai_client.client._client is local_client.client._client is get_http_client()
+    assert create_llm_client(provider="openai").client is openai_client.client
+
+    with pytest.raises(ValueError):
+        create_llm_client(provider="anthropic")
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """Answers every request with a chat completion, over keep-alive connections"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({
+            "id": "completion", "object": "chat.completion", "created": 0, "model": "local-model",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_async_client_is_reused_across_event_loops():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # No retries, so that a connection left over from a closed loop would fail the request
+    client = create_llm_client(provider="local", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                               asynchronous=True, max_retries=0)
+
+    async def complete_twice():
+        responses = [await client.chat.completions.create(model="local-model", messages=[{"role": "user", "content": "hi"}])
+                     for _ in range(2)]
+        return [response.choices[0].message.content for response in responses], client.client._client
+
+    try:
+        first_contents, first_http_client = asyncio.run(complete_twice())
+        second_contents, second_http_client = asyncio.run(complete_twice())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert first_contents == second_contents == ["ok", "ok"]
+    assert first_http_client is not second_http_client
@@ -0,0 +1,69 @@
+"""
+Tests for the token budgeted code generation prompt. Tokens are approximated by words.
+"""
+from prompt_builder import build_code_generation_prompt, rank_examples
+
+TASKS_AND_TRIGGER = {"job_trigger": {"type": "event", "explanation": "", "params": "", "integrations": []}, "tasks": []}
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def truncate_words(text, max_tokens):
+    return " ".join(text.split()[:max_tokens])
+
+
+def build(examples, token_budget):
+    return build_code_generation_prompt(
+                job_description="Post new GitHub stars to Slack",
+                tasks_and_trigger=TASKS_AND_TRIGGER,
+                usable_integrations=list(examples),
+                examples=examples,
+                token_budget=token_budget,
+                count_tokens=count_words,
+                truncate=truncate_words,
+                min_example_tokens=5
+            )
+
+
+def code(num_words, word="x"):
+    return " ".join([word] * num_words)
+
+
+def test_examples_are_ranked_round_robin_across_integrations():
+    examples = {"slack": {"s1": "", "s2": "", "s3": ""}, "github": {"g1": ""}}
+
+    assert [name for integration, name, code in rank_examples(examples)] == ["s1", "g1", "s2", "s3"]
+
+
+def test_everything_is_included_without_budget():
+    result = build({"slack": {"s1": code(50)}}, token_budget=None)
+
+    assert result.included == ["slack/s1"] and result.num_tokens is None
+
+
+def test_lowest_ranked_examples_are_truncated_then_dropped():
+    examples = {"slack": {"s1": code(100), "s2": code(100, "y")}, "github": {"g1": code(100, "z")}}
+    base_tokens = build({"slack": {}, "github": {}}, token_budget=10**6).num_tokens
+    # Each example costs 3 words of header ('Example:', name, 'Code:') plus its code
+
+    result = build(examples, token_budget=base_tokens + 103 + 103 + 3 + 30)
+
+    assert result.included == ["slack/s1", "github/g1", "slack/s2"]
+    assert result.truncated == ["slack/s2"]
+    assert result.num_tokens <= result.token_budget
+    assert code(30, "y") in result.prompt and code(31, "y") not in result.prompt
+
+    result = build(examples, token_budget=base_tokens + 103 + 103 + 3 + 2)
+
+    assert result.included == ["slack/s1", "github/g1"]
+    assert result.dropped == ["slack/s2"]
+
+
+def test_prompt_never_exceeds_the_budget():
+    examples = {"slack": {f"s{i}": code(40) for i in range(10)}}
+
+    for token_budget in (300, 450, 700):
+        result = build(examples, token_budget=token_budget)
+        assert result.num_tokens <= token_budget
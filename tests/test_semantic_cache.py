@@ -0,0 +1,114 @@
+"""
+Tests for the semantic cache of task breakdowns, with a fake embedding client.
+"""
+import json
+from types import SimpleNamespace
+from rag import AutomateRAG
+from semantic_cache import SemanticCache
+
+VECTORS = {
+    "Post Linear issues to Slack every weekday at 9am": [1.0, 0.0, 0.0],
+    "Every weekday at 9 AM, send the Linear issues to Slack": [0.99, 0.1, 0.0],
+    "Send a welcome email to new Airtable leads": [0.0, 1.0, 0.0],
+    "Summarize new GitHub issues with OpenAI": [0.0, 0.0, 1.0],
+}
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "schedule", "explanation": "Every weekday at 9am", "params": "0 9 * * 1-5", "integrations": []},
+    "tasks": [{"task_sequence_id": 1, "task_desc": "Post the Linear issues to Slack", "integrations": ["linear", "slack"]}]
+}
+
+
+class FakeEmbeddings:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def create(self, input, model):
+        self.calls += 1
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=VECTORS[text]) for i, text in enumerate(input)])
+
+
+def create_cache(**kwargs):
+    embeddings = FakeEmbeddings()
+    return SemanticCache(embedding_client=SimpleNamespace(embeddings=embeddings), **kwargs), embeddings
+
+
+def test_paraphrases_reuse_the_cached_breakdown():
+    cache, embeddings = create_cache(threshold=0.95)
+
+    assert cache.get("Post Linear issues to Slack every weekday at 9am") is None
+    cache.set("Post Linear issues to Slack every weekday at 9am", TASKS_AND_TRIGGER)
+
+    cached = cache.get("Every weekday at 9 AM, send the Linear issues to Slack")
+    assert cached == TASKS_AND_TRIGGER
+    cached["tasks"].clear()
+    assert cache.get("Every weekday at 9 AM, send the Linear issues to Slack") == TASKS_AND_TRIGGER
+
+    assert cache.get("Send a welcome email to new Airtable leads") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 1)
+    assert 0.95 <= stats["mean_hit_similarity"] < 1.0
+
+    # The embedding of the first lookup is reused when storing its breakdown
+    assert embeddings.calls == 3
+
+
+def test_identical_descriptions_skip_the_embedding():
+    cache, embeddings = create_cache()
+    cache.set("Post Linear issues to Slack every weekday at 9am", TASKS_AND_TRIGGER)
+    calls = embeddings.calls
+
+    assert cache.get("Post Linear issues to Slack every weekday at 9am") == TASKS_AND_TRIGGER
+    assert embeddings.calls == calls and cache.stats()["exact_hits"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, embeddings = create_cache(max_entries=2)
+    cache.set("Post Linear issues to Slack every weekday at 9am", TASKS_AND_TRIGGER)
+    cache.set("Send a welcome email to new Airtable leads", {"tasks": []})
+
+    assert cache.get("Post Linear issues to Slack every weekday at 9am") is not None
+    cache.set("Summarize new GitHub issues with OpenAI", {"tasks": []})
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("Send a welcome email to new Airtable leads") is None
+    assert cache.get("Post Linear issues to Slack every weekday at 9am") is not None
+    assert cache.get("Summarize new GitHub issues with OpenAI") is not None
+
+
+def test_pipeline_skips_the_breakdown_call_on_a_semantic_hit():
+    cache, embeddings = create_cache(threshold=0.95)
+    rag = AutomateRAG(semantic_cache=cache, prompt_token_budget=None)
+
+    prompts = []
+    def create(model, messages, **kwargs):
+        prompts.append(messages[-1]["content"])
+        content = json.dumps(TASKS_AND_TRIGGER) if "**Predefined list of 3rd party APIs/integrations**" in prompts[-1] else "client.defineJob({});"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    rag.automate("Post Linear issues to Slack every weekday at 9am")
+    rag.automate("Every weekday at 9 AM, send the Linear issues to Slack")
+
+    breakdown_calls = [prompt for prompt in prompts if "**Predefined list of 3rd party APIs/integrations**" in prompt]
+    assert len(breakdown_calls) == 1 and len(prompts) == 3
+
+
+def test_embedding_failures_are_cache_misses():
+    class FailingEmbeddings:
+        def create(self, input, model):
+            raise ConnectionError("embeddings endpoint unavailable")
+
+    cache = SemanticCache(embedding_client=SimpleNamespace(embeddings=FailingEmbeddings()))
+    rag = AutomateRAG(semantic_cache=cache, prompt_token_budget=None)
+
+    def create(model, messages, **kwargs):
+        content = json.dumps(TASKS_AND_TRIGGER) if "**Predefined list of 3rd party APIs/integrations**" in messages[-1]["content"] else "client.defineJob({});"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    assert rag.break_job_into_tasks("Post Linear issues to Slack every weekday at 9am") == TASKS_AND_TRIGGER
+    assert cache.stats()["misses"] == 1 and cache.stats()["entries"] == 0 and cache.stats()["embedding_errors"] == 2
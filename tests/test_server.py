@@ -0,0 +1,154 @@
+"""
+Tests for the HTTP server, with the pipeline answered by the fake LLM of the benchmarks.
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from async_rag import AsyncAutomateRAG
+from benchmarks.fake_llm import CannedResponder, FakeAsyncOpenAI, LatencyModel
+from llm_clients import AsyncLLMClient
+from server import ConcurrencyLimiter, RequestCoalescer, create_app
+
+JOB_DESCRIPTION = "Every day at 9 AM, post the open Linear issues to Slack."
+
+
+def create_fake_rag(latency_ms=0.0):
+    rag = AsyncAutomateRAG(prompt_token_budget=None)
+    fake = FakeAsyncOpenAI(latency=LatencyModel(distribution="constant", median_ms=latency_ms), responder=CannedResponder(code_tokens=20))
+    rag.main_llm_client = AsyncLLMClient(fake)
+
+    return rag, fake
+
+
+def test_automate_endpoints_return_the_generated_code():
+    rag, fake = create_fake_rag()
+
+    with TestClient(create_app(rag=rag)) as client:
+        response = client.post("/smart_automate", json={"job_description": JOB_DESCRIPTION, "return_report": True})
+        assert response.status_code == 200
+        assert "defineJob" in response.json()["code"]
+        assert response.json()["report"]["totals"]["llm_calls"] == 4
+
+        response = client.post("/automate", json={"job_description": JOB_DESCRIPTION})
+        assert response.status_code == 200
+        assert set(response.json()) == {"code"}
+
+        assert client.post("/automate", json={"job_description": ""}).status_code == 422
+        assert client.get("/health").json()["coalescing"]["executions"] == 2
+
+
+def test_stream_endpoint_returns_ndjson_events():
+    rag, fake = create_fake_rag()
+
+    with TestClient(create_app(rag=rag)) as client:
+        response = client.post("/stream/smart_automate", json={"job_description": JOB_DESCRIPTION})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[0]["event"] == "tasks_and_trigger"
+        assert "defineJob" in "".join(event["data"] for event in events if event["event"] == "code")
+
+        assert client.post("/stream/unknown", json={"job_description": JOB_DESCRIPTION}).status_code == 404
+        assert client.get("/health").json()["limiter"]["running"] == 0
+
+
+def test_identical_concurrent_requests_are_coalesced():
+    rag, fake = create_fake_rag(latency_ms=50.0)
+    app = create_app(rag=rag)
+
+    async def send_requests():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(
+                *[client.post("/smart_automate", json={"job_description": JOB_DESCRIPTION}) for _ in range(5)],
+                client.post("/smart_automate", json={"job_description": JOB_DESCRIPTION + " Also on weekends."})
+            )
+
+    responses = asyncio.run(send_requests())
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(set(response.json()["code"] for response in responses[:5])) == 1
+    # One pipeline per distinct job description: breakdown, example selection for linear and slack, code generation
+    assert fake.num_calls == 8
+    assert app.state.coalescer.executions == 2
+    assert app.state.coalescer.coalesced == 4
+    assert app.state.coalescer.in_flight == {}
+
+
+def test_full_server_rejects_requests():
+    rag, fake = create_fake_rag(latency_ms=100.0)
+    app = create_app(rag=rag, max_concurrency=1, max_queue=1, queue_timeout=10.0)
+
+    async def send_requests():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(*[client.post("/automate", json={"job_description": f"{JOB_DESCRIPTION} #{i}"}) for i in range(3)])
+
+    responses = asyncio.run(send_requests())
+
+    assert sorted(response.status_code for response in responses) == [200, 200, 429]
+    rejected = next(response for response in responses if response.status_code == 429)
+    assert rejected.headers["retry-after"] == "1"
+    assert app.state.limiter.stats()["rejected"] == 1
+
+
+def test_limiter_times_out_when_no_slot_gets_free():
+    limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+
+    async def hold_and_wait():
+        async with limiter.slot():
+            async with limiter.slot():
+                pass
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(hold_and_wait())
+
+    assert e.value.status_code == 503
+    assert limiter.stats() == {"max_concurrency": 1, "max_queue": 1, "running": 0, "waiting": 0, "rejected": 0, "timed_out": 1}
+
+
+def test_coalesced_callers_share_the_exception():
+    coalescer = RequestCoalescer()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("invalid breakdown")
+
+    async def run_both():
+        return await asyncio.gather(coalescer.run("key", fail), coalescer.run("key", fail), return_exceptions=True)
+
+    errors = asyncio.run(run_both())
+
+    assert [str(error) for error in errors] == ["invalid breakdown", "invalid breakdown"]
+    assert coalescer.executions == 1 and coalescer.in_flight == {}
+
+
+def test_stream_slot_is_released_when_the_client_goes_away():
+    rag, fake = create_fake_rag()
+    app = create_app(rag=rag, max_concurrency=1)
+    body = json.dumps({"job_description": JOB_DESCRIPTION}).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/stream/smart_automate", "raw_path": b"/stream/smart_automate", "query_string": b"",
+             "root_path": "", "headers": [(b"content-type", b"application/json")], "server": ("test", 80), "client": ("test", 1234)}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        # The client disconnected before the response started
+        if message["type"] == "http.response.start":
+            raise OSError("connection reset")
+
+    async def disconnect():
+        try:
+            await app(scope, receive, send)
+        except Exception:
+            pass
+
+        return app.state.limiter.stats()
+
+    stats = asyncio.run(disconnect())
+
+    assert stats["running"] == 0 and stats["waiting"] == 0
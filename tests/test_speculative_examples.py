@@ -0,0 +1,119 @@
+"""
+Tests for the speculative example selection of the async pipeline, started while the task breakdown is running.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from async_rag import AsyncAutomateRAG
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "schedule", "explanation": "Every Monday at 9am", "params": "0 9 * * 1", "integrations": []},
+    "tasks": [
+        {"task_sequence_id": 1, "task_desc": "Fetch the open Linear issues", "integrations": ["linear"]},
+        {"task_sequence_id": 2, "task_desc": "Post a summary to Slack", "integrations": ["slack"]},
+    ]
+}
+# Names Slack and Gmail, but not Linear
+JOB_DESCRIPTION = "Every Monday at 9am, post a summary of the open issues to Slack, or email it via Gmail."
+
+
+class SlowBreakdownCompletions:
+    """The breakdown takes a while, selections are recorded along with whether the breakdown was done."""
+    def __init__(self) -> None:
+        self.breakdown_done = False
+        self.selections = []
+        self.cancelled = []
+        self.running_selections = 0
+        self.max_running_selections = 0
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        query = messages[-1]["content"]
+
+        if "**Predefined list of 3rd party APIs/integrations**" in query:
+            await asyncio.sleep(0.05)
+            self.breakdown_done = True
+            content = json.dumps(TASKS_AND_TRIGGER)
+        elif "You are given some example usecases" in query:
+            integration = query.split("third party API called ")[1].split(".")[0]
+            self.selections.append((integration, self.breakdown_done))
+            self.running_selections += 1
+            self.max_running_selections = max(self.max_running_selections, self.running_selections)
+            try:
+                await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                self.cancelled.append(integration)
+                raise
+            finally:
+                self.running_selections -= 1
+            content = {"slack": "1. github-issue-reminder.txt", "linear": "1. daily-linear-issues-slack-alert.txt",
+                       "gmail": "1. send-email-with-gmail.txt"}[integration]
+        else:
+            content = "client.defineJob({});"
+            if stream:
+                return self.stream(content)
+
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def stream(self, content):
+        for word in content.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+
+
+def create_rag(speculative_examples, max_concurrency=4):
+    rag = AsyncAutomateRAG(prompt_token_budget=None, speculative_examples=speculative_examples, max_concurrency=max_concurrency)
+    completions = SlowBreakdownCompletions()
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    return rag, completions
+
+
+def test_named_integrations_are_selected_while_the_breakdown_runs():
+    rag, completions = create_rag(speculative_examples=True)
+
+    code, report = asyncio.run(rag.smart_automate(JOB_DESCRIPTION, return_report=True))
+
+    assert code == "client.defineJob({});"
+    # Slack and Gmail started before the breakdown finished, Linear (not named) after it
+    assert sorted(completions.selections) == [("gmail", False), ("linear", True), ("slack", False)]
+    # Gmail was mispredicted: its selection was cancelled and discarded
+    assert completions.cancelled == ["gmail"]
+    assert report["attributes"]["speculation"] == {"predicted": ["slack", "gmail"], "hits": ["slack"], "mispredicted": ["gmail"], "missed": ["linear"]}
+
+    # The cancelled call is reported too, with the time it ran
+    speculative_calls = [call for call in report["llm_calls"] if call["stage"] == "speculative_select_examples"]
+    assert len(speculative_calls) == 2
+    # One stage per speculative selection, each with its own call
+    speculative_stages = [stage for stage in report["stages"] if stage["name"] == "speculative_select_examples"]
+    assert [stage["llm_calls"] for stage in speculative_stages] == [1, 1]
+    assert sum(stage["llm_calls"] for stage in report["stages"]) == report["totals"]["llm_calls"]
+
+
+def test_speculation_is_off_by_default():
+    rag, completions = create_rag(speculative_examples=False)
+
+    asyncio.run(rag.smart_automate(JOB_DESCRIPTION))
+
+    assert sorted(completions.selections) == [("linear", True), ("slack", True)]
+
+
+def test_streamed_pipeline_uses_the_speculative_selections():
+    rag, completions = create_rag(speculative_examples=True)
+
+    async def collect():
+        return [event async for event in rag.stream_smart_automate(JOB_DESCRIPTION)]
+
+    events = asyncio.run(collect())
+
+    examples = next(event["data"] for event in events if event["event"] == "examples")
+    assert examples == {"linear": ["daily-linear-issues-slack-alert.txt"], "slack": ["github-issue-reminder.txt"]}
+    assert ("slack", False) in completions.selections
+
+
+def test_speculative_and_regular_selections_share_the_concurrency_limit():
+    rag, completions = create_rag(speculative_examples=True, max_concurrency=1)
+
+    code = asyncio.run(rag.smart_automate(JOB_DESCRIPTION))
+
+    assert code == "client.defineJob({});"
+    assert completions.max_running_selections == 1
+    assert ("linear", True) in completions.selections and ("slack", False) in completions.selections
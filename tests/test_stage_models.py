@@ -0,0 +1,91 @@
+"""
+Tests for the per stage model configuration and the fallback to the main model.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from async_rag import AsyncAutomateRAG
+from rag import AutomateRAG
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "schedule", "explanation": "Every day at 9am", "params": "0 9 * * *", "integrations": []},
+    "tasks": [{"task_sequence_id": 1, "task_desc": "Post a message to Slack", "integrations": ["slack"]}]
+}
+
+
+class RoutingCompletions:
+    """Answers every prompt and records the model it was sent to. `answers` overrides the answers of a model."""
+    def __init__(self, answers=None) -> None:
+        self.answers = answers or {}
+        self.calls = []
+
+    def respond(self, model, messages):
+        query = messages[-1]["content"]
+        if "**Validation errors**" in query:
+            stage, content = "repair_tasks", json.dumps(TASKS_AND_TRIGGER)
+        elif "**Predefined list of 3rd party APIs/integrations**" in query:
+            stage, content = "break_job_into_tasks", json.dumps(TASKS_AND_TRIGGER)
+        elif "You are given some example usecases" in query:
+            stage, content = "select_examples", "1. daily-linear-issues-slack-alert.txt"
+        else:
+            stage, content = "generate_code", "client.defineJob({});"
+
+        self.calls.append((stage, model))
+        content = self.answers.get((stage, model), content)
+
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def create(self, model, messages, **kwargs):
+        return self.respond(model, messages)
+
+
+class AsyncRoutingCompletions(RoutingCompletions):
+    async def create(self, model, messages, **kwargs):
+        return self.respond(model, messages)
+
+
+STAGE_MODELS = {"break_job_into_tasks": "small", "select_examples": "small"}
+
+
+def test_cheap_stages_run_on_the_small_model():
+    rag = AutomateRAG(main_llm="large", stage_models=STAGE_MODELS, prompt_token_budget=None)
+    completions = RoutingCompletions()
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    assert rag.smart_automate("Post a message to Slack every day at 9am") == "client.defineJob({});"
+    assert completions.calls == [("break_job_into_tasks", "small"), ("select_examples", "small"), ("generate_code", "large")]
+
+
+def test_invalid_outputs_of_the_small_model_fall_back_to_the_main_model():
+    rag = AutomateRAG(main_llm="large", stage_models=STAGE_MODELS, prompt_token_budget=None)
+    completions = RoutingCompletions(answers={
+        ("break_job_into_tasks", "small"): json.dumps({"tasks": "not a list"}),
+        ("repair_tasks", "small"): "I cannot fix it.",
+        ("select_examples", "small"): "None of the examples is relevant.",
+    })
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    rag.smart_automate("Post a message to Slack every day at 9am")
+
+    assert completions.calls == [
+        ("break_job_into_tasks", "small"), ("repair_tasks", "small"), ("break_job_into_tasks", "large"),
+        ("select_examples", "small"), ("select_examples", "large"),
+        ("generate_code", "large"),
+    ]
+
+
+def test_async_pipeline_falls_back_on_unparsable_output():
+    rag = AsyncAutomateRAG(main_llm="large", stage_models=STAGE_MODELS, prompt_token_budget=None)
+    completions = AsyncRoutingCompletions(answers={("break_job_into_tasks", "small"): "Sure! Here are the tasks:"})
+    rag.max_repair_attempts = 0
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    asyncio.run(rag.smart_automate("Post a message to Slack every day at 9am"))
+
+    assert completions.calls[:3] == [("break_job_into_tasks", "small"), ("break_job_into_tasks", "large"), ("select_examples", "small")]
+
+
+def test_unknown_stage_is_rejected():
+    with pytest.raises(ValueError):
+        AutomateRAG(stage_models={"summarize": "small"})
@@ -0,0 +1,115 @@
+"""
+Tests for the streaming pipelines, with fake OpenAI clients that stream the generated code word by word.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from async_rag import AsyncAutomateRAG
+from rag import AutomateRAG
+from utils.llm_cache import SQLiteLLMCache
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "event", "explanation": "A new member joins the Slack workspace", "params": "member_joined", "integrations": ["slack"]},
+    "tasks": [{"task_sequence_id": 1, "task_desc": "Send an onboarding email", "integrations": ["gmail"]}]
+}
+CODE = "client.defineJob({ id: 'onboarding' });"
+
+
+def answer(messages):
+    query = messages[-1]["content"]
+    if "**Predefined list of 3rd party APIs/integrations**" in query:
+        return json.dumps(TASKS_AND_TRIGGER)
+    if "You are given some example usecases" in query:
+        return "1. send-email-with-gmail.txt\n2. github-star-to-slack.txt"
+    return CODE
+
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def stream_chunks(content):
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))]) for word in content.split(" ")]
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.streamed_calls = 0
+
+    def create(self, model, messages, stream=False, **kwargs):
+        if stream:
+            self.streamed_calls += 1
+            return iter(stream_chunks(answer(messages)))
+        return completion(answer(messages))
+
+
+class FakeAsyncCompletions:
+    async def create(self, model, messages, stream=False, **kwargs):
+        if not stream:
+            return completion(answer(messages))
+
+        async def chunks():
+            for chunk in stream_chunks(answer(messages)):
+                yield chunk
+        return chunks()
+
+
+def fake_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_stream_smart_automate_yields_events_in_pipeline_order():
+    rag = AutomateRAG(prompt_token_budget=None)
+    rag.main_llm_client = fake_client(FakeCompletions())
+
+    events = list(rag.stream_smart_automate("Send onboarding emails when new members join a Slack workspace"))
+
+    names = [event["event"] for event in events]
+    assert names[:3] == ["tasks_and_trigger", "integrations", "examples"]
+    assert set(names[3:-1]) == {"code"} and len(names[3:-1]) == len(CODE.split(" "))
+    assert events[-1] == {"event": "done", "data": "".join(CODE.split(" "))}
+    assert events[2]["data"] == {"slack": ["github-star-to-slack.txt"], "gmail": ["send-email-with-gmail.txt"]}
+
+
+def test_streamed_code_is_cached(tmp_path):
+    rag = AutomateRAG(prompt_token_budget=None, llm_cache=SQLiteLLMCache(path=str(tmp_path / "cache.sqlite")))
+    completions = FakeCompletions()
+    rag.main_llm_client = fake_client(completions)
+
+    first = list(rag.stream_automate("Send onboarding emails"))
+    second = list(rag.stream_automate("Send onboarding emails"))
+
+    assert completions.streamed_calls == 1
+    assert first[-1] == second[-1]
+
+
+def test_empty_stream_is_not_cached(tmp_path):
+    class EmptyFirstStream(FakeCompletions):
+        def create(self, model, messages, stream=False, **kwargs):
+            if stream and self.streamed_calls == 0:
+                self.streamed_calls += 1
+                return iter([])
+            return super().create(model, messages, stream=stream, **kwargs)
+
+    rag = AutomateRAG(prompt_token_budget=None, llm_cache=SQLiteLLMCache(path=str(tmp_path / "cache.sqlite")))
+    completions = EmptyFirstStream()
+    rag.main_llm_client = fake_client(completions)
+
+    assert list(rag.stream_automate("Send onboarding emails"))[-1]["data"] == ""
+    second = list(rag.stream_automate("Send onboarding emails"))
+
+    assert completions.streamed_calls == 2
+    assert second[-1]["data"] != ""
+
+
+def test_async_stream_smart_automate():
+    rag = AsyncAutomateRAG(prompt_token_budget=None)
+    rag.main_llm_client = fake_client(FakeAsyncCompletions())
+
+    async def collect():
+        return [event async for event in rag.stream_smart_automate("Send onboarding emails when new members join a Slack workspace")]
+
+    events = asyncio.run(collect())
+
+    assert events[0] == {"event": "tasks_and_trigger", "data": TASKS_AND_TRIGGER}
+    assert events[-1]["data"] == "".join(CODE.split(" "))
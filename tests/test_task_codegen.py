@@ -0,0 +1,143 @@
+"""
+Tests for the per task code generation: prompts with the examples of the task integrations only, and the assembly
+of the fragments into the job skeleton.
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from async_rag import AsyncAutomateRAG
+from rag import AutomateRAG
+from task_codegen import assemble_job_code, build_task_code_prompts
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "webhook", "explanation": "New GitHub star", "params": "", "integrations": ["github"]},
+    "tasks": [
+        {"task_sequence_id": 1, "task_desc": "Fetch the open Linear issues", "integrations": ["linear"]},
+        {"task_sequence_id": 2, "task_desc": "Post a summary to Slack", "integrations": ["slack"]},
+    ]
+}
+EXAMPLES = {
+    "github": {"github-star.txt": "github star code", "github-issue.txt": "github issue code"},
+    "linear": {"linear-issues.txt": "linear code", "linear-comment.txt": "linear comment code"},
+    "slack": {"slack-post.txt": "slack code", "slack-react.txt": "slack react code"},
+}
+
+SKELETON = """```typescript
+client.defineJob({
+  id: "job",
+  run: async (payload, io, ctx) => {
+    // TASK 1
+    // TASK 2
+  },
+});
+```"""
+
+
+def test_every_task_prompt_has_the_examples_of_its_integrations_only():
+    skeleton_prompt, task_prompts = build_task_code_prompts("Summarize Linear issues to Slack", TASKS_AND_TRIGGER,
+                                                            ["github", "linear", "slack"], EXAMPLES)
+
+    assert list(task_prompts) == [1, 2]
+    assert task_prompts[1].included == ["linear/linear-issues.txt", "linear/linear-comment.txt"]
+    assert "slack code" not in task_prompts[1].prompt and "task1Result" in task_prompts[1].prompt
+    assert task_prompts[2].included == ["slack/slack-post.txt", "slack/slack-react.txt"]
+
+    # Every example of the trigger integration, only the best one of the others
+    assert skeleton_prompt.included == ["github/github-star.txt", "linear/linear-issues.txt", "slack/slack-post.txt",
+                                        "github/github-issue.txt"]
+    assert "// TASK 1\n// TASK 2" in skeleton_prompt.prompt
+
+
+def test_fragments_are_assembled_in_task_order():
+    fragments = {2: "```ts\nawait io.slack.postMessage(task1Result);\n```", 1: "const task1Result = await io.linear.issues();"}
+
+    code = assemble_job_code(SKELETON, fragments)
+
+    assert code == ("client.defineJob({\n"
+                    "  id: \"job\",\n"
+                    "  run: async (payload, io, ctx) => {\n"
+                    "    const task1Result = await io.linear.issues();\n"
+                    "    await io.slack.postMessage(task1Result);\n"
+                    "  },\n"
+                    "});\n")
+
+
+def test_fragments_without_placeholder_keep_the_task_order():
+    fragments = {1: "one();", 2: "two();", 3: "three();"}
+
+    # Missing placeholder of task 2: after the fragment of task 1. Placeholder of an unknown task: removed.
+    skeleton = "run: async (payload, io) => {\n  // TASK 1\n  // TASK 3\n  // TASK 9\n}\n"
+    assert assemble_job_code(skeleton, fragments) == "run: async (payload, io) => {\n  one();\n  two();\n  three();\n}\n"
+
+    # No placeholder at all: at the start of the run function
+    skeleton = "client.defineJob({\n  run: async (payload, io) => {\n  },\n});"
+    assert assemble_job_code(skeleton, fragments) == "client.defineJob({\n  run: async (payload, io) => {\n    one();\n    two();\n    three();\n  },\n});\n"
+
+    # Not even a run function: at the end
+    assert assemble_job_code("const a = 1;", {2: "two();", 1: "one();"}) == "const a = 1;\none();\ntwo();\n"
+
+
+class TaskCodeCompletions:
+    """Answers the skeleton and task prompts, keeping track of the number of concurrent calls."""
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def answer(self, query):
+        if "Typescript code skeleton" in query:
+            return SKELETON
+        task_sequence_id = query.rsplit("statements of the task ", 1)[1].split(":")[0]
+        return f"const task{task_sequence_id}Result = {task_sequence_id};"
+
+    def track(self, delta):
+        with self.lock:
+            self.running += delta
+            self.max_running = max(self.max_running, self.running)
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.track(1)
+        time.sleep(0.05)
+        self.track(-1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer(messages[-1]["content"])))])
+
+
+class AsyncTaskCodeCompletions(TaskCodeCompletions):
+    async def create(self, model, messages, stream=False, **kwargs):
+        self.track(1)
+        await asyncio.sleep(0.05)
+        self.track(-1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer(messages[-1]["content"])))])
+
+
+EXPECTED_CODE = ("client.defineJob({\n  id: \"job\",\n  run: async (payload, io, ctx) => {\n"
+                 "    const task1Result = 1;\n    const task2Result = 2;\n  },\n});\n")
+
+
+def test_sync_pipeline_generates_the_tasks_concurrently():
+    rag = AutomateRAG(prompt_token_budget=None, code_generation="per_task")
+    completions = TaskCodeCompletions()
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    code = rag.generate_code("Summarize Linear issues to Slack", TASKS_AND_TRIGGER, ["github", "linear", "slack"], EXAMPLES)
+
+    assert code == EXPECTED_CODE
+    assert completions.max_running == 3
+
+
+def test_async_pipeline_generates_the_tasks_concurrently():
+    rag = AsyncAutomateRAG(prompt_token_budget=None, code_generation="per_task", max_concurrency=2)
+    completions = AsyncTaskCodeCompletions()
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    code = asyncio.run(rag.generate_code("Summarize Linear issues to Slack", TASKS_AND_TRIGGER, ["github", "linear", "slack"], EXAMPLES))
+
+    assert code == EXPECTED_CODE
+    assert completions.max_running == 2
+
+
+def test_unknown_code_generation_mode():
+    with pytest.raises(ValueError):
+        AutomateRAG(code_generation="per_line")
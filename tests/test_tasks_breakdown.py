@@ -0,0 +1,87 @@
+"""
+Tests for the structured output task breakdown: JSON mode, parsing, schema validation and repair.
+"""
+import json
+from types import SimpleNamespace
+import pytest
+import schemas
+from rag import AutomateRAG
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "webhook", "explanation": "New Stripe payment", "params": "", "integrations": []},
+    "tasks": [{"task_sequence_id": 1, "task_desc": "Send a thank you email", "integrations": ["sendgrid"]}]
+}
+
+
+class ScriptedCompletions:
+    """Returns the scripted outputs in order and records the requests"""
+    def __init__(self, outputs) -> None:
+        self.outputs = list(outputs)
+        self.requests = []
+
+    def create(self, model, messages, **kwargs):
+        self.requests.append(dict(kwargs, prompt=messages[-1]["content"]))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.outputs.pop(0)))])
+
+
+def create_rag(outputs):
+    rag = AutomateRAG(prompt_token_budget=None)
+    completions = ScriptedCompletions(outputs)
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return rag, completions
+
+
+@pytest.mark.parametrize("output", [
+    json.dumps(TASKS_AND_TRIGGER),
+    "```json\n" + json.dumps(TASKS_AND_TRIGGER, indent=4) + "\n```",
+    "```\n" + json.dumps(TASKS_AND_TRIGGER) + "```",
+    "Here is the breakdown:\n" + json.dumps(TASKS_AND_TRIGGER) + "\nLet me know if you need anything else.",
+])
+def test_breakdown_is_parsed_from_fenced_or_wrapped_json(output):
+    rag, completions = create_rag([output])
+
+    assert rag.break_job_into_tasks("Thank customers for their payment") == TASKS_AND_TRIGGER
+    assert completions.requests[0]["response_format"] == {"type": "json_object"}
+
+
+def test_invalid_breakdown_is_repaired_with_its_validation_errors():
+    invalid = dict(TASKS_AND_TRIGGER, tasks=[{"task_sequence_id": 0, "task_desc": "Send a thank you email", "integrations": ["sendgrid"]}])
+    rag, completions = create_rag([json.dumps(invalid), json.dumps(TASKS_AND_TRIGGER)])
+
+    assert rag.break_job_into_tasks("Thank customers for their payment") == TASKS_AND_TRIGGER
+
+    repair_prompt = completions.requests[1]["prompt"]
+    assert "tasks/0/task_sequence_id: 0 is less than the minimum of 1" in repair_prompt
+    assert json.dumps(invalid) in repair_prompt
+
+
+def test_pipeline_raises_when_no_valid_breakdown_is_obtained():
+    rag, completions = create_rag(["Sorry, I can't help with that.", "{\"tasks\": []}"])
+
+    with pytest.raises(ValueError, match="does not conform to the tasks schema"):
+        rag.automate("Thank customers for their payment")
+
+    assert len(completions.requests) == 2
+
+
+def test_json_mode_can_be_disabled():
+    rag, completions = create_rag([json.dumps(TASKS_AND_TRIGGER)])
+    rag.json_mode = False
+
+    rag.break_job_into_tasks("Thank customers for their payment")
+
+    assert "response_format" not in completions.requests[0]
+
+
+def test_validation_errors_are_empty_for_a_valid_breakdown():
+    assert schemas.tasks_validation_errors(TASKS_AND_TRIGGER) == []
+    assert schemas.tasks_validation_errors({"tasks": []}) == ["<root>: 'job_trigger' is a required property"]
+
+
+def test_duplicate_task_ids_are_repaired():
+    duplicated = dict(TASKS_AND_TRIGGER, tasks=TASKS_AND_TRIGGER["tasks"] * 2)
+    rag, completions = create_rag([json.dumps(duplicated), json.dumps(TASKS_AND_TRIGGER)])
+
+    assert schemas.tasks_validation_errors(duplicated) == ["tasks/1/task_sequence_id: 1 is not unique"]
+    assert rag.break_job_into_tasks("Thank customers for their payment") == TASKS_AND_TRIGGER
+    assert "tasks/1/task_sequence_id: 1 is not unique" in completions.requests[1]["prompt"]
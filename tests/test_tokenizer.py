@@ -0,0 +1,56 @@
+"""
+Tests for the shared tokenizer, with a small byte level tiktoken encoding so that no encoding file is downloaded.
+"""
+import pytest
+import tiktoken
+from utils import rag_utils, tokenizer as tokenizer_module
+from utils.tokenizer import Tokenizer, get_tokenizer
+
+# Every byte is a token, and 'ab' is merged into one
+RANKS = {**{bytes([i]): i for i in range(256)}, b"ab": 256}
+BYTE_ENCODING = tiktoken.Encoding("bytes", pat_str=r"\s+|\S+", mergeable_ranks=RANKS, special_tokens={"<|endoftext|>": 257})
+
+
+@pytest.fixture
+def tokenizer():
+    return Tokenizer(encoding=BYTE_ENCODING, num_threads=4)
+
+
+def test_count_and_truncate(tokenizer):
+    assert tokenizer.count("abab c") == 4
+    assert tokenizer.truncate("abab c", 3) == "abab "
+    assert tokenizer.truncate("abc", 10) == "abc"
+    # Special tokens are plain text
+    assert tokenizer.count("<|endoftext|>") == len("<|endoftext|>")
+
+
+def test_chunks_overlap(tokenizer):
+    assert tokenizer.chunk("0123456789", max_tokens=4) == ["0123", "4567", "89"]
+    assert tokenizer.chunk("0123456789", max_tokens=4, overlap=2) == ["0123", "2345", "4567", "6789"]
+    assert tokenizer.chunk("", max_tokens=4) == []
+
+    with pytest.raises(ValueError):
+        tokenizer.chunk("0123456789", max_tokens=4, overlap=4)
+
+
+def test_batches_match_the_single_text_methods(tokenizer, monkeypatch):
+    texts = [f"ab {i} " * (i + 1) for i in range(20)]
+
+    for min_parallel_characters in (0, 1 << 16):
+        # Encoded over the thread pool, then inline
+        monkeypatch.setattr(tokenizer_module, "MIN_PARALLEL_CHARACTERS", min_parallel_characters)
+
+        assert tokenizer.count_batch(texts) == [tokenizer.count(text) for text in texts]
+        assert tokenizer.truncate_batch(texts, 7) == [tokenizer.truncate(text, 7) for text in texts]
+        assert tokenizer.chunk_batch(texts, 5, overlap=1) == [tokenizer.chunk(text, 5, overlap=1) for text in texts]
+
+
+def test_rag_utils_use_the_shared_tokenizer(monkeypatch):
+    monkeypatch.setitem(tokenizer_module._tokenizers, "bytes", Tokenizer(encoding=BYTE_ENCODING))
+
+    assert get_tokenizer("bytes") is get_tokenizer("bytes")
+    assert rag_utils.num_tokens_from_string("abab", encoding_name="bytes") == 2
+    # Truncated text, not token IDs
+    assert rag_utils.truncate_text_tokens("abcdef", encoding_name="bytes", max_tokens=3) == "abcd"
+    assert rag_utils.chunk_text_tokens("0123456", max_tokens=3, overlap=1, encoding_name="bytes") == ["012", "234", "456"]
+    assert rag_utils.chunk_text_tokens_batch(["0123456", "ab"], max_tokens=3, overlap=1, encoding_name="bytes") == [["012", "234", "456"], ["ab"]]
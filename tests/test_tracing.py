@@ -0,0 +1,94 @@
+"""
+Tests for the stage level instrumentation of the pipelines.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from async_rag import AsyncAutomateRAG
+from rag import AutomateRAG
+from utils.llm_cache import SQLiteLLMCache
+
+TASKS_AND_TRIGGER = {
+    "job_trigger": {"type": "schedule", "explanation": "Every weekday at 9am", "params": "0 9 * * 1-5", "integrations": []},
+    "tasks": [
+        {"task_sequence_id": 1, "task_desc": "Fetch Linear issues", "integrations": ["linear"]},
+        {"task_sequence_id": 2, "task_desc": "Post them to Slack", "integrations": ["slack"]},
+    ]
+}
+
+
+def respond(messages):
+    query = messages[-1]["content"]
+    if "**Predefined list of 3rd party APIs/integrations**" in query:
+        content = json.dumps(TASKS_AND_TRIGGER)
+    elif "You are given some example usecases" in query:
+        content = "1. daily-linear-issues-slack-alert.txt"
+    else:
+        content = "client.defineJob({});"
+
+    return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10)
+            )
+
+
+class FakeCompletions:
+    def create(self, model, messages, **kwargs):
+        return respond(messages)
+
+
+class FakeAsyncCompletions:
+    async def create(self, model, messages, **kwargs):
+        return respond(messages)
+
+
+def test_report_has_stage_timings_and_token_usage(tmp_path):
+    rag = AutomateRAG(prompt_token_budget=None, llm_cache=SQLiteLLMCache(path=str(tmp_path / "cache.sqlite")))
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+    code, report = rag.smart_automate("Post Linear issues to Slack every weekday at 9am", return_report=True)
+
+    assert code == "client.defineJob({});"
+    assert report["pipeline"] == "smart_automate"
+    assert [stage["name"] for stage in report["stages"]] == ["break_job_into_tasks", "load_examples", "select_examples", "generate_code"]
+    assert report["stages"][2]["llm_calls"] == 2 and report["stages"][1]["parent"] == "select_examples"
+    assert report["totals"] == {"llm_calls": 4, "prompt_tokens": 400, "completion_tokens": 40, "cache_hits": 0, "retries": 0}
+
+    _, report = rag.smart_automate("Post Linear issues to Slack every weekday at 9am", return_report=True)
+
+    assert report["totals"]["cache_hits"] == 4 and report["totals"]["prompt_tokens"] == 0
+
+
+def test_concurrent_async_runs_have_separate_reports():
+    rag = AsyncAutomateRAG(prompt_token_budget=None)
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions()))
+
+    async def run_all():
+        return await asyncio.gather(*[rag.automate(f"job {i}", return_report=True) for i in range(3)])
+
+    results = asyncio.run(run_all())
+
+    for i, (code, report) in enumerate(results):
+        assert report["attributes"] == {"job_description": f"job {i}"}
+        assert report["totals"]["llm_calls"] == 2
+
+
+def test_stages_are_exported_as_opentelemetry_spans():
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    rag = AutomateRAG(prompt_token_budget=None, export_otel=True)
+    rag.main_llm_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    rag.automate("Post Linear issues to Slack every weekday at 9am")
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert {"automate", "break_job_into_tasks", "load_examples", "generate_code", "llm_call"} <= set(spans)
+    assert spans["generate_code"].parent.span_id == spans["automate"].context.span_id
+    assert spans["llm_call"].attributes["llm.prompt_tokens"] == 100
@@ -0,0 +1,264 @@
+"""
+Stage level latency and token instrumentation of the RAG pipelines.
+
+Every pipeline run (`automate`, `smart_automate`) records a `PipelineTrace` with the wall time of each stage and,
+for every LLM call, its latency, prompt/completion tokens (from the `usage` field of the OpenAI response), whether it
+was answered from the cache and how many times it was retried. Pass `return_report=True` to a pipeline to get the
+report back along with the code:
+
+    code, report = rag.smart_automate(job_description, return_report=True)
+
+The active trace and stage are tracked with context variables, so concurrent runs (worker threads of the batch mode
+or asyncio tasks) never mix their records. When `export_otel` is enabled, stages and LLM calls are also exported as
+OpenTelemetry spans through the globally configured tracer provider.
+"""
+import functools
+import inspect
+import itertools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+_current_trace = ContextVar("automatellm_current_trace", default=None)
+_current_stage = ContextVar("automatellm_current_stage", default=None)
+_current_llm_call = ContextVar("automatellm_current_llm_call", default=None)
+
+
+class PipelineTrace:
+    def __init__(self, pipeline, export_otel=False, **attributes) -> None:
+        self.pipeline = pipeline
+        self.attributes = attributes
+        self.stages = []
+        self.llm_calls = []
+        # Stage names repeat (e.g. one `speculative_select_examples` stage per integration): calls are attributed by ID
+        self.stage_ids = itertools.count()
+        self.duration_ms = None
+        self.lock = threading.Lock()
+        self.tracer = get_otel_tracer() if export_otel else None
+
+    def span(self, name, **attributes):
+        """
+        OpenTelemetry span of the current trace, or a no-op context when spans are not exported
+        """
+        if self.tracer is None:
+            return nullcontext()
+
+        return self.tracer.start_as_current_span(name, attributes={key: value for key, value in attributes.items() if value is not None})
+
+    @contextmanager
+    def stage(self, name):
+        parent = _current_stage.get()
+        with self.lock:
+            stage_id = next(self.stage_ids)
+        stage = {
+            "id": stage_id,
+            "name": name,
+            "parent": parent["name"] if parent is not None else None,
+            "parent_id": parent["id"] if parent is not None else None,
+            "duration_ms": None
+        }
+        token = _current_stage.set(stage)
+        start = time.perf_counter()
+        try:
+            with self.span(name):
+                yield stage
+        finally:
+            stage["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            _current_stage.reset(token)
+            with self.lock:
+                self.stages.append(stage)
+
+    def record_llm_call(self, llm_call):
+        with self.lock:
+            self.llm_calls.append(llm_call)
+
+    def report(self):
+        """
+        Structured report of the run: per stage wall time and LLM usage, every LLM call and the totals.
+        """
+        stages = []
+        for stage in self.stages:
+            stage_calls = [llm_call for llm_call in self.llm_calls if llm_call["stage_id"] == stage["id"]]
+            stages.append(dict(stage, **summarize_llm_calls(stage_calls)))
+
+        return {
+            "pipeline": self.pipeline,
+            "attributes": self.attributes,
+            "duration_ms": self.duration_ms,
+            "stages": stages,
+            "llm_calls": list(self.llm_calls),
+            "totals": summarize_llm_calls(self.llm_calls),
+        }
+
+
+def summarize_llm_calls(llm_calls):
+    return {
+        "llm_calls": len(llm_calls),
+        "prompt_tokens": sum(llm_call["prompt_tokens"] or 0 for llm_call in llm_calls),
+        "completion_tokens": sum(llm_call["completion_tokens"] or 0 for llm_call in llm_calls),
+        "cache_hits": sum(1 for llm_call in llm_calls if llm_call["cache_hit"]),
+        "retries": sum(llm_call["retries"] for llm_call in llm_calls),
+    }
+
+
+def get_otel_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        print ("OpenTelemetry is not installed, spans will not be exported.")
+        return None
+
+    return trace.get_tracer("automatellm")
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(pipeline, export_otel=False, **attributes):
+    """
+    Start recording a pipeline run. When a trace is already active (e.g. `smart_automate` called from a
+    caller that traces a larger unit of work), the stages are recorded in the active trace instead.
+    """
+    active_trace = _current_trace.get()
+    if active_trace is not None:
+        yield active_trace
+        return
+
+    trace = PipelineTrace(pipeline, export_otel=export_otel, **attributes)
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        with trace.span(pipeline, **attributes):
+            yield trace
+    finally:
+        trace.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        _current_trace.reset(token)
+
+
+@contextmanager
+def trace_stage(name):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    with trace.stage(name) as stage:
+        yield stage
+
+
+@contextmanager
+def trace_llm_call(model, streamed=False):
+    """
+    Record an LLM call in the active trace. The caller fills in the yielded dictionary
+    (`cache_hit`, `retries`, and the token counts through `record_usage`).
+    """
+    stage = _current_stage.get()
+    llm_call = {
+        "stage": stage["name"] if stage is not None else None,
+        "stage_id": stage["id"] if stage is not None else None,
+        "model": model,
+        "duration_ms": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "cache_hit": False,
+        "retries": 0,
+        "streamed": streamed,
+    }
+
+    # Restored by value rather than with a reset token: a streamed call can be resumed from another context
+    previous_llm_call = _current_llm_call.get()
+    _current_llm_call.set(llm_call)
+    try:
+        trace = _current_trace.get()
+        if trace is None:
+            yield llm_call
+            return
+
+        start = time.perf_counter()
+        with trace.span("llm_call", model=model) as span:
+            try:
+                yield llm_call
+            finally:
+                llm_call["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                trace.record_llm_call(llm_call)
+
+                if span is not None:
+                    span.set_attributes({f"llm.{key}": value for key, value in llm_call.items() if value is not None})
+    finally:
+        _current_llm_call.set(previous_llm_call)
+
+
+def record_usage(llm_call, usage):
+    """
+    Copy the token counts of an OpenAI `usage` object into an LLM call record
+    """
+    if usage is not None:
+        llm_call["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+        llm_call["completion_tokens"] = getattr(usage, "completion_tokens", None)
+
+
+def record_retry():
+    """
+    Count a retry of the LLM call in progress (called by the retrying client of `llm_clients.py`)
+    """
+    llm_call = _current_llm_call.get()
+    if llm_call is not None:
+        llm_call["retries"] += 1
+
+
+def record_attributes(**attributes):
+    """
+    Add attributes to the report of the active trace, e.g. the outcome of the speculative example selection
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace.lock:
+            trace.attributes.update(attributes)
+
+
+def traced_stage(name):
+    """
+    Decorator recording a method (sync or async) as a pipeline stage
+    """
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with trace_stage(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with trace_stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def traced_pipeline(name):
+    """
+    Decorator starting a trace around a pipeline method (sync or async) taking a `job_description`.
+    Adds a `return_report` keyword argument: when True, the pipeline returns `(output, report)`.
+    """
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(self, job_description, *args, return_report=False, **kwargs):
+                with start_trace(name, export_otel=self.export_otel, job_description=job_description) as trace:
+                    output = await function(self, job_description, *args, **kwargs)
+                return (output, trace.report()) if return_report else output
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(self, job_description, *args, return_report=False, **kwargs):
+            with start_trace(name, export_otel=self.export_otel, job_description=job_description) as trace:
+                output = function(self, job_description, *args, **kwargs)
+            return (output, trace.report()) if return_report else output
+        return wrapper
+
+    return decorator
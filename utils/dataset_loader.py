@@ -0,0 +1,228 @@
+"""
+Streaming loader of the crawled documentation datasets.
+
+A crawl dump is either a JSON array of page records (the format of the crawler) or a JSONL file with one record per
+line. `iter_records` yields the records one at a time, keeping only the requested fields, so that memory use does not
+grow with the size of the dump:
+
+    - JSON arrays are parsed incrementally with ijson when it is installed, otherwise with `json.JSONDecoder.raw_decode`
+      over a buffer read chunk by chunk
+    - JSONL files are parsed line by line
+
+`prefetch` runs the parsing in a background thread, a bounded number of records ahead of the consumer, so that the
+embedding requests start with the first records and overlap with the parsing of the rest of the dump.
+
+A JSON array dump can be converted once to a projected JSONL file, which is faster to read afterwards:
+
+python utils/dataset_loader.py datasets/dataset_trigger-dev-examples_2024-03-16_13-56-52-250.json datasets/examples.jsonl
+
+"""
+import json
+import os
+import queue
+import threading
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Fields of a crawled page used by the documentation embedding pipeline
+DOCUMENTATION_FIELDS = ("url", "markdown", "metadata.title", "metadata.description", "metadata.canonicalUrl", "crawl.referrerUrl")
+
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+WHITESPACE = " \t\r\n"
+
+
+def project_record(record, fields):
+    """
+    Copy of `record` with only `fields` (dotted paths such as 'metadata.title'). Missing fields are left out.
+    """
+    projected = {}
+    for field in fields:
+        value, parts = record, field.split(".")
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+
+    return projected
+
+
+def is_jsonl(path):
+    """
+    JSONL when the extension says so, or when the first non blank character is not the '[' of a JSON array
+    """
+    if path.endswith(JSONL_EXTENSIONS):
+        return True
+
+    with open(path, "r", encoding="utf-8") as file:
+        while True:
+            character = file.read(1)
+            if character == "" or character not in WHITESPACE:
+                return character != "["
+
+
+def iter_json_array(file, read_size=1 << 16):
+    """
+    Yield the items of the JSON array of a text file one at a time, reading it `read_size` characters at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, at_end = "", 0, False
+
+    def fill(grow=False):
+        nonlocal buffer, position, at_end
+        # An item larger than the buffer doubles the read size, so that it is not re-parsed once per `read_size`
+        data = file.read(max(read_size, len(buffer) - position) if grow else read_size)
+        at_end = data == ""
+        # Drop the consumed part of the buffer before growing it
+        buffer = buffer[position:] + data
+        position = 0
+
+    def skip(characters):
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer) or at_end:
+                return
+            fill()
+
+    skip(WHITESPACE)
+    if position >= len(buffer) or buffer[position] != "[":
+        raise ValueError("The dataset is not a JSON array.")
+    position += 1
+
+    while True:
+        skip(WHITESPACE + ",")
+        if position >= len(buffer):
+            raise ValueError("Unexpected end of the dataset: the JSON array is not closed.")
+
+        if buffer[position] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if at_end:
+                raise
+            # The item continues after the buffer
+            fill(grow=True)
+            continue
+
+        if not at_end and buffer[position] not in '{["' and (end == len(buffer) or buffer[end] not in WHITESPACE + ",]"):
+            # A number (or true/false/null) is only complete once followed by a delimiter, e.g. '12' of '12345'
+            # or '1.5' of '1.5e10' cut at the end of the buffer
+            fill(grow=True)
+            continue
+
+        position = end
+        yield item
+
+
+def iter_records(path, fields=None, read_size=1 << 16):
+    """
+    Yield the records of a JSON array or JSONL dataset one at a time.
+
+    :param path: dataset file, a JSON array of records or a JSONL file (see `is_jsonl`)
+    :param fields: dotted paths of the fields to keep (see `project_record`), all fields by default
+    :param read_size: characters read at a time from a JSON array without ijson
+    """
+    if is_jsonl(path):
+        with open(path, "r", encoding="utf-8") as file:
+            records = (json.loads(line) for line in file if line.strip())
+            yield from (project_record(record, fields) if fields else record for record in records)
+
+    elif ijson is not None:
+        with open(path, "rb") as file:
+            for record in ijson.items(file, "item", use_float=True):
+                yield project_record(record, fields) if fields else record
+
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            for record in iter_json_array(file, read_size=read_size):
+                yield project_record(record, fields) if fields else record
+
+
+def prefetch(iterable, max_pending=256):
+    """
+    Iterate over `iterable` in a background thread, at most `max_pending` items ahead of the consumer.
+    An exception raised by `iterable` is raised again by the consumer.
+    """
+    items = queue.Queue(maxsize=max_pending)
+    stopped = threading.Event()
+    end = object()
+
+    def put(entry):
+        """
+        Wait for room in the queue, unless the consumer stopped
+        """
+        while not stopped.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        # The consumer stopped early (or failed): let the producer thread exit
+        stopped.set()
+
+
+def convert_to_jsonl(source_path, destination_path, fields=DOCUMENTATION_FIELDS):
+    """
+    Write the projected records of a dataset as JSONL, one record per line
+
+    :return: number of records written
+    """
+    if os.path.dirname(destination_path):
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+
+    num_records = 0
+    temporary_path = destination_path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as outfile:
+        for record in iter_records(source_path, fields=fields):
+            outfile.write(json.dumps(record) + "\n")
+            num_records += 1
+    os.replace(temporary_path, destination_path)
+
+    return num_records
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a crawl dump to a projected JSONL dataset.")
+    parser.add_argument("source", help="JSON array (or JSONL) dataset")
+    parser.add_argument("destination", help="JSONL file to write")
+    parser.add_argument("--all-fields", action="store_true", help="keep every field instead of the documentation fields")
+    args = parser.parse_args()
+
+    num_records = convert_to_jsonl(args.source, args.destination, fields=None if args.all_fields else DOCUMENTATION_FIELDS)
+    print (f"{num_records} records written to {args.destination}")
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+import time
+
+
+class ExampleCorpus:
+    """
+    In-memory index of the integration examples stored as .txt files under `base_dir`.
+
+    The corpus is loaded lazily on first access and indexed by integration and by filename. Examples whose content
+    is shared by several integrations (e.g. `slack-sendgrid-send-activity-summary.txt`) are stored once.
+    At most every `refresh_interval` seconds the file modification times are checked and the corpus is reloaded
+    when an example was added, removed or modified.
+    """
+    def __init__(self, base_dir="integrations", refresh_interval=5.0) -> None:
+        self.base_dir = base_dir
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+
+        self._index = None
+        self._signature = None
+        self._last_check = 0.0
+        self.num_loads = 0
+
+    def get_examples(self, integration, select_examples=None):
+        """
+        All or selected examples of an integration.
+
+        :param integration: name of the integration directory
+        :param select_examples: List containing filenames of selected examples. The returned examples follow its order.
+        :return: dictionary where key is filename and value is the actual code snippet
+        """
+        index = self.__get_index()
+
+        if integration not in index:
+            raise FileNotFoundError(f"Directory not found: {os.path.join(self.base_dir, integration)}")
+
+        examples = index[integration]
+        if select_examples is None:
+            return dict(examples)
+
+        return {name: examples[name] for name in select_examples if name in examples}
+
+    def integrations(self):
+        return list(self.__get_index().keys())
+
+    def __get_index(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._last_check < self.refresh_interval:
+            return self._index
+
+        with self.lock:
+            if self._index is None or now - self._last_check >= self.refresh_interval:
+                signature = self.__compute_signature()
+                if signature != self._signature:
+                    self._index = self.__load()
+                    self._signature = signature
+                self._last_check = now
+
+        return self._index
+
+    def __compute_signature(self):
+        """
+        Modification times of every directory and example file of the corpus
+        """
+        signature = []
+        for root, directories, files in os.walk(self.base_dir):
+            directories.sort()
+            signature.append((root, os.stat(root).st_mtime_ns))
+            for file_name in sorted(files):
+                if file_name.endswith(".txt"):
+                    path = os.path.join(root, file_name)
+                    signature.append((path, os.stat(path).st_mtime_ns))
+
+        return tuple(signature)
+
+    def __load(self):
+        contents = {}
+        index = {}
+
+        for integration in sorted(os.listdir(self.base_dir)):
+            integration_path = os.path.join(self.base_dir, integration)
+            if not os.path.isdir(integration_path):
+                continue
+
+            index[integration] = {}
+            for file_name in sorted(os.listdir(integration_path)):
+                if not file_name.endswith(".txt"):
+                    continue
+
+                with open(os.path.join(integration_path, file_name), 'r', encoding='utf-8') as file:
+                    code = file.read()
+
+                # Identical files of different integrations share the same string
+                content_hash = hashlib.sha256(code.encode('utf-8')).hexdigest()
+                index[integration][file_name] = contents.setdefault(content_hash, code)
+
+        self.num_loads += 1
+        print (f"Example corpus loaded: {sum(len(examples) for examples in index.values())} examples, {len(contents)} unique.")
+
+        return index
+
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+
+def get_example_corpus(base_dir="integrations"):
+    """
+    Process-wide example corpus of `base_dir`
+    """
+    key = os.path.abspath(base_dir)
+    with _corpora_lock:
+        if key not in _corpora:
+            _corpora[key] = ExampleCorpus(base_dir=base_dir)
+
+        return _corpora[key]
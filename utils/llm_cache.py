@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_cache_key(model, system_message, prompt, **params):
+    """
+    Content addressed key of an LLM call.
+
+    :param model: name of the LLM
+    :param system_message: system message sent along with the prompt
+    :param prompt: user prompt
+    :param params: any other request parameter that changes the output (e.g. `response_format`)
+    :return: hex digest identifying the call
+    """
+    payload = json.dumps([model, system_message, prompt, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SQLiteLLMCache:
+    """
+    LLM response cache persisted in a local SQLite database.
+
+    Entries older than `ttl_seconds` are treated as missing. When the cache holds more than `max_entries` entries or
+    more than `max_size_bytes` bytes of responses, the least recently used entries are evicted.
+    """
+    def __init__(self, path=".cache/llm_cache.sqlite", ttl_seconds=None, max_entries=None, max_size_bytes=None) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_size_bytes = max_size_bytes
+        # Guards the connection and the counters, shared by the worker threads of the batch mode
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed_at ON llm_cache (last_accessed_at)")
+        self.connection.commit()
+
+    def get(self, key):
+        """
+        Cached response for `key` or None if the key is missing or expired.
+        """
+        now = time.time()
+
+        with self.lock:
+            row = self.connection.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self.connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.connection.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self.connection.execute("UPDATE llm_cache SET last_accessed_at = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), now, now)
+            )
+            self.__evict()
+            self.connection.commit()
+
+    def __evict(self):
+        """
+        Drop the least recently used entries until the cache fits its size limits.
+        """
+        if self.max_entries is not None:
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                self.__delete_least_recently_used(count - self.max_entries)
+
+        if self.max_size_bytes is not None:
+            (total_size,) = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            if total_size <= self.max_size_bytes:
+                return
+
+            # Only walk the least recently used entries until enough of them are dropped
+            excess_entries = 0
+            for (size,) in self.connection.execute("SELECT size FROM llm_cache ORDER BY last_accessed_at ASC"):
+                if total_size <= self.max_size_bytes:
+                    break
+                total_size -= size
+                excess_entries += 1
+
+            self.__delete_least_recently_used(excess_entries)
+
+    def __delete_least_recently_used(self, num_entries):
+        self.connection.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_accessed_at ASC LIMIT ?)",
+            (num_entries,)
+        )
+        self.evictions += num_entries
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        with self.lock:
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        return count
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM llm_cache")
+            self.connection.commit()
@@ -1,8 +1,9 @@
-import tiktoken
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
 import os
 import glob
+from utils.tokenizer import get_tokenizer
+
+# tiktoken (loaded once per encoding by `utils.tokenizer`), numpy and jsonschema are imported on first use,
+# so that importing this module (and the pipelines) stays cheap
 
 EMBEDDING_CTX_LENGTH = 8191
 EMBEDDING_ENCODING = 'cl100k_base'
@@ -16,14 +17,55 @@ def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> i
     :param encoding_name: Encoding used for creating the vector embeddings
     :return: number of tokens of the input string
     """
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
+    return get_tokenizer(encoding_name).count(string)
 
 def truncate_text_tokens(text, encoding_name=EMBEDDING_ENCODING, max_tokens=EMBEDDING_CTX_LENGTH):
-    """Truncate a string to have `max_tokens` according to the given encoding."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    return encoding.encode(text)[:max_tokens]
+    """Truncate a string to have at most `max_tokens` (the context length of the embedding model by default) and return the truncated string."""
+    return get_tokenizer(encoding_name).truncate(text, max_tokens)
+
+def chunk_text_tokens(text, max_tokens, overlap=0, encoding_name=EMBEDDING_ENCODING):
+    """
+    Split a string into consecutive chunks of at most `max_tokens` tokens.
+
+    :param text: Input text string
+    :param max_tokens: maximum number of tokens in a chunk
+    :param overlap: number of tokens at the end of a chunk repeated at the start of the next one
+    :param encoding_name: Encoding used for creating the vector embeddings
+    :return: list of text chunks
+    """
+    return get_tokenizer(encoding_name).chunk(text, max_tokens, overlap=overlap)
+
+def chunk_text_tokens_batch(texts, max_tokens, overlap=0, encoding_name=EMBEDDING_ENCODING):
+    """
+    Chunks of every string of a batch, see `chunk_text_tokens`. The batch is encoded at once by the shared tokenizer.
+
+    :return: list of the lists of text chunks of every string
+    """
+    return get_tokenizer(encoding_name).chunk_batch(texts, max_tokens, overlap=overlap)
+
+def normalize_rows(vectors):
+    """Scale every row of a matrix to unit L2 norm. All-zero rows are left untouched."""
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def embed_texts(client, texts, model="text-embedding-ada-002"):
+    """
+    Embed a batch of texts with a single request to the embeddings endpoint.
+
+    :param client: OpenAI compatible client
+    :param texts: list of strings to embed
+    :param model: embedding model
+    :return: float32 matrix of shape (len(texts), dimension) with L2 normalized rows
+    """
+    import numpy as np
+
+    response = client.embeddings.create(input=list(texts), model=model)
+    vectors = np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+
+    return normalize_rows(vectors)
 
 def is_valid_json(json_data, schema):
     """
@@ -33,6 +75,8 @@ def is_valid_json(json_data, schema):
     :param schema: A dict representing the JSON schema to validate against.
     :return: True if json_data conforms to schema, False otherwise.
     """
+    from jsonschema import validate
+    from jsonschema.exceptions import ValidationError
 
     try:
         validate(instance=json_data, schema=schema)
@@ -0,0 +1,152 @@
+"""
+Shared tokenizer: token counting, truncation and chunking with cached tiktoken encodings.
+
+Token counting sits on the hot paths of the pipelines (prompt budgeting, chunking and ingestion). `get_tokenizer`
+returns one `Tokenizer` per encoding name for the whole process, so the encoding is loaded once and every call is a
+direct `encode` of the Rust BPE. The batch methods encode the texts over a thread pool kept by the tokenizer: tiktoken
+releases the GIL while encoding, so a batch of long texts is encoded in parallel, without `encode_batch` creating a new
+thread pool on every call. Small batches, and every batch on a single core machine, are encoded inline, where a pool
+would only add overhead.
+
+Special tokens such as '<|endoftext|>' are encoded as plain text (`encode_ordinary`): crawled pages and user input
+may contain them, and they must not make the encoding fail.
+
+To compare with the previous per call functions, see `benchmarks/bench_tokenizer.py`.
+"""
+import os
+import threading
+
+DEFAULT_ENCODING = "cl100k_base"
+DEFAULT_NUM_THREADS = 8
+# Below this many texts (or total characters), a batch is encoded inline
+MIN_PARALLEL_TEXTS = 4
+MIN_PARALLEL_CHARACTERS = 1 << 16
+
+
+class Tokenizer:
+    """
+    Token counting, truncation and chunking with one encoding.
+
+    :param encoding_name: tiktoken encoding, loaded on first use
+    :param encoding: already loaded encoding (any object with `encode_ordinary` and `decode`), instead of `encoding_name`
+    :param num_threads: size of the thread pool of the batch methods, up to `DEFAULT_NUM_THREADS` and the number of CPUs
+                        by default
+    """
+    def __init__(self, encoding_name=DEFAULT_ENCODING, encoding=None, num_threads=None) -> None:
+        self.encoding_name = encoding_name
+        self.num_threads = num_threads or min(DEFAULT_NUM_THREADS, os.cpu_count() or 1)
+        self.lock = threading.Lock()
+
+        self._encoding = encoding
+        self._executor = None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            with self.lock:
+                if self._encoding is None:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+
+        return self._encoding
+
+    def encode(self, text):
+        return self.encoding.encode_ordinary(text)
+
+    def decode(self, tokens):
+        return self.encoding.decode(tokens)
+
+    def encode_batch(self, texts):
+        """
+        Tokens of every text, encoded in parallel for large batches
+        """
+        texts = list(texts)
+        if self.num_threads < 2 or len(texts) < MIN_PARALLEL_TEXTS or sum(len(text) for text in texts) < MIN_PARALLEL_CHARACTERS:
+            return [self.encode(text) for text in texts]
+
+        return list(self.__get_executor().map(self.encode, texts))
+
+    def count(self, text):
+        return len(self.encode(text))
+
+    def count_batch(self, texts):
+        return [len(tokens) for tokens in self.encode_batch(texts)]
+
+    def truncate(self, text, max_tokens):
+        """
+        `text` cut to at most `max_tokens` tokens
+        """
+        # Every token is at least one byte, so a text with fewer bytes than `max_tokens` fits without encoding it
+        if len(text) <= max_tokens and len(text.encode("utf-8")) <= max_tokens:
+            return text
+
+        tokens = self.encode(text)
+        return text if len(tokens) <= max_tokens else self.decode(tokens[:max_tokens])
+
+    def truncate_batch(self, texts, max_tokens):
+        texts = list(texts)
+        long_texts = [i for i, text in enumerate(texts) if len(text.encode("utf-8")) > max_tokens]
+
+        truncated = list(texts)
+        for i, tokens in zip(long_texts, self.encode_batch([texts[i] for i in long_texts])):
+            if len(tokens) > max_tokens:
+                truncated[i] = self.decode(tokens[:max_tokens])
+
+        return truncated
+
+    def chunk(self, text, max_tokens, overlap=0):
+        """
+        Split `text` into consecutive chunks of at most `max_tokens` tokens, every chunk repeating the last `overlap`
+        tokens of the previous one.
+
+        :return: list of text chunks, empty for an empty text
+        """
+        return self.__split(self.encode(text), max_tokens, overlap)
+
+    def chunk_batch(self, texts, max_tokens, overlap=0):
+        """
+        Chunks of every text, see `chunk`
+        """
+        return [self.__split(tokens, max_tokens, overlap) for tokens in self.encode_batch(texts)]
+
+    def __split(self, tokens, max_tokens, overlap):
+        if max_tokens < 1:
+            raise ValueError(f"max_tokens must be at least 1, got {max_tokens}.")
+        if not 0 <= overlap < max_tokens:
+            raise ValueError(f"overlap must be between 0 and max_tokens - 1, got {overlap}.")
+
+        chunks = []
+        for start in range(0, len(tokens), max_tokens - overlap):
+            chunks.append(self.decode(tokens[start:start + max_tokens]))
+            if start + max_tokens >= len(tokens):
+                break
+
+        return chunks
+
+    def __get_executor(self):
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="tokenizer")
+
+        return self._executor
+
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(encoding_name=DEFAULT_ENCODING):
+    """
+    Process-wide tokenizer of `encoding_name`
+    """
+    tokenizer = _tokenizers.get(encoding_name)
+    if tokenizer is not None:
+        return tokenizer
+
+    with _tokenizers_lock:
+        if encoding_name not in _tokenizers:
+            _tokenizers[encoding_name] = Tokenizer(encoding_name=encoding_name)
+
+        return _tokenizers[encoding_name]